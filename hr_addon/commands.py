@@ -0,0 +1,107 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.group("hr-addon")
+def hr_addon():
+	"""HR Addon commands"""
+	pass
+
+
+@hr_addon.command("backfill")
+@click.option("--from", "from_date", required=True, help="First date (YYYY-MM-DD)")
+@click.option("--to", "to_date", required=True, help="Last date (YYYY-MM-DD)")
+@click.option("--employees", help="Comma separated Employee IDs, all active employees if not set")
+@click.option("--company", help="Only active employees of this Company")
+@click.option("--workers", default=1, type=int, help="Number of worker processes")
+@click.option("--restart", is_flag=True, default=False, help="Ignore the checkpoint of a previous run")
+@pass_context
+def backfill(context, from_date, to_date, employees=None, company=None, workers=1, restart=False):
+	"""Create the missing Workdays for a historic period"""
+	from hr_addon.hr_addon.api.backfill import run_backfill
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		run_backfill(from_date, to_date, employees=employees, company=company,
+			workers=workers, restart=restart, echo=click.echo)
+	finally:
+		frappe.destroy()
+
+
+@hr_addon.command("recompute")
+@click.option("--from", "from_date", required=True, help="First date (YYYY-MM-DD)")
+@click.option("--to", "to_date", required=True, help="Last date (YYYY-MM-DD)")
+@click.option("--employees", help="Comma separated Employee IDs, all active employees if not set")
+@click.option("--company", help="Only active employees of this Company")
+@pass_context
+def recompute(context, from_date, to_date, employees=None, company=None):
+	"""Queue the recomputation of the Workdays of a period, unchanged days are skipped"""
+	from hr_addon.hr_addon.api.backfill import enqueue_range_recompute
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		frappe.set_user("Administrator")
+		result = enqueue_range_recompute(from_date, to_date, employees=employees, company=company)
+		# the jobs are dispatched after the commit
+		frappe.db.commit()
+		click.echo("{jobs} recompute jobs queued".format(**result))
+	finally:
+		frappe.destroy()
+
+
+@hr_addon.command("export-analytics")
+@click.option("--intervals", is_flag=True, default=False, help="Also export the paired check-in intervals")
+@click.option("--full", is_flag=True, default=False, help="Export every partition, not only the changed ones")
+@pass_context
+def export_analytics(context, intervals=False, full=False):
+	"""Export Workdays as Parquet files partitioned by company and month"""
+	from hr_addon.hr_addon.api.analytics_export import export_workday_facts
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		result = export_workday_facts(include_intervals=intervals, full=full, echo=click.echo)
+		click.echo("Analytics export finished: {changed} partitions written, {removed} removed".format(**result))
+	finally:
+		frappe.destroy()
+
+
+@hr_addon.command("load-test")
+@click.option("--duration", default=60, type=float, help="Seconds of load")
+@click.option("--employees", default=50, type=int, help="Number of active employees with Weekly Working Hours to use")
+@click.option("--company", help="Only employees of this Company")
+@click.option("--punch-workers", default=4, type=int)
+@click.option("--punch-rate", default=300, type=float, help="Punch batches per minute")
+@click.option("--punch-batch", default=10, type=int, help="Punches per batch")
+@click.option("--form-workers", default=4, type=int)
+@click.option("--form-rate", default=120, type=float, help="Workday forms opened per minute")
+@click.option("--leave-workers", default=1, type=int)
+@click.option("--leave-rate", default=6, type=float, help="Leave calendar exports per minute")
+@click.option("--generation-workers", default=1, type=int)
+@click.option("--generation-rate", default=2, type=float, help="Workday generations of one employee per minute")
+@click.option("--recompute-workers", default=1, type=int)
+@click.option("--recompute-rate", default=1, type=float, help="Runs of the recompute queue per minute")
+@click.option("--seed", type=int, help="Random seed, to repeat a run")
+@click.option("--keep-data", is_flag=True, default=False, help="Keep the synthetic Employee Checkins")
+@click.option("--output", help="Write the result as JSON to this file")
+@pass_context
+def load_test(context, **kwargs):
+	"""Measure latency percentiles, lock waits and deadlocks under a shift-change peak"""
+	from hr_addon.hr_addon.api.load_test import run_load_test
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		run_load_test(echo=click.echo, **kwargs)
+	finally:
+		frappe.destroy()
+
+
+commands = [hr_addon]
@@ -40,4 +40,9 @@ def set_from_to_dates():
     
     frappe.db.commit()
 
+    # the target hours of the new validity period have to be materialized
+    from hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar import enqueue_rebuild
+    employees = frappe.get_all("Employee", filters={"permanent": 1}, pluck="name")
+    enqueue_rebuild(employees, year_start_date, year_end_date)
+
 
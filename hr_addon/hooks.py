@@ -194,14 +194,60 @@ required_apps = ["hrms"]
 
 doc_events = {
     "Leave Application": {
-        "on_change": "hr_addon.hr_addon.api.export_calendar.export_calendar",
-		"on_cancel": "hr_addon.hr_addon.api.export_calendar.export_calendar"
+        "on_change": [
+            "hr_addon.hr_addon.api.export_calendar.export_calendar",
+            "hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar.on_leave_application_change",
+            "hr_addon.hr_addon.api.workday_form.on_employee_data_change",
+            "hr_addon.hr_addon.doctype.leave_calendar_change.leave_calendar_change.log_leave_calendar_change",
+        ],
+		"on_cancel": "hr_addon.hr_addon.api.export_calendar.export_calendar",
+        "on_trash": [
+            "hr_addon.hr_addon.doctype.leave_calendar_change.leave_calendar_change.log_leave_calendar_change",
+            "hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar.on_leave_application_change",
+        ]
+    },
+    "Holiday List": {
+        "on_update": [
+            "hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar.on_holiday_list_change",
+            "hr_addon.hr_addon.api.workday_form.on_holiday_list_change",
+        ]
+    },
+    "Employee": {
+        "on_update": [
+            "hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar.on_employee_change",
+            "hr_addon.hr_addon.api.checkin_ingestion.clear_attendance_device_map",
+            "hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary.on_employee_change",
+            "hr_addon.hr_addon.api.time_account.on_employee_change",
+        ]
+    },
+    "Employee Checkin": {
+        "on_update": [
+            "hr_addon.hr_addon.api.replica.mark_recent_write_for_doc",
+            "hr_addon.hr_addon.api.workday_form.on_employee_data_change",
+        ],
+        "on_trash": [
+            "hr_addon.hr_addon.api.replica.mark_recent_write_for_doc",
+            "hr_addon.hr_addon.api.workday_form.on_employee_data_change",
+        ]
+    },
+    "Attendance": {
+        "on_change": "hr_addon.hr_addon.api.workday_form.on_employee_data_change"
+    },
+    "Weekly Working Hours": {
+        "on_submit": "hr_addon.hr_addon.api.workday_form.on_employee_data_change",
+        "on_cancel": "hr_addon.hr_addon.api.workday_form.on_employee_data_change",
+        "on_update_after_submit": "hr_addon.hr_addon.api.workday_form.on_employee_data_change"
     }
 }
 
 doctype_list_js = {"Weekly Working Hours" : "public/js/list_view.js"}
 
 scheduler_events = {
+	"all": [
+		"hr_addon.hr_addon.api.checkin_ingestion.process_workday_recompute_queue",
+		"hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary.refresh_department_attendance_summary",
+		"hr_addon.hr_addon.api.job_queue.dispatch_jobs"
+	],
 	"hourly": [
 		"hr_addon.hr_addon.doctype.hr_addon_settings.hr_addon_settings.generate_workdays_scheduled_job"
 	],
@@ -209,6 +255,15 @@ scheduler_events = {
         "hr_addon.custom_scripts.custom_python.weekly_working_hours.set_from_to_dates",
 	],
 	"daily": [
-		"hr_addon.hr_addon.api.utils.send_work_anniversary_notification"
-	]
+		"hr_addon.hr_addon.api.utils.send_work_anniversary_notification",
+		"hr_addon.hr_addon.doctype.workday_archive.workday_archive.archive_closed_periods",
+		"hr_addon.hr_addon.api.attendance_reconciliation.reconcile_attendance_daily",
+		"hr_addon.hr_addon.doctype.workday_change_log.workday_change_log.compact_workday_change_log",
+		"hr_addon.hr_addon.doctype.leave_calendar_change.leave_calendar_change.compact_leave_calendar_changes"
+	],
+	"cron": {
+		"*/15 * * * *": [
+			"hr_addon.hr_addon.api.metrics.update_checkin_backlog"
+		]
+	}
 }
\ No newline at end of file
@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+from collections import defaultdict
+import frappe
+from frappe import _
+from frappe.utils import add_days, cstr, get_datetime, get_last_day, getdate, now_datetime
+
+from hr_addon.hr_addon.api.checkin_pairing import get_pairing_settings, pair_checkins
+from hr_addon.hr_addon.api.utils import get_employee_checkins_for_range
+
+# rows per Arrow record batch, also the fetch size of the unbuffered cursor
+RECORD_BATCH_SIZE = 10000
+
+WORKDAY_COLUMNS = (
+    ("name", "string"),
+    ("employee", "string"),
+    ("log_date", "date32"),
+    ("company", "string"),
+    ("status", "string"),
+    ("anomaly_status", "string"),
+    ("manual_workday", "int8"),
+    ("target_hours", "float64"),
+    ("hours_worked", "float64"),
+    ("actual_working_hours", "float64"),
+    ("expected_break_hours", "float64"),
+    ("break_hours", "float64"),
+    ("total_target_seconds", "float64"),
+    ("total_work_seconds", "float64"),
+    ("total_break_seconds", "float64"),
+    ("first_checkin", "string"),
+    ("last_checkout", "string"),
+    ("modified", "timestamp"),
+)
+
+INTERVAL_COLUMNS = (
+    ("employee", "string"),
+    ("log_date", "date32"),
+    ("checkin", "timestamp"),
+    ("checkout", "timestamp"),
+    ("duration_seconds", "float64"),
+)
+
+
+def get_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        frappe.throw(_("The Parquet export needs pyarrow, install it with: bench pip install pyarrow"))
+
+    return pyarrow
+
+
+def get_schema(pa, columns):
+    types = {
+        "string": pa.string(),
+        "date32": pa.date32(),
+        "int8": pa.int8(),
+        "float64": pa.float64(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[type_]) for name, type_ in columns])
+
+
+def get_export_folder():
+    return frappe.get_site_path("private", "hr_addon_analytics")
+
+
+@frappe.whitelist()
+def enqueue_analytics_export(include_intervals=0, full=0):
+    frappe.only_for(("HR Manager", "System Manager"))
+    get_pyarrow()
+    frappe.enqueue(
+        "hr_addon.hr_addon.api.analytics_export.export_workday_facts",
+        queue="long",
+        timeout=4 * 60 * 60,
+        job_id="hr_addon_analytics_export",
+        deduplicate=True,
+        include_intervals=int(include_intervals),
+        full=int(full),
+    )
+
+
+def export_workday_facts(include_intervals=0, full=0, echo=None):
+    '''Write Workdays as Parquet files partitioned by company and month:
+    <site>/private/hr_addon_analytics/workday/company=<company>/month=<YYYY-MM>/part-0.parquet
+    and with include_intervals the paired check-ins under checkin_interval/.
+
+    Only partitions whose row count or latest modified changed since the last run are written again,
+    manifest.json keeps the state of every partition. Workdays moved to Workday Archive stay in their partition.'''
+    pa = get_pyarrow()
+    folder = get_export_folder()
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(folder, "manifest.json")
+    manifest = {} if int(full) else read_manifest(manifest_path)
+    previous = manifest.get("partitions", {})
+    if bool(manifest.get("include_intervals")) != bool(int(include_intervals)):
+        previous = {}
+
+    partitions = get_partitions()
+    changed = [key for key, state in partitions.items() if previous.get(key) != state]
+    removed = [key for key in previous if key not in partitions]
+
+    for key in removed:
+        company, month = key.split("|")
+        for table in ("workday", "checkin_interval"):
+            shutil.rmtree(get_partition_folder(folder, table, company, month), ignore_errors=True)
+
+    # the manifest is written after every partition, an interrupted run continues with the remaining ones
+    exported = {key: state for key, state in previous.items() if key in partitions}
+    for key in sorted(changed):
+        company, month = key.split("|")
+        count = write_workday_partition(pa, folder, company, month)
+        if int(include_intervals):
+            write_interval_partition(pa, folder, company, month)
+        exported[key] = partitions[key]
+        write_manifest(manifest_path, {
+            "exported_at": cstr(now_datetime()),
+            "include_intervals": int(include_intervals),
+            "partitions": exported,
+        })
+        if echo:
+            echo("Exported {0} {1}: {2} workdays".format(company, month, count))
+
+    return {"changed": len(changed), "removed": len(removed), "partitions": len(partitions)}
+
+
+def get_partitions():
+    '''{"company|YYYY-MM": {"max_modified", "count"}} with one grouped query per table,
+    months with archived Workdays also have {"archived_modified", "archived_count"}'''
+    partitions = {
+        "{0}|{1}".format(row.company or "", row.month): {"max_modified": cstr(row.max_modified), "count": row.count}
+        for row in frappe.db.sql("""
+            SELECT company, DATE_FORMAT(log_date, '%%Y-%%m') AS month, MAX(modified) AS max_modified, COUNT(*) AS count
+            FROM `tabWorkday`
+            WHERE docstatus < 2 AND log_date IS NOT NULL
+            GROUP BY company, month
+        """, as_dict=1)
+    }
+    for row in frappe.db.sql("""
+        SELECT company, DATE_FORMAT(month, '%%Y-%%m') AS month, MAX(modified) AS max_modified, SUM(workdays) AS count
+        FROM `tabWorkday Archive`
+        WHERE month IS NOT NULL
+        GROUP BY company, month
+    """, as_dict=1):
+        state = partitions.setdefault("{0}|{1}".format(row.company or "", row.month), {"max_modified": "", "count": 0})
+        state.update({"archived_modified": cstr(row.max_modified), "archived_count": int(row.count or 0)})
+
+    return partitions
+
+
+def get_partition_folder(folder, table, company, month):
+    return os.path.join(folder, table, "company={0}".format(company.replace("/", "_")), "month={0}".format(month))
+
+
+def write_batches(pa, path, schema, batches):
+    '''write record batches to path through a temporary file, readers never see a partial partition'''
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    os.replace(tmp_path, path)
+
+
+def to_record_batch(pa, schema, rows):
+    columns = list(zip(*rows)) if rows else [[] for field in schema]
+    return pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+
+
+def write_workday_partition(pa, folder, company, month):
+    schema = get_schema(pa, WORKDAY_COLUMNS)
+    from_date = getdate("{0}-01".format(month))
+    count = 0
+
+    def batches():
+        nonlocal count
+        rows = []
+        # unbuffered: rows are streamed from the server instead of loading the whole month
+        with frappe.db.unbuffered_cursor():
+            for row in frappe.db.sql("""
+                SELECT {fields} FROM `tabWorkday`
+                WHERE docstatus < 2 AND IFNULL(company, '') = %(company)s AND log_date BETWEEN %(from_date)s AND %(to_date)s
+                ORDER BY employee, log_date
+            """.format(fields=", ".join("`{0}`".format(c[0]) for c in WORKDAY_COLUMNS)), {
+                "company": company,
+                "from_date": from_date,
+                "to_date": get_last_day(from_date),
+            }, as_iterator=True):
+                rows.append(row)
+                if len(rows) >= RECORD_BATCH_SIZE:
+                    count += len(rows)
+                    yield to_record_batch(pa, schema, rows)
+                    rows = []
+        for row in get_archived_workday_rows(company, from_date):
+            rows.append(row)
+            if len(rows) >= RECORD_BATCH_SIZE:
+                count += len(rows)
+                yield to_record_batch(pa, schema, rows)
+                rows = []
+        count += len(rows)
+        yield to_record_batch(pa, schema, rows)
+
+    write_batches(pa, os.path.join(get_partition_folder(folder, "workday", company, month), "part-0.parquet"), schema, batches())
+    return count
+
+
+def get_archived_workday_rows(company, month):
+    '''rows of WORKDAY_COLUMNS from the compressed detail of the Workday Archives of the month,
+    modified is the one of the archive'''
+    from hr_addon.hr_addon.doctype.workday_archive.workday_archive import decompress_detail
+
+    converters = {"date32": getdate, "timestamp": get_datetime, "int8": int, "float64": float, "string": cstr}
+    archives = frappe.get_all("Workday Archive", filters={"company": company or ["is", "not set"], "month": month},
+        pluck="name", order_by="employee asc")
+    for name in archives:
+        detail, modified = frappe.db.get_value("Workday Archive", name, ["detail", "modified"])
+        for workday in decompress_detail(detail):
+            workday["modified"] = modified
+            yield tuple(
+                None if workday.get(field) is None else converters[type_](workday.get(field))
+                for field, type_ in WORKDAY_COLUMNS
+            )
+
+
+def write_interval_partition(pa, folder, company, month):
+    '''(check-in, checkout) intervals of the partition, paired like the Workdays in Log Type mode'''
+    schema = get_schema(pa, INTERVAL_COLUMNS)
+    from_date = getdate("{0}-01".format(month))
+    to_date = get_last_day(from_date)
+    settings = get_pairing_settings()
+
+    employees = frappe.db.sql_list("""
+        SELECT DISTINCT employee FROM `tabWorkday`
+        WHERE docstatus < 2 AND IFNULL(company, '') = %(company)s AND log_date BETWEEN %(from_date)s AND %(to_date)s
+        UNION
+        SELECT DISTINCT employee FROM `tabWorkday Archive`
+        WHERE IFNULL(company, '') = %(company)s AND month = %(from_date)s
+    """, {"company": company, "from_date": from_date, "to_date": to_date})
+
+    def batches():
+        rows = []
+        for i in range(0, len(employees), 100):
+            checkins_by_day = get_employee_checkins_for_range(employees[i:i + 100], add_days(from_date, -1), add_days(to_date, 1))
+            checkins_by_employee = defaultdict(list)
+            for key in sorted(checkins_by_day, key=lambda k: (k[0], k[1])):
+                checkins_by_employee[key[0]].extend(checkins_by_day[key])
+
+            for employee, employee_checkins in checkins_by_employee.items():
+                paired = pair_checkins(employee_checkins, settings.day_boundary_hour, settings.max_shift_hours)
+                for date, day in sorted(paired.items()):
+                    if not from_date <= date <= to_date:
+                        continue
+                    for checkin, checkout in day.intervals or []:
+                        rows.append((employee, date, get_datetime(checkin), get_datetime(checkout),
+                            (checkout - checkin).total_seconds()))
+
+            if len(rows) >= RECORD_BATCH_SIZE:
+                yield to_record_batch(pa, schema, rows)
+                rows = []
+        yield to_record_batch(pa, schema, rows)
+
+    write_batches(pa, os.path.join(get_partition_folder(folder, "checkin_interval", company, month), "part-0.parquet"), schema, batches())
+
+
+def read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as manifest:
+        return json.load(manifest)
+
+
+def write_manifest(manifest_path, manifest):
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
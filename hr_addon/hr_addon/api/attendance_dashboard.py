@@ -0,0 +1,120 @@
+import hashlib
+import json
+import frappe
+from frappe.utils import add_days, flt, get_first_day_of_week, get_timestamp, getdate, parse_json, today
+
+DASHBOARD_CACHE_KEY = "hr_addon:attendance_dashboard:{0}"
+# every manager refreshing the dashboard within this window is served the same result
+DASHBOARD_CACHE_SECONDS = 60
+
+SUMMARY_COLUMNS = ("employees", "total_target_seconds", "actual_working_seconds", "total_work_seconds",
+    "incomplete_days", "days_on_leave", "days_absent")
+
+HEATMAP_VALUES = {
+    "Actual Hours": "actual_working_seconds",
+    "Target Hours": "total_target_seconds",
+    "Incomplete Days": "incomplete_days",
+    "On Leave": "days_on_leave",
+}
+
+
+def get_dashboard_filters(filters=None):
+    '''company, department and a period of "Yesterday" (default), "Today", "This Week" or from_date/to_date.
+    The Workdays of a day are created after it, "Today" and the current week miss most of today'''
+    filters = frappe._dict(parse_json(filters) or {})
+    if filters.get("from_date") and filters.get("to_date"):
+        from_date, to_date = getdate(filters.from_date), getdate(filters.to_date)
+    elif filters.get("period") == "This Week":
+        from_date, to_date = get_first_day_of_week(today()), getdate(today())
+    elif filters.get("period") == "Today":
+        from_date = to_date = getdate(today())
+    else:
+        from_date = to_date = add_days(getdate(today()), -1)
+
+    return frappe._dict({
+        "company": filters.get("company"),
+        "department": filters.get("department"),
+        "from_date": from_date,
+        "to_date": to_date,
+    })
+
+
+def get_summary(filters, group_by_date=False):
+    '''sums of Department Attendance Summary, cached for DASHBOARD_CACHE_SECONDS'''
+    frappe.has_permission("Department Attendance Summary", "read", throw=True)
+
+    cache = frappe.cache()
+    key = DASHBOARD_CACHE_KEY.format(hashlib.sha1(json.dumps([filters, group_by_date], sort_keys=True, default=str).encode()).hexdigest())
+    summary = cache.get_value(key)
+    if summary is not None:
+        return summary
+
+    conditions = ["date BETWEEN %(from_date)s AND %(to_date)s"]
+    if filters.company:
+        conditions.append("company = %(company)s")
+    if filters.department:
+        conditions.append("department = %(department)s")
+
+    rows = frappe.db.sql("""
+        SELECT {date} AS date, {columns}
+        FROM `tabDepartment Attendance Summary`
+        WHERE {conditions}
+        {group_by}
+    """.format(
+        date="date" if group_by_date else "NULL",
+        columns=", ".join("SUM({0}) AS {0}".format(c) for c in SUMMARY_COLUMNS),
+        conditions=" AND ".join(conditions),
+        group_by="GROUP BY date" if group_by_date else "",
+    ), filters, as_dict=1)
+
+    summary = [{"date": str(row.date) if row.date else None, **{c: flt(row.get(c)) for c in SUMMARY_COLUMNS}} for row in rows]
+    cache.set_value(key, summary, expires_in_sec=DASHBOARD_CACHE_SECONDS)
+    return summary
+
+
+def get_card(filters, column, fieldtype="Int", divisor=1):
+    summary = get_summary(get_dashboard_filters(filters))
+    value = summary[0][column] if summary else 0
+    return {"value": flt(value / divisor, 2), "fieldtype": fieldtype}
+
+
+# ----------------------------------------------------------------------
+# Number Card methods
+# ----------------------------------------------------------------------
+@frappe.whitelist()
+def get_target_hours(filters=None):
+    return get_card(filters, "total_target_seconds", "Float", 3600)
+
+
+@frappe.whitelist()
+def get_actual_hours(filters=None):
+    return get_card(filters, "actual_working_seconds", "Float", 3600)
+
+
+@frappe.whitelist()
+def get_incomplete_days(filters=None):
+    return get_card(filters, "incomplete_days")
+
+
+@frappe.whitelist()
+def get_on_leave_days(filters=None):
+    return get_card(filters, "days_on_leave")
+
+
+def get_heatmap(filters=None, heatmap_year=None):
+    '''{"dataPoints": {timestamp: value}} of a year, hours are rounded to whole hours'''
+    filters = frappe._dict(parse_json(filters) or {})
+    year = int(heatmap_year or getdate(today()).year)
+    column = HEATMAP_VALUES.get(filters.get("value") or "Actual Hours", "actual_working_seconds")
+    summary = get_summary(get_dashboard_filters({
+        "company": filters.get("company"),
+        "department": filters.get("department"),
+        "from_date": "{0}-01-01".format(year),
+        "to_date": "{0}-12-31".format(year),
+    }), group_by_date=True)
+
+    divisor = 3600 if column.endswith("_seconds") else 1
+    return {
+        "labels": [],
+        "dataPoints": {get_timestamp(row["date"]): round(row[column] / divisor) for row in summary},
+    }
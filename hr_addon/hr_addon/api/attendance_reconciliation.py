@@ -0,0 +1,261 @@
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, flt, get_datetime, getdate, now_datetime, parse_json, today
+
+from hr_addon.hr_addon.api.job_queue import get_job_class_of_dates, submit_job
+from hr_addon.hr_addon.api.metrics import timed
+from hr_addon.hr_addon.api.report_cache import clear_cached_results
+from hr_addon.hr_addon.api.utils import COMP_OFF_LEAVE_TYPES, get_bulk_insert_names
+from hr_addon.hr_addon.api.workday_form import invalidate_workday_form_data
+from hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary import mark_dates_dirty
+from hr_addon.hr_addon.doctype.workday_anomaly.workday_anomaly import INCOMPLETE_ANOMALIES
+from hr_addon.hr_addon.doctype.workday_change_log.workday_change_log import log_workday_changes
+
+ATTENDANCE_FIELDS = ["name", "naming_series", "employee", "employee_name", "department", "company", "attendance_date",
+    "status", "working_hours", "leave_type", "leave_application", "in_time", "out_time", "docstatus",
+    "creation", "modified", "owner", "modified_by"]
+
+# rows per INSERT and per CASE update
+BATCH_SIZE = 500
+
+DEFAULT_HALF_DAY_THRESHOLD = 50
+
+
+@frappe.whitelist()
+def reconcile_attendance(from_date, to_date, employees=None, company=None, submit=1):
+    '''Create, update and link Attendance from the Workdays of a range in one pass:
+
+    - the status is derived from the Workday: On Leave for approved leave, Absent without check-ins on a day
+      with target hours, Half Day below the half day threshold of HR Addon Settings, Present otherwise.
+      Days without target hours and without check-ins get no Attendance.
+    - missing Attendance is inserted in bulk, submitted unless submit is 0
+    - draft Attendance with another status is updated, submitted Attendance is never changed, a different status
+      is returned as conflict
+    - the Attendance is linked to the Workday and to its Employee Checkins
+
+    Returns {"created", "updated", "linked", "conflicts": [{"employee", "date", "attendance", "status", "expected"}]}
+    '''
+    frappe.only_for(("HR Manager", "System Manager"))
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if from_date > to_date:
+        frappe.throw(_("From Date must be before To Date"))
+
+    employees = parse_json(employees) if isinstance(employees, str) and employees.startswith("[") else employees
+    if isinstance(employees, str):
+        employees = [e.strip() for e in employees.split(",") if e.strip()]
+
+    workdays = get_workdays(from_date, to_date, employees, company)
+    if not workdays:
+        return {"created": 0, "updated": 0, "linked": 0, "conflicts": []}
+
+    employee_names = tuple({w.employee for w in workdays})
+    # overlapping runs wait here until the other one committed, then see its Attendance
+    lock_employees(employee_names)
+    existing = get_existing_attendance(employee_names, from_date, to_date)
+    leaves = get_approved_leaves(employee_names, from_date, to_date)
+    threshold = cint(frappe.db.get_single_value("HR Addon Settings", "half_day_threshold_percent")) or DEFAULT_HALF_DAY_THRESHOLD
+
+    new_attendance, status_updates, workday_links, workday_status, conflicts = [], {}, {}, {}, []
+    for workday in workdays:
+        key = (workday.employee, getdate(workday.log_date))
+        leave = leaves.get(key)
+        status = get_attendance_status(workday, leave, threshold)
+        if not status:
+            continue
+
+        attendance = existing.get(key)
+        if not attendance:
+            new_attendance.append((workday, status, leave))
+        elif attendance.status != status and attendance.docstatus == 0:
+            status_updates[attendance.name] = status
+        elif attendance.status != status:
+            conflicts.append({"employee": workday.employee, "date": key[1], "attendance": attendance.name,
+                "status": attendance.status, "expected": status})
+            # the Workday status is fetched from its Attendance
+            status = attendance.status
+
+        if attendance and workday.attendance != attendance.name:
+            workday_links[workday.name] = attendance.name
+        if workday.status != status:
+            workday_status[workday.name] = status
+
+    workday_links.update(insert_attendance(new_attendance, docstatus=1 if cint(submit) else 0))
+    update_attendance_status(status_updates)
+    update_by_case("Workday", "attendance", workday_links)
+    update_by_case("Workday", "status", workday_status)
+    link_employee_checkins(employee_names, from_date, to_date)
+    log_workday_changes([w for w in workdays if w.name in workday_links or w.name in workday_status],
+        "Update", "attendance_reconciliation")
+
+    # the Workdays were updated without their controller
+    clear_cached_results("Work Hour Report")
+    mark_dates_dirty({getdate(w.log_date) for w in workdays})
+    for employee in employee_names:
+        invalidate_workday_form_data(employee)
+
+    return {
+        "created": len(new_attendance),
+        "updated": len(status_updates),
+        "linked": len(workday_links),
+        "conflicts": conflicts,
+    }
+
+
+def get_attendance_status(workday, leave=None, threshold=DEFAULT_HALF_DAY_THRESHOLD):
+    '''Attendance status of a computed Workday, None for days off without check-ins'''
+    if leave or workday.status == "On Leave":
+        return "On Leave"
+
+    has_checkins = bool(workday.first_checkin) and not cint(workday.manual_workday)
+    total_target_seconds = flt(workday.total_target_seconds)
+    if not has_checkins:
+        return "Absent" if total_target_seconds > 0 else None
+
+    if (workday.anomaly_status not in INCOMPLETE_ANOMALIES and total_target_seconds > 0
+            and max(flt(workday.total_work_seconds), 0) < total_target_seconds * threshold / 100):
+        return "Half Day"
+
+    return "Present"
+
+
+def get_workdays(from_date, to_date, employees=None, company=None):
+    conditions = ["w.docstatus < 2", "w.log_date BETWEEN %(from_date)s AND %(to_date)s"]
+    values = {"from_date": from_date, "to_date": to_date}
+    if employees:
+        conditions.append("w.employee IN %(employees)s")
+        values["employees"] = tuple(employees)
+    if company:
+        conditions.append("w.company = %(company)s")
+        values["company"] = company
+
+    return frappe.db.sql("""
+        SELECT w.name, w.employee, w.log_date, w.company, w.status, w.attendance, w.manual_workday, w.anomaly_status,
+            w.hours_worked, w.total_work_seconds, w.total_target_seconds, w.first_checkin, w.last_checkout,
+            e.employee_name, e.department
+        FROM `tabWorkday` w
+        INNER JOIN `tabEmployee` e ON e.name = w.employee
+        WHERE {conditions}
+        ORDER BY w.employee, w.log_date
+    """.format(conditions=" AND ".join(conditions)), values, as_dict=1)
+
+
+def lock_employees(employees):
+    '''lock the Employee rows until the commit, in name order so that two runs cannot deadlock'''
+    frappe.db.sql("""
+        SELECT name FROM `tabEmployee` WHERE name IN %(employees)s ORDER BY name FOR UPDATE
+    """, {"employees": employees})
+
+
+def get_existing_attendance(employees, from_date, to_date):
+    '''{(employee, date): attendance}, submitted Attendance wins over drafts.
+    A locking read, it sees the Attendance committed by a run that held the lock before'''
+    existing = {}
+    for attendance in frappe.db.sql("""
+        SELECT name, employee, attendance_date, status, docstatus FROM `tabAttendance`
+        WHERE employee IN %(employees)s AND attendance_date BETWEEN %(from_date)s AND %(to_date)s AND docstatus < 2
+        ORDER BY docstatus ASC, creation ASC
+        FOR UPDATE
+    """, {"employees": employees, "from_date": from_date, "to_date": to_date}, as_dict=1):
+        existing[(attendance.employee, getdate(attendance.attendance_date))] = attendance
+
+    return existing
+
+
+def get_approved_leaves(employees, from_date, to_date):
+    '''{(employee, date): leave application} of submitted, approved leave, comp off does not count as leave'''
+    leaves = {}
+    for leave in frappe.db.sql("""
+        SELECT name, employee, leave_type, from_date, to_date FROM `tabLeave Application`
+        WHERE employee IN %(employees)s AND from_date <= %(to_date)s AND to_date >= %(from_date)s
+        AND docstatus = 1 AND status = 'Approved' AND leave_type NOT IN %(comp_off)s
+    """, {"employees": employees, "from_date": from_date, "to_date": to_date, "comp_off": COMP_OFF_LEAVE_TYPES}, as_dict=1):
+        start, end = max(getdate(leave.from_date), from_date), min(getdate(leave.to_date), to_date)
+        for i in range((end - start).days + 1):
+            leaves[(leave.employee, add_days(start, i))] = leave
+
+    return leaves
+
+
+def insert_attendance(rows, docstatus=1):
+    '''bulk insert Attendance for [(workday, status, leave)], returns {workday: attendance}'''
+    if not rows:
+        return {}
+
+    naming_series = (frappe.get_meta("Attendance").get_field("naming_series").options or "").split("\n")[0]
+    names = get_bulk_insert_names("Attendance", len(rows))
+    now, user = now_datetime(), frappe.session.user
+
+    values, links = [], {}
+    for name, (workday, status, leave) in zip(names, rows):
+        has_checkins = status in ("Present", "Half Day")
+        values.append((name, naming_series, workday.employee, workday.employee_name, workday.department, workday.company,
+            workday.log_date, status, flt(workday.hours_worked) if has_checkins else 0,
+            leave.leave_type if leave else None, leave.name if leave else None,
+            get_datetime(workday.first_checkin) if has_checkins else None,
+            get_datetime(workday.last_checkout) if has_checkins and workday.last_checkout else None,
+            docstatus, now, now, user, user))
+        links[workday.name] = name
+
+    for i in range(0, len(values), BATCH_SIZE):
+        frappe.db.bulk_insert("Attendance", ATTENDANCE_FIELDS, values[i:i + BATCH_SIZE])
+
+    return links
+
+
+def update_attendance_status(status_updates):
+    update_by_case("Attendance", "status", status_updates)
+
+
+def update_by_case(doctype, fieldname, values_by_name):
+    '''set fieldname of many documents to a value per document, one CASE update per batch'''
+    names = list(values_by_name)
+    for i in range(0, len(names), BATCH_SIZE):
+        batch = names[i:i + BATCH_SIZE]
+        values = {"modified": now_datetime(), "modified_by": frappe.session.user, "names": tuple(batch)}
+        cases = []
+        for idx, name in enumerate(batch):
+            values["name_{0}".format(idx)] = name
+            values["value_{0}".format(idx)] = values_by_name[name]
+            cases.append("WHEN %(name_{0})s THEN %(value_{0})s".format(idx))
+
+        frappe.db.sql("""
+            UPDATE `tab{doctype}`
+            SET `{fieldname}` = CASE name {cases} END, modified = %(modified)s, modified_by = %(modified_by)s
+            WHERE name IN %(names)s
+        """.format(doctype=doctype, fieldname=fieldname, cases=" ".join(cases)), values)
+
+
+def link_employee_checkins(employees, from_date, to_date):
+    '''set the attendance of unlinked check-ins to the submitted Attendance of their day with one statement'''
+    frappe.db.sql("""
+        UPDATE `tabEmployee Checkin` c
+        INNER JOIN `tabAttendance` a ON a.employee = c.employee AND a.attendance_date = DATE(c.time) AND a.docstatus = 1
+        SET c.attendance = a.name
+        WHERE c.employee IN %(employees)s AND c.time >= %(from_date)s AND c.time < %(to_date)s
+        AND IFNULL(c.attendance, '') = ''
+    """, {"employees": employees, "from_date": from_date, "to_date": add_days(to_date, 1)})
+
+
+@frappe.whitelist()
+def enqueue_attendance_reconciliation(from_date, to_date, employees=None, company=None, submit=1):
+    frappe.only_for(("HR Manager", "System Manager"))
+    submit_job(
+        "hr_addon.hr_addon.api.attendance_reconciliation.reconcile_attendance",
+        {"from_date": from_date, "to_date": to_date, "employees": employees, "company": company, "submit": submit},
+        job_class=get_job_class_of_dates([from_date, to_date]),
+        company=company,
+    )
+
+
+@timed("reconcile_attendance_daily")
+def reconcile_attendance_daily():
+    '''scheduled: reconcile yesterday's Attendance when enabled in HR Addon Settings'''
+    if not cint(frappe.db.get_single_value("HR Addon Settings", "reconcile_attendance_daily")):
+        return
+
+    yesterday = add_days(today(), -1)
+    result = reconcile_attendance(yesterday, yesterday)
+    frappe.db.commit()
+    if result["conflicts"]:
+        frappe.log_error("reconcile_attendance_daily() conflicts", frappe.as_json(result["conflicts"]))
@@ -0,0 +1,183 @@
+import hashlib
+import itertools
+import multiprocessing
+import os
+import traceback
+import frappe
+from frappe import _
+from frappe.utils import add_days, add_months, get_first_day, get_last_day, getdate
+
+from hr_addon.hr_addon.api.job_queue import BACKFILL, job_slot, split_dates_by_job_class, submit_job
+from hr_addon.hr_addon.doctype.workday.workday import process_workdays
+
+# partitions handed to the pool at once, per worker
+BACKFILL_BATCH_PER_WORKER = 4
+
+
+def run_backfill(from_date, to_date, employees=None, company=None, workers=1, restart=False, echo=print):
+    '''Create the missing Workdays between from_date and to_date, partitioned by employee and month.
+    Finished partitions are appended to a checkpoint file so that an interrupted run resumes where it stopped.
+    Every partition takes a backfill slot of the job queue, workers beyond the backfill concurrency wait.'''
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if from_date > to_date:
+        frappe.throw(_("From Date must be before To Date"))
+
+    employees = get_backfill_employees(employees, company, from_date)
+    checkpoint_path = get_checkpoint_path(from_date, to_date, employees)
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    done = read_checkpoint(checkpoint_path)
+    if done:
+        echo("Resuming from {0}: {1} partitions already done".format(checkpoint_path, len(done)))
+
+    partitions = (p for p in get_backfill_partitions(employees, from_date, to_date) if get_partition_key(p) not in done)
+    created, failed = 0, 0
+
+    with open(checkpoint_path, "a") as checkpoint:
+        for partition, count, error in process_partitions(partitions, workers):
+            created += count
+            if error:
+                failed += 1
+                echo("Failed {0}: {1}".format(get_partition_key(partition), error))
+                continue
+            checkpoint.write(get_partition_key(partition) + "\n")
+            checkpoint.flush()
+            echo("Done {0}: {1} workdays".format(get_partition_key(partition), count))
+
+    echo("Backfill finished: {0} workdays created, {1} partitions failed".format(created, failed))
+    return {"created": created, "failed": failed, "checkpoint": checkpoint_path}
+
+
+@frappe.whitelist()
+def enqueue_range_recompute(from_date, to_date, employees=None, company=None):
+    '''Recompute the Workdays between from_date and to_date through the job queue, one job per employee, month
+    and job class. Missing Workdays are created, days whose inputs did not change are skipped by their fingerprint.'''
+    frappe.has_permission("Workday", "write", throw=True)
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if from_date > to_date:
+        frappe.throw(_("From Date must be before To Date"))
+
+    jobs = 0
+    for employee, month_start, month_end in get_backfill_partitions(get_backfill_employees(employees, company, from_date),
+            from_date, to_date):
+        dates = [str(add_days(month_start, i)) for i in range((month_end - month_start).days + 1)]
+        for job_class, class_dates in split_dates_by_job_class(dates).items():
+            submit_job(
+                "hr_addon.hr_addon.doctype.workday.workday.recompute_workdays",
+                {"employee": employee, "dates": class_dates},
+                job_class=job_class,
+                company=frappe.get_cached_value("Employee", employee, "company"),
+            )
+            jobs += 1
+
+    return {"jobs": jobs}
+
+
+def process_partitions(partitions, workers):
+    '''yields (partition, created, error), feeding the pool in small batches to keep memory bounded'''
+    workers = max(int(workers or 1), 1)
+    if workers == 1:
+        for partition in partitions:
+            yield backfill_partition(partition)
+        return
+
+    site, sites_path = frappe.local.site, frappe.local.sites_path
+    # spawn, not fork: every worker opens its own database connection
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=init_backfill_worker, initargs=(site, sites_path)) as pool:
+        while True:
+            batch = list(itertools.islice(partitions, workers * BACKFILL_BATCH_PER_WORKER))
+            if not batch:
+                break
+            yield from pool.imap_unordered(backfill_partition, batch)
+
+
+def init_backfill_worker(site, sites_path):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+
+
+def backfill_partition(partition):
+    '''(partition, created, error), a partition with a failed day reports an error and is not checkpointed'''
+    # the pool workers are long-lived, the messages of failed days would pile up
+    frappe.local.message_log = []
+    try:
+        with job_slot(BACKFILL):
+            return process_partition(partition)
+    except Exception:
+        frappe.db.rollback()
+        return partition, 0, traceback.format_exc(limit=3)
+
+
+def process_partition(partition):
+    employee, month_start, month_end = partition
+    existing = set(frappe.get_all("Workday", filters={
+        "employee": employee,
+        "log_date": ["between", [month_start, month_end]],
+    }, pluck="log_date"))
+    unmarked_days = [
+        str(add_days(month_start, i)) for i in range((month_end - month_start).days + 1)
+        if add_days(month_start, i) not in existing
+    ]
+    if not unmarked_days:
+        return partition, 0, None
+
+    # the range is clamped to the relieving date, relieved employees are backfilled up to it
+    _processed, failed_dates = process_workdays(employee, unmarked_days, "Create workday")
+    frappe.db.commit()
+    created = frappe.db.count("Workday", {
+        "employee": employee,
+        "log_date": ["between", [month_start, month_end]],
+    }) - len(existing)
+    if failed_dates:
+        # the created days stay, a resume retries the failed ones
+        return partition, created, "failed days {0}, see the Error Log".format(", ".join(str(d) for d in failed_dates))
+    return partition, created, None
+
+
+def get_backfill_employees(employees=None, company=None, from_date=None):
+    '''the given employees, else the active ones and those relieved within the range'''
+    if employees:
+        if isinstance(employees, str):
+            employees = [e.strip() for e in employees.split(",") if e.strip()]
+        return sorted(employees)
+
+    filters = {}
+    if company:
+        filters["company"] = company
+    or_filters = [["status", "=", "Active"]]
+    if from_date:
+        or_filters.append(["relieving_date", ">=", from_date])
+    return frappe.get_all("Employee", filters=filters, or_filters=or_filters, pluck="name", order_by="name asc")
+
+
+def get_backfill_partitions(employees, from_date, to_date):
+    '''(employee, first day, last day) per employee and month, clamped to joining and relieving date'''
+    for employee in employees:
+        joining_date, relieving_date = frappe.get_cached_value("Employee", employee, ["date_of_joining", "relieving_date"])
+        start = max(from_date, getdate(joining_date)) if joining_date else from_date
+        end = min(to_date, getdate(relieving_date)) if relieving_date else to_date
+
+        month = get_first_day(start)
+        while month <= end:
+            yield employee, max(month, start), min(get_last_day(month), end)
+            month = add_months(month, 1)
+
+
+def get_partition_key(partition):
+    employee, month_start, _month_end = partition
+    return "{0}|{1}".format(employee, month_start.strftime("%Y-%m"))
+
+
+def get_checkpoint_path(from_date, to_date, employees):
+    run_key = hashlib.sha1("{0}|{1}|{2}".format(from_date, to_date, ",".join(employees)).encode()).hexdigest()[:12]
+    folder = frappe.get_site_path("private", "hr_addon_backfill")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, "{0}_{1}_{2}.txt".format(from_date, to_date, run_key))
+
+
+def read_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as checkpoint:
+        return {line.strip() for line in checkpoint if line.strip()}
@@ -0,0 +1,208 @@
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, get_datetime, getdate, now_datetime, parse_json, today
+
+from hr_addon.hr_addon.api.checkin_pairing import PAIRING_MODE_LOG_TYPE, get_pairing_settings
+from hr_addon.hr_addon.api.metrics import inc, timed
+from hr_addon.hr_addon.api.replica import mark_recent_write
+from hr_addon.hr_addon.api.workday_form import invalidate_workday_form_data
+from hr_addon.hr_addon.api.utils import get_bulk_insert_names
+
+DEVICE_MAP_CACHE_KEY = "hr_addon:attendance_device_map"
+RECOMPUTE_QUEUE_KEY = "hr_addon:workday_recompute_queue"
+
+CHECKIN_FIELDS = ["name", "employee", "employee_name", "log_type", "time", "device_id", "skip_auto_attendance",
+    "creation", "modified", "owner", "modified_by", "docstatus"]
+
+
+@frappe.whitelist(methods=["POST"])
+def ingest_checkins(punches):
+    '''Insert a batch of punches with multi-row writes.
+
+    punches: [{"employee" or "attendance_device_id": ..., "timestamp": ..., "log_type": "IN"|"OUT", "device_id": ...}]
+
+    Punches of the same employee and log type within the bounce window of HR Addon Settings are dropped.
+    The affected (employee, date) keys are queued for workday recomputation, see process_workday_recompute_queue.
+    Like other bulk imports this skips the Employee Checkin controller, shift fields are not fetched.
+    '''
+    frappe.has_permission("Employee Checkin", "create", throw=True)
+
+    punches = parse_json(punches) or []
+    if not isinstance(punches, list):
+        frappe.throw(_("punches must be a list"))
+
+    device_map = get_attendance_device_map()
+    rejected = []
+    valid = []
+    for idx, punch in enumerate(punches):
+        if not isinstance(punch, dict):
+            rejected.append({"idx": idx, "reason": "not an object"})
+            continue
+        employee = punch.get("employee") or device_map.get(str(punch.get("attendance_device_id") or ""))
+        if not employee or not punch.get("timestamp"):
+            rejected.append({"idx": idx, "reason": "unknown employee" if punch.get("timestamp") else "missing timestamp"})
+            continue
+        # one malformed punch is rejected, it does not abort the batch
+        try:
+            time = get_datetime(punch.get("timestamp"))
+        except Exception:
+            time = None
+        if not time:
+            rejected.append({"idx": idx, "reason": "invalid timestamp"})
+            continue
+        if punch.get("log_type") not in (None, "", "IN", "OUT"):
+            rejected.append({"idx": idx, "reason": "invalid log_type"})
+            continue
+        valid.append(frappe._dict({
+            "idx": idx,
+            "employee": employee,
+            "time": time,
+            "log_type": punch.get("log_type") or None,
+            "device_id": punch.get("device_id"),
+        }))
+
+    # a supplied employee is not checked by the device map
+    existing_employees = set(frappe.get_all("Employee", filters={"name": ["in", list({p.employee for p in valid})]},
+        pluck="name")) if valid else set()
+    for punch in valid:
+        if punch.employee not in existing_employees:
+            rejected.append({"idx": punch.idx, "reason": "unknown employee"})
+    valid = [p for p in valid if p.employee in existing_employees]
+    rejected.sort(key=lambda r: r["idx"])
+
+    bounce_window = cint(frappe.db.get_single_value("HR Addon Settings", "checkin_bounce_window_seconds"))
+    new_checkins, duplicates = drop_bounce_duplicates(valid, bounce_window)
+    insert_checkins(new_checkins)
+    affected_keys = {(c.employee, getdate(c.time)) for c in new_checkins}
+    if get_pairing_settings().mode == PAIRING_MODE_LOG_TYPE:
+        # the punch may close a shift that started the day before
+        affected_keys |= {(employee, add_days(date, -1)) for employee, date in affected_keys}
+    mark_for_recompute(affected_keys)
+
+    return {
+        "inserted": len(new_checkins),
+        "duplicates": duplicates,
+        "rejected": rejected,
+    }
+
+
+def drop_bounce_duplicates(punches, bounce_window):
+    '''drop punches of the same employee and log type closer than bounce_window seconds to the previous one,
+    the latest existing Employee Checkin of each employee is read with one query'''
+    if not punches:
+        return [], 0
+
+    punches = sorted(punches, key=lambda p: (p.employee, p.time))
+    employees = tuple({p.employee for p in punches})
+    from_time = min(p.time for p in punches) - frappe.utils.datetime.timedelta(seconds=bounce_window)
+    to_time = max(p.time for p in punches)
+
+    existing = frappe.db.sql("""
+        SELECT employee, log_type, time FROM `tabEmployee Checkin`
+        WHERE employee IN %(employees)s AND time BETWEEN %(from_time)s AND %(to_time)s
+        ORDER BY employee, time
+    """, {"employees": employees, "from_time": from_time, "to_time": to_time}, as_dict=1)
+    existing_by_employee = {}
+    for checkin in existing:
+        existing_by_employee.setdefault(checkin.employee, []).append(checkin)
+
+    kept, duplicates = [], 0
+    for employee_punches in group_by_employee(punches):
+        employee = employee_punches[0].employee
+        known = existing_by_employee.get(employee, [])
+        known_times = {(get_datetime(c.time), c.log_type) for c in known}
+        last_by_type = {}
+        for c in known:
+            last_by_type[c.log_type] = get_datetime(c.time)
+
+        for punch in employee_punches:
+            last = last_by_type.get(punch.log_type)
+            if (punch.time, punch.log_type) in known_times or (
+                last and 0 <= (punch.time - last).total_seconds() <= bounce_window):
+                duplicates += 1
+                continue
+            kept.append(punch)
+            last_by_type[punch.log_type] = punch.time
+
+    return kept, duplicates
+
+
+def group_by_employee(punches):
+    group = []
+    for punch in punches:
+        if group and group[-1].employee != punch.employee:
+            yield group
+            group = []
+        group.append(punch)
+    if group:
+        yield group
+
+
+def insert_checkins(checkins):
+    if not checkins:
+        return
+
+    employee_names = dict(frappe.get_all("Employee", filters={"name": ["in", list({c.employee for c in checkins})]},
+        fields=["name", "employee_name"], as_list=True))
+    names = get_bulk_insert_names("Employee Checkin", len(checkins))
+    now, user = now_datetime(), frappe.session.user
+
+    values = [
+        (name, c.employee, employee_names.get(c.employee), c.log_type, c.time, c.device_id, 0, now, now, user, user, 0)
+        for name, c in zip(names, checkins)
+    ]
+    frappe.db.bulk_insert("Employee Checkin", CHECKIN_FIELDS, values)
+    for employee in employee_names:
+        mark_recent_write(employee)
+        invalidate_workday_form_data(employee)
+
+
+def get_attendance_device_map():
+    '''{attendance_device_id: employee}, cached until an Employee changes'''
+    def generator():
+        return dict(frappe.db.sql("""
+            SELECT attendance_device_id, name FROM `tabEmployee`
+            WHERE IFNULL(attendance_device_id, '') != ''
+        """))
+
+    return frappe.cache().get_value(DEVICE_MAP_CACHE_KEY, generator)
+
+
+def clear_attendance_device_map(doc=None, method=None):
+    frappe.cache().delete_value(DEVICE_MAP_CACHE_KEY)
+
+
+def mark_for_recompute(keys):
+    '''queue (employee, date) keys whose Workday has to be (re)computed'''
+    if keys:
+        frappe.cache().sadd(RECOMPUTE_QUEUE_KEY, *["{0}|{1}".format(employee, date) for employee, date in keys])
+
+
+@timed("process_workday_recompute_queue")
+def process_workday_recompute_queue():
+    '''scheduled: recompute the Workdays of the queued keys, today's keys stay until the day is over'''
+    from hr_addon.hr_addon.doctype.workday.workday import recompute_workdays
+
+    cache = frappe.cache()
+    members = [frappe.safe_decode(m) for m in cache.smembers(RECOMPUTE_QUEUE_KEY)]
+    due = [m for m in members if m.rsplit("|", 1)[1] < today()]
+    if not due:
+        return
+
+    # taken off the queue before computing, a punch arriving meanwhile queues its key again
+    cache.srem(RECOMPUTE_QUEUE_KEY, *due)
+
+    dates_by_employee = {}
+    for member in due:
+        employee, date = member.rsplit("|", 1)
+        dates_by_employee.setdefault(employee, []).append(date)
+
+    for employee, dates in dates_by_employee.items():
+        try:
+            recompute_workdays(employee, dates)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            inc("hr_addon_failures_total", stage="recompute_queue", type=type(e).__name__)
+            frappe.log_error("process_workday_recompute_queue() {0}".format(employee), frappe.get_traceback())
+            mark_for_recompute({(employee, date) for date in dates})
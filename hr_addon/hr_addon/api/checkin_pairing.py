@@ -0,0 +1,97 @@
+from collections import defaultdict
+from datetime import timedelta
+import frappe
+from frappe.utils import add_days, cint, get_datetime, getdate
+
+from hr_addon.hr_addon.api.utils import get_employee_checkins_for_range
+
+PAIRING_MODE_CALENDAR_DAY = "Calendar Day"
+PAIRING_MODE_LOG_TYPE = "Log Type across Midnight"
+
+
+def pair_checkins(employee_checkins, day_boundary_hour=0, max_shift_hours=16):
+    '''Pair the check-ins of one employee, sorted by time, in a single pass.
+
+    An IN is closed by the next OUT if it comes within max_shift_hours, the interval belongs to the workday of its IN,
+    also when it ends after midnight. Punches without log_type alternate IN/OUT. A workday starts at day_boundary_hour,
+    punches before that hour belong to the previous date.
+
+    Returns {date: {"checkins": [...], "intervals": [(in, out)] or None if the day has unpaired punches}}
+    '''
+    boundary = timedelta(hours=cint(day_boundary_hour))
+    max_shift = timedelta(hours=cint(max_shift_hours) or 16)
+    days = defaultdict(lambda: frappe._dict({"checkins": [], "intervals": [], "unpaired": 0}))
+
+    def workday_of(checkin):
+        return getdate(get_datetime(checkin.time) - boundary)
+
+    def add_unpaired(checkin):
+        day = days[workday_of(checkin)]
+        day.checkins.append(checkin)
+        day.unpaired += 1
+
+    open_in = None
+    for checkin in employee_checkins:
+        log_type = checkin.log_type or ("IN" if open_in is None else "OUT")
+        if log_type == "IN":
+            if open_in:
+                add_unpaired(open_in)
+            open_in = checkin
+            continue
+
+        if open_in and get_datetime(checkin.time) - get_datetime(open_in.time) <= max_shift:
+            day = days[workday_of(open_in)]
+            day.checkins.extend([open_in, checkin])
+            day.intervals.append((get_datetime(open_in.time), get_datetime(checkin.time)))
+        else:
+            if open_in:
+                add_unpaired(open_in)
+            add_unpaired(checkin)
+        open_in = None
+
+    if open_in:
+        add_unpaired(open_in)
+
+    paired_checkins = {}
+    for date, day in days.items():
+        day.checkins.sort(key=lambda c: get_datetime(c.time))
+        paired_checkins[date] = frappe._dict({
+            "checkins": day.checkins,
+            "intervals": None if day.unpaired else sorted(day.intervals),
+        })
+
+    return paired_checkins
+
+
+def get_pairing_settings():
+    hr_addon_settings = frappe.get_cached_doc("HR Addon Settings")
+    return frappe._dict({
+        "mode": hr_addon_settings.get("checkin_pairing_mode") or PAIRING_MODE_CALENDAR_DAY,
+        "day_boundary_hour": cint(hr_addon_settings.get("day_boundary_hour")),
+        "max_shift_hours": cint(hr_addon_settings.get("max_shift_hours")) or 16,
+    })
+
+
+def get_paired_checkins_for_range(employee, from_date, to_date):
+    '''{date: paired check-ins} of one employee with one query for the whole range,
+    None when check-ins are paired per calendar day (the default)'''
+    settings = get_pairing_settings()
+    if settings.mode != PAIRING_MODE_LOG_TYPE:
+        return None
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    # one day of margin on both sides for shifts crossing the range borders
+    checkins_by_day = get_employee_checkins_for_range([employee], add_days(from_date, -1), add_days(to_date, 1))
+    employee_checkins = [c for key in sorted(checkins_by_day) for c in checkins_by_day[key]]
+
+    paired_checkins = pair_checkins(employee_checkins, settings.day_boundary_hour, settings.max_shift_hours)
+    empty = frappe._dict({"checkins": [], "intervals": []})
+    return {
+        add_days(from_date, i): paired_checkins.get(add_days(from_date, i), empty)
+        for i in range((to_date - from_date).days + 1)
+    }
+
+
+def get_paired_checkins_for_date(employee, adate):
+    paired_checkins = get_paired_checkins_for_range(employee, adate, adate)
+    return paired_checkins[getdate(adate)] if paired_checkins is not None else None
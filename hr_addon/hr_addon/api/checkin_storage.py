@@ -0,0 +1,129 @@
+import json
+import frappe
+from frappe.utils import cint, cstr
+
+# Workdays migrated per transaction by migrate_to_compact_storage
+MIGRATION_BATCH_SIZE = 500
+
+
+def is_compact_storage():
+    return cint(frappe.db.get_single_value("HR Addon Settings", "compact_checkin_storage"))
+
+
+def pack_checkins(employee_checkins):
+    '''[[name, time], ...] as compact JSON, log type and the other details stay in `tabEmployee Checkin`'''
+    return json.dumps([[c[0], cstr(c[1])] for c in employee_checkins], separators=(",", ":"))
+
+
+def unpack_checkins(checkin_refs):
+    return [tuple(ref) for ref in json.loads(checkin_refs)] if checkin_refs else []
+
+
+def set_workday_checkins(workday, employee_checkins, compact=None):
+    '''store the check-ins of a Workday either as child rows or packed into checkin_refs'''
+    compact = is_compact_storage() if compact is None else compact
+    workday.employee_checkins = []
+    workday.checkin_refs = ""
+
+    if compact:
+        workday.checkin_refs = pack_checkins([(c.get("name"), c.get("time")) for c in employee_checkins]) if employee_checkins else ""
+        return
+
+    for employee_checkin in employee_checkins:
+        workday.append("employee_checkins", {
+            "employee_checkin": employee_checkin.get("name"),
+            "log_type": employee_checkin.get("log_type"),
+            "log_time": employee_checkin.get("time"),
+            "skip_auto_attendance": employee_checkin.get("skip_auto_attendance"),
+        })
+
+
+def load_checkin_rows(workday):
+    '''fill the Employee Checkins table of a compact Workday in memory, joined back to `tabEmployee Checkin`'''
+    refs = unpack_checkins(workday.checkin_refs)
+    if not refs or workday.employee_checkins:
+        return
+
+    # an empty table on save then means the rows were removed, see pack_checkin_rows
+    workday.flags.checkin_rows_loaded = True
+    details = {
+        c.name: c for c in frappe.get_all("Employee Checkin", filters={"name": ["in", [r[0] for r in refs]]},
+            fields=["name", "log_type", "skip_auto_attendance"])
+    }
+    for name, time in refs:
+        detail = details.get(name) or frappe._dict()
+        workday.append("employee_checkins", {
+            "employee_checkin": name,
+            "log_type": detail.log_type,
+            "log_time": time,
+            "skip_auto_attendance": detail.skip_auto_attendance,
+        })
+
+
+def pack_checkin_rows(workday):
+    '''before saving a compact Workday, child rows sent back by the form move into checkin_refs.
+    A table that was loaded and is empty now clears them'''
+    if workday.employee_checkins:
+        workday.checkin_refs = pack_checkins([(d.employee_checkin, d.log_time) for d in workday.employee_checkins])
+        workday.employee_checkins = []
+    elif workday.flags.checkin_rows_loaded:
+        workday.checkin_refs = ""
+
+
+def get_checkin_refs(workday_names):
+    '''{workday: [(checkin, time), ...]} for compact and child table Workdays'''
+    refs = {}
+    if not workday_names:
+        return refs
+
+    for name, checkin_refs in frappe.db.sql("""
+        SELECT name, checkin_refs FROM `tabWorkday` WHERE name IN %(names)s AND IFNULL(checkin_refs, '') != ''
+    """, {"names": tuple(workday_names)}):
+        refs[name] = unpack_checkins(checkin_refs)
+
+    for parent, checkin, log_time in frappe.db.sql("""
+        SELECT parent, employee_checkin, log_time FROM `tabEmployee Checkins`
+        WHERE parenttype = 'Workday' AND parent IN %(names)s ORDER BY parent, idx
+    """, {"names": tuple(workday_names)}):
+        refs.setdefault(parent, []).append((checkin, log_time))
+
+    return refs
+
+
+def enqueue_migration_to_compact_storage():
+    frappe.enqueue(
+        "hr_addon.hr_addon.api.checkin_storage.migrate_to_compact_storage",
+        queue="long",
+        job_id="hr_addon_migrate_to_compact_storage",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+def migrate_to_compact_storage(batch_size=MIGRATION_BATCH_SIZE):
+    '''pack the existing Employee Checkins child rows into checkin_refs, one batch of Workdays per transaction'''
+    while is_compact_storage():
+        parents = [p[0] for p in frappe.db.sql("""
+            SELECT DISTINCT parent FROM `tabEmployee Checkins` WHERE parenttype = 'Workday' LIMIT %s
+        """, cint(batch_size))]
+        if not parents:
+            break
+
+        rows = frappe.db.sql("""
+            SELECT parent, employee_checkin, log_time FROM `tabEmployee Checkins`
+            WHERE parenttype = 'Workday' AND parent IN %(parents)s ORDER BY parent, idx
+        """, {"parents": tuple(parents)})
+        refs = {}
+        for parent, checkin, log_time in rows:
+            refs.setdefault(parent, []).append((checkin, log_time))
+
+        values = []
+        for parent, checkins in refs.items():
+            values.extend([parent, pack_checkins(checkins)])
+        frappe.db.sql("""
+            UPDATE `tabWorkday` SET checkin_refs = CASE name {0} END WHERE name IN %s
+        """.format(" ".join(["WHEN %s THEN %s"] * len(refs))), tuple(values) + (tuple(refs),))
+        frappe.db.sql("""
+            DELETE FROM `tabEmployee Checkins` WHERE parenttype = 'Workday' AND parent IN %(parents)s
+        """, {"parents": tuple(parents)})
+        frappe.db.commit()
@@ -2,7 +2,19 @@ import io, os
 import frappe
 from icalendar import Event, Calendar
 from datetime import datetime
+from frappe.utils import cint
 from frappe.utils.file_manager import save_file
+from hr_addon.hr_addon.api.metrics import observe, timer
+from hr_addon.hr_addon.api.sequence_feed import decode_sequence_cursor, get_head_cursor, is_compacted, read_sequence_feed
+
+LEAVE_FIELDS = ["name", "status", "from_date", "to_date", "employee_name", "leave_type", "description", "amended_from"]
+
+def get_leave_uid(leave_application_name):
+    '''event UID of a Leave Application, amendments keep the UID of the original'''
+    uid = leave_application_name
+    if uid.count("-") == 4 and uid.find("CANCELLED") < 0:
+        uid = uid[:-2]
+    return uid
 
 def generate_leave_ical_file(leave_applications):
     cal = Calendar()
@@ -20,9 +32,7 @@ def generate_leave_ical_file(leave_applications):
         if not description:
             description = ""
 
-        uid = leave_application.name
-        if uid.count("-") == 4 and uid.find("CANCELLED") < 0:
-            uid = uid[:-2]
+        uid = get_leave_uid(leave_application.name)
 
         event.add('dtstart', start_date)
         event.add('dtend', end_date)
@@ -45,26 +55,48 @@ def export_calendar(doc, method=None):
     This function is triggered when a Leave Application is created/changed/updated.
     """
     if doc.status == "Approved" or doc.status == "Cancelled":
-        leave_applications = frappe.db.get_list("Leave Application", 
-                        filters=[["status", "in", ["Approved", "Cancelled"]]],
-                        fields=["name", "status", "from_date", "to_date", "employee_name", "leave_type", "description", "amended_from"])
+        leave_applications = set_cancelled_leaves(get_leave_applications_for_export(doc))
+
+        with timer("hr_addon_ics_render_seconds"):
+            ical_data = generate_leave_ical_file(leave_applications)
 
-        index = 0
-        for la in leave_applications:
-            if la["status"] == "Cancelled":
-                la["cancelled"] = False
-                if la["name"] in [app["amended_from"] for app in leave_applications]:
-                    del leave_applications[index]
-                else:
-                    la["cancelled"] = True
-            index = index + 1
+            # Save the iCalendar data as a File document
+            file_name = frappe.db.get_single_value("HR Addon Settings", "name_of_calendar_export_ics_file")
+            file_name = "{}.ics".format(file_name)  # Set the desired filename here
+            create_file(file_name, ical_data, doc.name)
+        observe("hr_addon_ics_size_bytes", len(ical_data))
 
-        ical_data = generate_leave_ical_file(leave_applications)
 
-        # Save the iCalendar data as a File document
-        file_name = frappe.db.get_single_value("HR Addon Settings", "name_of_calendar_export_ics_file")
-        file_name = "{}.ics".format(file_name)  # Set the desired filename here
-        create_file(file_name, ical_data, doc.name)
+def set_cancelled_leaves(leave_applications):
+    '''drop cancelled Leave Applications that were amended, mark the others as cancelled'''
+    index = 0
+    for la in leave_applications:
+        if la["status"] == "Cancelled":
+            la["cancelled"] = False
+            if la["name"] in [app["amended_from"] for app in leave_applications]:
+                del leave_applications[index]
+            else:
+                la["cancelled"] = True
+        index = index + 1
+
+    return leave_applications
+
+
+def get_leave_applications_for_export(doc):
+    """
+    Approved and cancelled Leave Applications.
+    The document being saved is not committed yet, it is taken from memory.
+    Read from the primary: the file is rewritten completely, a lagging replica would drop recent leaves from it.
+    """
+    fields = LEAVE_FIELDS
+    leave_applications = frappe.db.get_list("Leave Application",
+                    filters=[["status", "in", ["Approved", "Cancelled"]], ["name", "!=", doc.name]],
+                    fields=fields)
+
+    if doc.status in ("Approved", "Cancelled"):
+        leave_applications.append(frappe._dict({field: doc.get(field) for field in fields}))
+
+    return leave_applications
 
 
 def create_file(file_name, file_content, doc_name):
@@ -77,3 +109,56 @@ def create_file(file_name, file_content, doc_name):
     file_path = os.path.join(folder_path, file_name)
     with open(file_path, 'wb') as ical_file:
         ical_file.write(file_content)
+
+
+@frappe.whitelist()
+def get_leave_calendar_changes(sync_token=None):
+    """
+    Events of the leave calendar that were added, changed or cancelled since sync_token, with the UIDs of
+    generate_leave_ical_file. Without a sync_token, or with one older than the Leave Calendar Change log,
+    the full calendar is returned.
+
+    Returns {"sync_token": ..., "full": 0|1, "ics": calendar with the events, "removed": [UIDs no longer in the calendar]}.
+    Pass sync_token with the next call, it keeps the changes of uncommitted transactions open, see read_sequence_feed.
+    """
+    frappe.has_permission("Leave Application", "read", throw=True)
+
+    last_sequence, _gaps = decode_sequence_cursor(sync_token)
+    full = not last_sequence or is_compacted("Leave Calendar Change", last_sequence)
+    if full:
+        # the calendar is read completely, the log only gives the token
+        next_token = get_head_cursor("Leave Calendar Change")
+        leave_applications = get_calendar_leave_applications()
+        uids = set()
+    else:
+        feed = read_sequence_feed("Leave Calendar Change", ["uid"], sync_token)
+        next_token = feed.cursor
+        uids = {row.uid for row in feed.rows}
+        leave_applications = get_calendar_leave_applications(uids) if uids else []
+
+    leave_applications = set_cancelled_leaves(leave_applications)
+    return {
+        "sync_token": next_token,
+        "full": cint(full),
+        "ics": frappe.safe_decode(generate_leave_ical_file(leave_applications)),
+        "removed": [] if full else sorted(uids - {get_leave_uid(la.name) for la in leave_applications}),
+    }
+
+
+def get_calendar_leave_applications(uids=None):
+    """
+    Approved and cancelled Leave Applications, all of them or the ones whose event has one of the uids.
+    Read from the primary, the changes were just logged.
+    """
+    filters = [["status", "in", ["Approved", "Cancelled"]]]
+    if uids is not None:
+        # amendments are named after the original
+        names = [name for name, in frappe.db.sql("""
+            SELECT name FROM `tabLeave Application` WHERE {0}
+        """.format(" OR ".join(["name LIKE %s"] * len(uids))), tuple("{0}%".format(uid) for uid in uids))
+            if get_leave_uid(name) in uids]
+        if not names:
+            return []
+        filters.append(["name", "in", names])
+
+    return frappe.get_all("Leave Application", filters=filters, fields=LEAVE_FIELDS, order_by="name asc")
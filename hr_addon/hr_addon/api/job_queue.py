@@ -0,0 +1,209 @@
+import json
+import time
+from contextlib import contextmanager
+import frappe
+from frappe.utils import cint, date_diff, today
+
+from hr_addon.hr_addon.api.metrics import inc, observe, timed
+
+# priority classes in dispatch order
+INTERACTIVE = "interactive"
+SCHEDULED = "scheduled"
+BACKFILL = "backfill"
+JOB_CLASSES = (INTERACTIVE, SCHEDULED, BACKFILL)
+
+# jobs of a class running at the same time, hr_addon_job_concurrency in site_config overrides them
+DEFAULT_CONCURRENCY = {INTERACTIVE: 4, SCHEDULED: 2, BACKFILL: 1}
+
+# RQ queue of a class, backfill never takes more long workers than its concurrency
+RQ_QUEUES = {INTERACTIVE: "default", SCHEDULED: "long", BACKFILL: "long"}
+JOB_TIMEOUT_SECONDS = 60 * 60
+
+# days up to this age are recent and run as interactive, days older than BACKFILL_DAYS as backfill
+RECENT_DAYS = 2
+BACKFILL_DAYS = 31
+
+QUEUE_KEY = "hr_addon:job_queue:{0}:{1}"
+COMPANIES_KEY = "hr_addon:job_queue_companies:{0}"
+RUNNING_KEY = "hr_addon:job_queue_running:{0}"
+DISPATCH_LOCK_KEY = "hr_addon:job_queue_dispatch_lock"
+DISPATCH_LOCK_SECONDS = 30
+
+
+def get_job_class_of_dates(dates, default=SCHEDULED):
+    '''class of a job over dates: interactive when all are recent, backfill when one is historical'''
+    ages = [date_diff(today(), d) for d in dates]
+    if ages and max(ages) <= RECENT_DAYS:
+        return INTERACTIVE
+    if ages and max(ages) > BACKFILL_DAYS:
+        return BACKFILL
+    return default
+
+
+def split_dates_by_job_class(dates, default=SCHEDULED):
+    '''{job class: dates}, the recent days of a backfill do not wait for its historical ones'''
+    dates_by_class = {}
+    for d in dates:
+        dates_by_class.setdefault(get_job_class_of_dates([d], default), []).append(d)
+
+    return dates_by_class
+
+
+def submit_job(method, kwargs, job_class=SCHEDULED, company=None):
+    '''queue method(**kwargs) in its class, jobs of a class are taken round-robin across companies'''
+    if job_class not in JOB_CLASSES:
+        frappe.throw("Unknown job class {0}".format(job_class))
+
+    cache = frappe.cache()
+    company = company or ""
+    job = json.dumps({
+        "job_id": frappe.generate_hash(length=12),
+        "company": company,
+        "user": frappe.session.user,
+        "method": method,
+        "kwargs": kwargs,
+        "submitted": time.time(),
+    }, default=str)
+
+    pipeline = cache.pipeline()
+    pipeline.rpush(cache.make_key(QUEUE_KEY.format(job_class, company)), job)
+    pipeline.sadd(cache.make_key(COMPANIES_KEY.format(job_class)), company)
+    pipeline.execute()
+    inc("hr_addon_priority_jobs_submitted_total", job_class=job_class)
+
+    # the job may read what the caller writes, it starts after the commit
+    frappe.db.after_commit.add(dispatch_jobs)
+
+
+def get_concurrency():
+    concurrency = dict(DEFAULT_CONCURRENCY)
+    concurrency.update({k: cint(v) for k, v in (frappe.conf.get("hr_addon_job_concurrency") or {}).items() if k in concurrency})
+    return concurrency
+
+
+def get_running(cache, job_class):
+    '''jobs of the class started and not finished, entries of crashed workers expire with the job timeout'''
+    key = cache.make_key(RUNNING_KEY.format(job_class))
+    cache.zremrangebyscore(key, "-inf", time.time())
+    return cache.zcard(key)
+
+
+@timed("dispatch_jobs")
+def dispatch_jobs():
+    '''start queued jobs by priority class up to the concurrency of each class.
+    Runs on submit, after every job and from the scheduler'''
+    cache = frappe.cache()
+    lock_key = cache.make_key(DISPATCH_LOCK_KEY)
+    if not cache.set(lock_key, 1, ex=DISPATCH_LOCK_SECONDS, nx=True):
+        # another worker is dispatching
+        return
+
+    try:
+        for job_class, limit in get_concurrency().items():
+            free = limit - get_running(cache, job_class)
+            while free > 0:
+                job = pop_next_job(cache, job_class)
+                if not job:
+                    break
+                start_job(cache, job_class, job)
+                free -= 1
+    finally:
+        cache.delete(lock_key)
+
+
+def pop_next_job(cache, job_class):
+    '''the oldest job of the next company in turn, companies without jobs leave the rotation'''
+    companies_key = COMPANIES_KEY.format(job_class)
+    companies = sorted(frappe.safe_decode(c) for c in cache.smembers(companies_key))
+    if not companies:
+        return None
+
+    turn = cint(cache.incr(cache.make_key(companies_key + ":turn")))
+    for i in range(len(companies)):
+        company = companies[(turn + i) % len(companies)]
+        job = cache.lpop(QUEUE_KEY.format(job_class, company))
+        if job:
+            return json.loads(frappe.safe_decode(job))
+        cache.srem(companies_key, company)
+        if cache.llen(QUEUE_KEY.format(job_class, company)):
+            # submitted meanwhile
+            cache.sadd(companies_key, company)
+
+    return None
+
+
+def start_job(cache, job_class, job):
+    cache.zadd(cache.make_key(RUNNING_KEY.format(job_class)), {job["job_id"]: time.time() + JOB_TIMEOUT_SECONDS})
+    try:
+        frappe.enqueue(
+            "hr_addon.hr_addon.api.job_queue.run_job",
+            queue=RQ_QUEUES[job_class],
+            timeout=JOB_TIMEOUT_SECONDS,
+            job_class=job_class,
+            job=job,
+        )
+    except Exception:
+        # back to the head of its queue
+        cache.zrem(cache.make_key(RUNNING_KEY.format(job_class)), job["job_id"])
+        cache.lpush(QUEUE_KEY.format(job_class, job["company"]), json.dumps(job, default=str))
+        cache.sadd(COMPANIES_KEY.format(job_class), job["company"])
+        raise
+    observe("hr_addon_priority_job_wait_seconds", time.time() - job["submitted"], job_class=job_class)
+
+
+def run_job(job_class, job):
+    # the job runs as the user who submitted it, like frappe.enqueue
+    frappe.set_user(job["user"])
+    try:
+        frappe.get_attr(job["method"])(**job["kwargs"])
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        inc("hr_addon_failures_total", stage="job_queue", type=type(e).__name__)
+        frappe.log_error("run_job() {0}".format(job["method"]), frappe.get_traceback())
+    finally:
+        cache = frappe.cache()
+        cache.zrem(cache.make_key(RUNNING_KEY.format(job_class)), job["job_id"])
+        dispatch_jobs()
+
+
+@contextmanager
+def job_slot(job_class, poll_seconds=1):
+    '''run a block outside of the queue as a job of job_class: waits for a free slot of the class and holds it.
+    For long-running callers like the backfill command, which report their own results'''
+    cache = frappe.cache()
+    slot_id = "slot-{0}".format(frappe.generate_hash(length=12))
+    while not take_slot(cache, job_class, slot_id):
+        time.sleep(poll_seconds)
+
+    try:
+        yield
+    finally:
+        cache.zrem(cache.make_key(RUNNING_KEY.format(job_class)), slot_id)
+        dispatch_jobs()
+
+
+def take_slot(cache, job_class, slot_id):
+    '''count slot_id as a running job of the class if the class has a free slot, under the dispatch lock'''
+    lock_key = cache.make_key(DISPATCH_LOCK_KEY)
+    if not cache.set(lock_key, 1, ex=DISPATCH_LOCK_SECONDS, nx=True):
+        return False
+
+    try:
+        if get_running(cache, job_class) >= get_concurrency()[job_class]:
+            return False
+        cache.zadd(cache.make_key(RUNNING_KEY.format(job_class)), {slot_id: time.time() + JOB_TIMEOUT_SECONDS})
+        return True
+    finally:
+        cache.delete(lock_key)
+
+
+def get_pending_jobs():
+    '''{job class: jobs waiting}'''
+    cache = frappe.cache()
+    pending = {}
+    for job_class in JOB_CLASSES:
+        companies = [frappe.safe_decode(c) for c in cache.smembers(COMPANIES_KEY.format(job_class))]
+        pending[job_class] = sum(cache.llen(QUEUE_KEY.format(job_class, company)) for company in companies)
+
+    return pending
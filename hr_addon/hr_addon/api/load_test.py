@@ -0,0 +1,293 @@
+import json
+import multiprocessing
+import random
+import time
+import traceback
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, flt, getdate, now_datetime, today
+
+# device_id of the synthetic punches, removed again after the run
+LOAD_TEST_DEVICE = "hr-addon-load-test"
+
+# seconds between spawning the workers and the common start, time for frappe.init and the first connection
+START_DELAY_SECONDS = 10
+
+PERCENTILES = (50, 90, 95, 99)
+
+# status counters of InnoDB read before and after the run
+LOCK_STATUS_VARIABLES = ("Innodb_row_lock_waits", "Innodb_row_lock_time", "Innodb_deadlocks")
+
+
+def run_load_test(duration=60, employees=50, company=None, punch_workers=4, punch_rate=300, punch_batch=10,
+        form_workers=4, form_rate=120, leave_workers=1, leave_rate=6, generation_workers=1, generation_rate=2,
+        recompute_workers=1, recompute_rate=1, seed=None, keep_data=False, output=None, echo=print):
+    '''Drive punches, Workday forms, leave calendar exports, workday generation and the recompute queue
+    at the same time against the current site, each operation from its own worker processes.
+
+    Rates are arrivals per minute of an operation over all of its workers, arrivals are exponentially distributed.
+    Latencies are measured from the planned arrival, an operation waiting for a busy worker counts its wait.
+    Punches are synthetic and deleted after the run unless keep_data is set, together with the Workdays,
+    anomalies and change log rows the run wrote.'''
+    if not frappe.conf.allow_tests:
+        frappe.throw(_("The load test writes Employee Checkins, enable allow_tests in site_config.json of a test site"))
+
+    employees = get_load_test_employees(cint(employees), company)
+    if not employees:
+        frappe.throw(_("No active Employee with Weekly Working Hours found"))
+    leave_applications = frappe.get_all("Leave Application", filters={"status": "Approved", "docstatus": 1},
+        pluck="name", order_by="modified desc", limit=50)
+    if not leave_applications and cint(leave_workers):
+        echo("No approved Leave Application found, the leave calendar export is skipped")
+        leave_workers = 0
+
+    operations = [
+        ("punch", punch_workers, punch_rate, {"batch": cint(punch_batch) or 1}),
+        ("workday_form", form_workers, form_rate, {}),
+        ("leave_export", leave_workers, leave_rate, {"leave_applications": leave_applications}),
+        ("workday_generation", generation_workers, generation_rate, {}),
+        ("recompute_queue", recompute_workers, recompute_rate, {}),
+    ]
+    seed = cint(seed) if seed is not None else random.randrange(1 << 30)
+    start_at = time.time() + START_DELAY_SECONDS
+    tasks = []
+    for operation, workers, rate, options in operations:
+        workers = cint(workers)
+        for i in range(workers):
+            tasks.append(frappe._dict({
+                "operation": operation,
+                "rate_per_second": flt(rate) / 60 / workers,
+                "start_at": start_at,
+                "duration": flt(duration),
+                "seed": seed + len(tasks),
+                "employees": employees,
+                "options": options,
+            }))
+    tasks = [t for t in tasks if t.rate_per_second > 0]
+    if not tasks:
+        frappe.throw(_("Every operation has zero workers or a zero rate"))
+
+    echo("Load test: {0} workers, {1} employees, {2}s, seed {3}".format(len(tasks), len(employees), duration, seed))
+    lock_status = get_lock_status()
+    # the Workdays written by the run are found in the change log after this sequence
+    first_sequence = cint(frappe.db.sql("SELECT MAX(name) FROM `tabWorkday Change Log`")[0][0])
+    site, sites_path = frappe.local.site, frappe.local.sites_path
+    # spawn, not fork: every worker opens its own database connection
+    context = multiprocessing.get_context("spawn")
+    samples = []
+    try:
+        with context.Pool(len(tasks), initializer=init_load_test_worker, initargs=(site, sites_path)) as pool:
+            for worker_samples in pool.imap_unordered(run_worker, tasks):
+                samples.extend(worker_samples)
+    finally:
+        if not keep_data:
+            delete_load_test_data(employees, first_sequence)
+
+    result = {
+        "seed": seed,
+        "duration": flt(duration),
+        "operations": get_operation_summary(samples, flt(duration)),
+        "locks": {k: v - lock_status.get(k, 0) for k, v in get_lock_status().items()},
+    }
+    for line in format_summary(result):
+        echo(line)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=1, sort_keys=True)
+
+    return result
+
+
+def get_load_test_employees(limit, company=None):
+    conditions, values = "", {"limit": max(limit, 1)}
+    if company:
+        conditions = "AND e.company = %(company)s"
+        values["company"] = company
+
+    return frappe.db.sql_list("""
+        SELECT e.name FROM `tabEmployee` e
+        WHERE e.status = 'Active' {conditions} AND EXISTS (
+            SELECT 1 FROM `tabWeekly Working Hours` w WHERE w.employee = e.name AND w.docstatus = 1
+        )
+        ORDER BY e.name
+        LIMIT %(limit)s
+    """.format(conditions=conditions), values)
+
+
+def init_load_test_worker(site, sites_path):
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user("Administrator")
+
+
+def run_worker(task):
+    '''run one operation at the task's rate until the end of the run, returns [(operation, outcome, latency, service)]'''
+    rng = random.Random(task.seed)
+    operation = OPERATIONS[task.operation]
+    end_at = task.start_at + task.duration
+    samples = []
+
+    time.sleep(max(task.start_at - time.time(), 0))
+    planned = task.start_at + rng.expovariate(task.rate_per_second)
+    while planned < end_at:
+        time.sleep(max(planned - time.time(), 0))
+        started = time.time()
+        outcome = "ok"
+        try:
+            operation(rng, task)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            outcome = get_outcome(e)
+            if outcome == "error":
+                frappe.log_error("Load test {0}".format(task.operation), traceback.format_exc())
+        finished = time.time()
+        samples.append((task.operation, outcome, finished - planned, finished - started))
+        planned += rng.expovariate(task.rate_per_second)
+
+    frappe.db.commit()
+    return samples
+
+
+def get_outcome(exception):
+    if frappe.db.is_deadlocked(exception):
+        return "deadlock"
+    if frappe.db.is_timedout(exception):
+        return "lock_timeout"
+    return "error"
+
+
+def punch(rng, task):
+    '''a batch of punches of the shift change through the ingestion endpoint'''
+    from hr_addon.hr_addon.api.checkin_ingestion import ingest_checkins
+
+    now = now_datetime()
+    ingest_checkins([{
+        "employee": rng.choice(task.employees),
+        "timestamp": str(now - frappe.utils.datetime.timedelta(seconds=rng.randint(0, 120))),
+        "log_type": rng.choice(("IN", "OUT")),
+        "device_id": LOAD_TEST_DEVICE,
+    } for i in range(task.options["batch"])])
+
+
+def open_workday_form(rng, task):
+    from hr_addon.hr_addon.api.workday_form import get_workday_form_data
+
+    get_workday_form_data(rng.choice(task.employees), add_days(today(), -rng.randint(0, 7)), days_around=3)
+
+
+def export_leave_calendar(rng, task):
+    '''the on_update work of a Leave Application save, without changing the Leave Application'''
+    from hr_addon.hr_addon.api.export_calendar import export_calendar
+
+    export_calendar(frappe.get_doc("Leave Application", rng.choice(task.options["leave_applications"])))
+
+
+def generate_workdays(rng, task):
+    '''what generate_workdays_for_past_7_days_now enqueues for one employee, run in place'''
+    from hr_addon.hr_addon.doctype.workday.workday import bulk_process_workdays, get_unmarked_range
+
+    employee = rng.choice(task.employees)
+    unmarked_days = get_unmarked_range(employee, str(add_days(today(), -7)), today())
+    if unmarked_days:
+        bulk_process_workdays({"employee": employee, "unmarked_days": unmarked_days}, "Create workday")
+
+
+def process_recompute_queue(rng, task):
+    from hr_addon.hr_addon.api.checkin_ingestion import process_workday_recompute_queue
+
+    process_workday_recompute_queue()
+
+
+OPERATIONS = {
+    "punch": punch,
+    "workday_form": open_workday_form,
+    "leave_export": export_leave_calendar,
+    "workday_generation": generate_workdays,
+    "recompute_queue": process_recompute_queue,
+}
+
+
+def get_lock_status():
+    rows = frappe.db.sql("SHOW GLOBAL STATUS WHERE Variable_name IN %(names)s", {"names": LOCK_STATUS_VARIABLES})
+    return {name: cint(value) for name, value in rows}
+
+
+def get_operation_summary(samples, duration):
+    '''{operation: {"count", "throughput_per_minute", outcome counts, "p50".."p99", "max", "mean_service"}} in seconds'''
+    by_operation = {}
+    for operation, outcome, latency, service in samples:
+        by_operation.setdefault(operation, []).append((outcome, latency, service))
+
+    summary = {}
+    for operation, rows in sorted(by_operation.items()):
+        latencies = sorted(latency for outcome, latency, service in rows)
+        summary[operation] = {
+            "count": len(rows),
+            "throughput_per_minute": round(len(rows) * 60 / duration, 2) if duration else 0,
+            "outcomes": {o: sum(1 for row in rows if row[0] == o) for o in sorted({row[0] for row in rows})},
+            "max": round(latencies[-1], 4),
+            "mean_service": round(sum(row[2] for row in rows) / len(rows), 4),
+        }
+        for p in PERCENTILES:
+            summary[operation]["p{0}".format(p)] = round(get_percentile(latencies, p), 4)
+
+    return summary
+
+
+def get_percentile(sorted_values, percentile):
+    '''nearest rank'''
+    if not sorted_values:
+        return 0
+    rank = max(int(round(percentile / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def format_summary(result):
+    header = ["operation", "count", "/min"] + ["p{0}".format(p) for p in PERCENTILES] + ["max", "deadlocks", "lock timeouts", "errors"]
+    lines = ["\t".join(header)]
+    for operation, s in result["operations"].items():
+        lines.append("\t".join(str(v) for v in [operation, s["count"], s["throughput_per_minute"]]
+            + [s["p{0}".format(p)] for p in PERCENTILES]
+            + [s["max"], s["outcomes"].get("deadlock", 0), s["outcomes"].get("lock_timeout", 0), s["outcomes"].get("error", 0)]))
+    lines.append("InnoDB: {0}".format(", ".join("{0}={1}".format(k, v) for k, v in sorted(result["locks"].items()))))
+    return lines
+
+
+def delete_load_test_data(employees, after_sequence):
+    '''remove the synthetic punches and what the run derived from them: Workdays inserted by the run are deleted,
+    Workdays it updated are recomputed without the synthetic punches. Anomalies and department summaries follow
+    the Workday hooks, the change log rows of the run and of the cleanup are removed'''
+    from hr_addon.hr_addon.api.checkin_ingestion import RECOMPUTE_QUEUE_KEY
+    from hr_addon.hr_addon.doctype.workday.workday import recompute_workdays
+
+    keys = {(employee, getdate(date)) for employee, date in frappe.db.sql("""
+        SELECT DISTINCT employee, DATE(time) FROM `tabEmployee Checkin` WHERE device_id = %(device)s
+    """, {"device": LOAD_TEST_DEVICE})}
+    changes = frappe.db.sql("""
+        SELECT workday, operation, employee, log_date FROM `tabWorkday Change Log` WHERE name > %(after)s
+    """, {"after": after_sequence}, as_dict=1)
+    inserted = {c.workday for c in changes if c.operation == "Insert"}
+    keys |= {(c.employee, getdate(c.log_date)) for c in changes}
+
+    frappe.db.delete("Employee Checkin", {"device_id": LOAD_TEST_DEVICE})
+    for name in inserted:
+        if frappe.db.exists("Workday", name):
+            frappe.delete_doc("Workday", name, ignore_permissions=True, force=True)
+
+    # only days that still have a Workday, recompute_workdays would create the missing ones
+    dates_by_employee = {}
+    for employee, log_date in frappe.get_all("Workday", filters={
+        "employee": ["in", list({employee for employee, date in keys}) or [""]],
+        "log_date": ["in", list({date for employee, date in keys}) or [""]],
+    }, fields=["employee", "log_date"], as_list=True):
+        if (employee, getdate(log_date)) in keys:
+            dates_by_employee.setdefault(employee, []).append(log_date)
+    for employee, dates in dates_by_employee.items():
+        recompute_workdays(employee, dates)
+
+    frappe.db.sql("DELETE FROM `tabWorkday Change Log` WHERE name > %(after)s", {"after": after_sequence})
+    keys |= {(employee, getdate(date)) for employee in employees for date in (add_days(today(), -1), today())}
+    frappe.cache().srem(RECOMPUTE_QUEUE_KEY, *["{0}|{1}".format(employee, date) for employee, date in keys])
+    frappe.db.commit()
@@ -0,0 +1,235 @@
+import functools
+import hmac
+import json
+import time
+from contextlib import contextmanager
+import frappe
+from frappe.utils import add_days, cint, today
+
+SERIES_KEY = "hr_addon:metrics:series"
+VALUE_KEY = "hr_addon:metrics:value:{0}"
+BACKLOG_KEY = "hr_addon:metrics:checkin_backlog"
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# bytes
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+# queries per workday
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# histograms not measured in seconds
+HISTOGRAM_BUCKETS = {
+    "hr_addon_ics_size_bytes": SIZE_BUCKETS,
+    "hr_addon_queries_per_workday": COUNT_BUCKETS,
+}
+
+# days looked back for Employee Checkins without a Workday
+BACKLOG_DAYS = 31
+# the backlog is counted by update_checkin_backlog every 15 minutes, a missed run lets the gauge disappear
+BACKLOG_EXPIRY_SECONDS = 60 * 60
+
+HELP = {
+    "hr_addon_workdays_processed_total": "Employee-days processed by bulk_process_workdays and recompute_workdays",
+    "hr_addon_workdays_unchanged_total": "Employee-days skipped by recompute_workdays because their inputs did not change",
+    "hr_addon_queries_per_workday": "Database queries per processed employee-day",
+    "hr_addon_stage_seconds": "Latency of the stages of the attendance pipeline",
+    "hr_addon_failures_total": "Failures by stage and exception type",
+    "hr_addon_ics_render_seconds": "Time to render and write the leave calendar",
+    "hr_addon_ics_size_bytes": "Size of the written leave calendar",
+    "hr_addon_job_seconds": "Duration of scheduled and background jobs",
+    "hr_addon_checkin_backlog": "Employee Checkins of the last 31 days without a Workday, counted every 15 minutes",
+    "hr_addon_recompute_queue": "(employee, date) keys waiting in the workday recompute queue",
+    "hr_addon_queue_jobs": "Jobs waiting in a background queue",
+    "hr_addon_priority_jobs_submitted_total": "Jobs submitted to the priority job queue by class",
+    "hr_addon_priority_job_wait_seconds": "Time from submit to start of priority queue jobs by class",
+    "hr_addon_priority_queue_jobs": "Jobs waiting in the priority job queue by class",
+}
+
+
+def get_series_key(name, kind, labels):
+    return "{0}|{1}|{2}".format(name, kind, json.dumps(labels, sort_keys=True, separators=(",", ":")))
+
+
+def inc(name, value=1, **labels):
+    '''add value to a counter'''
+    cache = frappe.cache()
+    series = get_series_key(name, "counter", labels)
+    try:
+        pipeline = cache.pipeline()
+        pipeline.sadd(cache.make_key(SERIES_KEY), series)
+        pipeline.incrbyfloat(cache.make_key(VALUE_KEY.format(series)), value)
+        pipeline.execute()
+    except Exception:
+        # metrics never break the instrumented code
+        pass
+
+
+def get_buckets(name):
+    return HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS)
+
+
+def observe(name, value, **labels):
+    '''add an observation to a histogram, buckets are cumulative like in the Prometheus text format'''
+    cache = frappe.cache()
+    series = get_series_key(name, "histogram", labels)
+    try:
+        pipeline = cache.pipeline()
+        pipeline.sadd(cache.make_key(SERIES_KEY), series)
+        for bucket in get_buckets(name):
+            if value <= bucket:
+                pipeline.incrbyfloat(cache.make_key(VALUE_KEY.format("{0}|le={1}".format(series, bucket))), 1)
+        pipeline.incrbyfloat(cache.make_key(VALUE_KEY.format("{0}|le=+Inf".format(series))), 1)
+        pipeline.incrbyfloat(cache.make_key(VALUE_KEY.format("{0}|sum".format(series))), value)
+        pipeline.execute()
+    except Exception:
+        pass
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - start, **labels)
+
+
+def timed(job):
+    '''decorator: duration of a job in hr_addon_job_seconds and its failures in hr_addon_failures_total'''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                with timer("hr_addon_job_seconds", job=job):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                inc("hr_addon_failures_total", stage=job, type=type(e).__name__)
+                raise
+        return wrapper
+    return decorator
+
+
+class QueryCounter:
+    count = 0
+
+
+@contextmanager
+def count_queries():
+    '''count the frappe.db.sql calls of the block'''
+    counter = QueryCounter()
+    db = frappe.db
+    sql = db.sql
+    previous = db.__dict__.get("sql")
+
+    def counting_sql(*args, **kwargs):
+        counter.count += 1
+        return sql(*args, **kwargs)
+
+    db.sql = counting_sql
+    try:
+        yield counter
+    finally:
+        if previous is None:
+            del db.sql
+        else:
+            db.sql = previous
+
+
+@frappe.whitelist(allow_guest=True)
+def get_metrics():
+    '''all metrics in the Prometheus text format. Guests need the hr_addon_metrics_token of site_config
+    as bearer token, users the System Manager role'''
+    from werkzeug.wrappers import Response
+
+    if frappe.session.user == "Guest":
+        token = frappe.conf.get("hr_addon_metrics_token")
+        authorization = frappe.get_request_header("Authorization") or ""
+        if not token or not hmac.compare_digest(authorization.encode(), "Bearer {0}".format(token).encode()):
+            raise frappe.PermissionError
+    else:
+        frappe.only_for("System Manager")
+
+    response = Response(render_metrics(), mimetype="text/plain")
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
+def render_metrics():
+    cache = frappe.cache()
+    lines = []
+    series_by_name = {}
+    for series in sorted(frappe.safe_decode(s) for s in cache.smembers(SERIES_KEY)):
+        name, kind, labels = series.split("|", 2)
+        series_by_name.setdefault((name, kind), []).append((series, json.loads(labels)))
+
+    for (name, kind), series_list in sorted(series_by_name.items()):
+        lines.append("# HELP {0} {1}".format(name, HELP.get(name, name)))
+        lines.append("# TYPE {0} {1}".format(name, kind))
+        for series, labels in series_list:
+            if kind == "counter":
+                lines.append(format_sample(name, labels, get_value(cache, series)))
+                continue
+
+            buckets = [str(b) for b in get_buckets(name)] + ["+Inf"]
+            values = cache.mget([cache.make_key(VALUE_KEY.format("{0}|le={1}".format(series, b))) for b in buckets])
+            for bucket, value in zip(buckets, values):
+                lines.append(format_sample(name + "_bucket", dict(labels, le=bucket), float(value or 0)))
+            lines.append(format_sample(name + "_sum", labels, get_value(cache, series + "|sum")))
+            lines.append(format_sample(name + "_count", labels, float(values[-1] or 0)))
+
+    last_name = None
+    for name, labels, value in get_gauges():
+        if name != last_name:
+            lines.append("# HELP {0} {1}".format(name, HELP.get(name, name)))
+            lines.append("# TYPE {0} gauge".format(name))
+            last_name = name
+        lines.append(format_sample(name, labels, value))
+
+    return "\n".join(lines) + "\n"
+
+
+def get_value(cache, series):
+    return float(cache.get(cache.make_key(VALUE_KEY.format(series))) or 0)
+
+
+def format_sample(name, labels, value):
+    if labels:
+        label_text = ",".join('{0}="{1}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in sorted(labels.items()))
+        return "{0}{{{1}}} {2}".format(name, label_text, value)
+    return "{0} {1}".format(name, value)
+
+
+@timed("update_checkin_backlog")
+def update_checkin_backlog():
+    '''scheduled: count the Employee Checkins without a Workday, the scrape reads the cached count'''
+    backlog = frappe.db.sql("""
+        SELECT COUNT(*) FROM `tabEmployee Checkin` c
+        WHERE c.time >= %(from_date)s AND NOT EXISTS (
+            SELECT 1 FROM `tabWorkday` w WHERE w.employee = c.employee AND w.log_date = DATE(c.time)
+        )
+    """, {"from_date": add_days(today(), -BACKLOG_DAYS)})[0][0]
+    frappe.cache().set_value(BACKLOG_KEY, cint(backlog), expires_in_sec=BACKLOG_EXPIRY_SECONDS)
+
+
+def get_gauges():
+    '''values read at scrape time, from redis only'''
+    from frappe.utils.background_jobs import get_queue
+    from hr_addon.hr_addon.api.checkin_ingestion import RECOMPUTE_QUEUE_KEY
+    from hr_addon.hr_addon.api.job_queue import get_pending_jobs
+
+    gauges = []
+    backlog = frappe.cache().get_value(BACKLOG_KEY)
+    if backlog is not None:
+        gauges.append(("hr_addon_checkin_backlog", {}, cint(backlog)))
+    gauges.append(("hr_addon_recompute_queue", {}, cint(frappe.cache().scard(frappe.cache().make_key(RECOMPUTE_QUEUE_KEY)))))
+
+    for job_class, pending in get_pending_jobs().items():
+        gauges.append(("hr_addon_priority_queue_jobs", {"job_class": job_class}, pending))
+
+    for queue in ("long", "default", "short"):
+        try:
+            gauges.append(("hr_addon_queue_jobs", {"queue": queue}, get_queue(queue).count))
+        except Exception:
+            pass
+
+    return gauges
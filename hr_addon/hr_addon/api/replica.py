@@ -0,0 +1,69 @@
+import functools
+from contextlib import contextmanager
+import frappe
+from frappe.utils import cint
+
+RECENT_WRITE_KEY = "hr_addon:recent_write:{0}"
+
+# seconds an employee's reads stay on the primary after a write, HR Addon Settings can change it
+DEFAULT_STALENESS_SECONDS = 60
+
+
+def get_staleness_seconds():
+    value = frappe.db.get_single_value("HR Addon Settings", "replica_staleness_seconds")
+    return DEFAULT_STALENESS_SECONDS if value is None else cint(value)
+
+
+def mark_recent_write(employee):
+    '''reads of this employee's data go to the primary until the replica has caught up'''
+    staleness_seconds = get_staleness_seconds()
+    if employee and staleness_seconds and frappe.conf.read_from_replica:
+        frappe.cache().set_value(RECENT_WRITE_KEY.format(employee), 1, expires_in_sec=staleness_seconds)
+
+
+def mark_recent_write_for_doc(doc, method=None):
+    mark_recent_write(doc.get("employee"))
+
+
+def has_recent_write(employees):
+    if isinstance(employees, str):
+        employees = [employees]
+    return any(frappe.cache().get_value(RECENT_WRITE_KEY.format(employee)) for employee in employees or [])
+
+
+@contextmanager
+def replica(employees=None):
+    '''run the block against the read replica when one is configured (read_from_replica in site_config),
+    on the primary if one of the employees was written within the staleness window or a replica is already in use'''
+    if not frappe.conf.read_from_replica or frappe.flags.hr_addon_on_replica or has_recent_write(employees):
+        yield
+        return
+
+    # connect_replica swaps nothing while replica_db and primary_db are set, e.g. inside frappe.read_only
+    swapped = frappe.connect_replica()
+    frappe.flags.hr_addon_on_replica = True
+    try:
+        yield
+    finally:
+        frappe.flags.hr_addon_on_replica = False
+        if swapped:
+            frappe.local.db.close()
+            frappe.local.db = frappe.local.primary_db
+            # the next block connects a fresh replica instead of finding the closed one
+            del frappe.local.replica_db
+            del frappe.local.primary_db
+
+
+def read_from_replica(get_employees=None):
+    '''decorator for read only functions, get_employees is called with the arguments of the function
+    and returns the employee(s) whose fresh writes have to be visible'''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # whitelisted calls pass the whole form_dict, like frappe.read_only
+            kwargs = frappe.get_newargs(fn, kwargs)
+            employees = get_employees(*args, **kwargs) if get_employees else None
+            with replica(employees):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
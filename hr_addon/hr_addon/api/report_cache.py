@@ -0,0 +1,94 @@
+import hashlib
+import json
+import time
+import frappe
+from frappe.utils import getdate
+
+CACHE_KEY = "hr_addon:report_cache:{0}:{1}"
+LOCK_KEY = "hr_addon:report_cache_lock:{0}:{1}"
+# {report: {employee or "*": set of "key|from_date|to_date"}}
+INDEX_KEY = "hr_addon:report_cache_index:{0}:{1}"
+ALL_EMPLOYEES = "*"
+
+# cached results expire even without invalidation, direct SQL writes do not evict
+CACHE_EXPIRY_SECONDS = 60 * 60
+LOCK_TIMEOUT_SECONDS = 60
+LOCK_POLL_SECONDS = 0.2
+
+
+def get_permission_scope():
+    '''roles and Employee user permissions of the session user, results are only shared within the same scope'''
+    from frappe.permissions import get_user_permissions
+
+    user_permissions = get_user_permissions(frappe.session.user).get("Employee") or []
+    return {
+        "roles": sorted(frappe.get_roles()),
+        "employees": sorted(p.get("doc") for p in user_permissions),
+    }
+
+
+def get_cache_key(report, filters):
+    payload = json.dumps({"report": report, "filters": filters, "scope": get_permission_scope()}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def get_cached_result(report, filters, employee, from_date, to_date, generator):
+    '''result of generator() for normalized filters, computed once for concurrent identical requests
+    and indexed by employee and date range for evict_cached_results'''
+    cache = frappe.cache()
+    key = get_cache_key(report, filters)
+    cache_key = CACHE_KEY.format(report, key)
+
+    result = cache.get_value(cache_key)
+    if result is not None:
+        return result
+
+    lock_key = cache.make_key(LOCK_KEY.format(report, key))
+    deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+    while not cache.set(lock_key, 1, ex=LOCK_TIMEOUT_SECONDS, nx=True):
+        # another worker is computing the same result
+        time.sleep(LOCK_POLL_SECONDS)
+        result = cache.get_value(cache_key)
+        if result is not None:
+            return result
+        if time.monotonic() > deadline:
+            return generator()
+
+    try:
+        result = generator()
+        cache.set_value(cache_key, result, expires_in_sec=CACHE_EXPIRY_SECONDS)
+        index_key = INDEX_KEY.format(report, employee or ALL_EMPLOYEES)
+        cache.sadd(index_key, "{0}|{1}|{2}".format(
+            key, getdate(from_date) if from_date else "", getdate(to_date) if to_date else ""))
+        cache.expire(cache.make_key(index_key), CACHE_EXPIRY_SECONDS)
+    finally:
+        cache.delete(lock_key)
+
+    return result
+
+
+def evict_cached_results(report, employee, dates):
+    '''drop the cached results whose employee and date range cover one of the dates.
+    Runs after the commit, a report read in between would cache the old rows again'''
+    dates = [str(getdate(d)) for d in dates]
+    frappe.db.after_commit.add(lambda: evict_now(report, employee, dates))
+
+
+def evict_now(report, employee, dates):
+    cache = frappe.cache()
+    for index in (employee, ALL_EMPLOYEES):
+        index_key = INDEX_KEY.format(report, index)
+        evicted = []
+        for member in cache.smembers(index_key):
+            member = frappe.safe_decode(member)
+            key, from_date, to_date = member.split("|")
+            if any((not from_date or from_date <= d) and (not to_date or d <= to_date) for d in dates):
+                cache.delete_value(CACHE_KEY.format(report, key))
+                evicted.append(member)
+        if evicted:
+            cache.srem(index_key, *evicted)
+
+
+def clear_cached_results(report):
+    frappe.cache().delete_keys(CACHE_KEY.format(report, ""))
+    frappe.cache().delete_keys(INDEX_KEY.format(report, ""))
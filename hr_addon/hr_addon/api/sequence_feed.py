@@ -0,0 +1,104 @@
+import base64
+import json
+import time
+import frappe
+from frappe import _
+from frappe.utils import cint, cstr
+
+from hr_addon.hr_addon.api.job_queue import JOB_TIMEOUT_SECONDS
+
+# a sequence missing this long belongs to a transaction that rolled back, longer jobs are killed
+GAP_TIMEOUT_SECONDS = JOB_TIMEOUT_SECONDS
+# open gaps kept in a cursor, the oldest are dropped first
+MAX_OPEN_GAPS = 1000
+
+
+def read_sequence_feed(doctype, fields, cursor=None, limit=None):
+    '''Rows of an autoincrement log after cursor, in sequence order.
+
+    A gap in the sequence is a transaction that got its sequence but has not committed yet, or rolled back.
+    Gaps are kept open in the cursor and read again on every call until they are GAP_TIMEOUT_SECONDS old,
+    the rows of a late commit come first in the call that finds them.
+
+    Returns {"rows", "cursor", "last_sequence", "has_more", "compacted"}, compacted is 1 when rows after the cursor
+    were already deleted by the retention of the log.'''
+    last, gaps = decode_sequence_cursor(cursor)
+    compacted = is_compacted(doctype, last)
+    columns = ", ".join(["name"] + [f for f in fields if f != "name"])
+    now = time.time()
+
+    late_rows = []
+    if gaps:
+        late_rows = frappe.db.sql("""
+            SELECT {columns} FROM `tab{doctype}` WHERE name IN %(gaps)s ORDER BY name ASC
+        """.format(columns=columns, doctype=doctype), {"gaps": tuple(gaps)}, as_dict=1)
+        found = {row.name for row in late_rows}
+        gaps = {seq: seen for seq, seen in gaps.items() if seq not in found and now - seen < GAP_TIMEOUT_SECONDS}
+
+    values = {"after": last}
+    if limit:
+        values["limit"] = cint(limit) + 1
+    rows = frappe.db.sql("""
+        SELECT {columns} FROM `tab{doctype}` WHERE name > %(after)s ORDER BY name ASC {limit}
+    """.format(columns=columns, doctype=doctype, limit="LIMIT %(limit)s" if limit else ""), values, as_dict=1)
+
+    has_more = bool(limit) and len(rows) > cint(limit)
+    if limit:
+        rows = rows[:cint(limit)]
+
+    # sequences before the first row of a new consumer are not gaps
+    expected = last + 1 if last else None
+    for row in rows:
+        if expected is not None:
+            gaps.update((seq, now) for seq in range(expected, row.name))
+        expected = row.name + 1
+    if rows:
+        last = rows[-1].name
+
+    return frappe._dict({
+        "rows": late_rows + rows,
+        "cursor": encode_sequence_cursor(last, gaps),
+        "last_sequence": last,
+        "has_more": cint(has_more),
+        "compacted": cint(compacted),
+    })
+
+
+def get_head_cursor(doctype):
+    '''cursor at the end of the log for a consumer that read everything else, read by primary key only.
+    The gaps among the last MAX_OPEN_GAPS sequences stay open'''
+    last = cint(frappe.db.sql("SELECT MAX(name) FROM `tab{0}`".format(doctype))[0][0])
+    existing = set(frappe.db.sql_list("SELECT name FROM `tab{0}` WHERE name > %(after)s".format(doctype),
+        {"after": last - MAX_OPEN_GAPS}))
+    now = time.time()
+    gaps = {seq: now for seq in range(max(last - MAX_OPEN_GAPS + 1, 1), last) if seq not in existing}
+    return encode_sequence_cursor(last, gaps)
+
+
+def is_compacted(doctype, last):
+    if not last:
+        return False
+    oldest = frappe.db.sql("SELECT MIN(name) FROM `tab{0}`".format(doctype))[0][0]
+    return bool(oldest and oldest > last + 1)
+
+
+def encode_sequence_cursor(last, gaps):
+    '''the last sequence as plain number, with open gaps as base64 of [last, [[sequence, first seen], ...]]'''
+    if not gaps:
+        return str(last)
+
+    gaps = sorted(gaps.items())[-MAX_OPEN_GAPS:]
+    return base64.urlsafe_b64encode(json.dumps([last, gaps], separators=(",", ":")).encode()).decode()
+
+
+def decode_sequence_cursor(cursor):
+    '''(last sequence, {gap: first seen}), plain numbers are cursors without open gaps'''
+    cursor = cstr(cursor).strip()
+    if not cursor or cursor.isdigit():
+        return cint(cursor), {}
+
+    try:
+        last, gaps = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return cint(last), {cint(seq): float(seen) for seq, seen in gaps}
+    except Exception:
+        frappe.throw(_("Invalid cursor"))
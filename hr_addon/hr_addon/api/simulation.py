@@ -0,0 +1,237 @@
+import heapq
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, flt, getdate, parse_json
+from frappe.utils.data import date_diff
+
+from hr_addon.hr_addon.api.utils import (
+    apply_leave_rules,
+    get_actual_diff_seconds,
+    get_default_work_hour_from_range,
+    get_employee_checkins_for_range,
+    get_holidays_for_range,
+    get_leave_days_for_range,
+    get_weekly_working_hours_for_range,
+    get_workday,
+    get_workday_from_intervals,
+    get_workday_without_checkins,
+)
+from hr_addon.hr_addon.api.replica import read_from_replica
+from hr_addon.hr_addon.api.checkin_pairing import PAIRING_MODE_LOG_TYPE, get_pairing_settings, pair_checkins
+
+# HR Addon Settings fields get_workday depends on
+SIMULATION_SETTINGS_FIELDS = ("workday_break_calculation_mechanism", "swap_hours_worked_and_actual_working_hours")
+
+# Weekly Working Hours fields a policy can override
+SIMULATION_POLICY_FIELDS = ("no_break_hours", "set_target_hours_to_zero_when_date_is_holiday")
+
+TOTAL_FIELDS = ("target_hours", "hours_worked", "actual_working_hours", "break_hours", "balance_hours")
+
+
+@frappe.whitelist()
+@read_from_replica()
+def simulate_workdays(from_date, to_date, employees=None, department=None, company=None, settings=None, policy=None, top_n=10):
+    '''Compute the workdays of a range twice, with the current and with an alternative HR Addon Settings / Weekly Working Hours
+    policy, without writing anything. Returns the per employee deltas and the top_n most affected days.
+
+    settings: {"workday_break_calculation_mechanism": ..., "swap_hours_worked_and_actual_working_hours": 0|1}
+    policy: {"no_break_hours": 0|1, "set_target_hours_to_zero_when_date_is_holiday": 0|1,
+             "weekly_working_hours": name of a Weekly Working Hours whose hours replace every schedule,
+             "hours": [{"day": "Monday", "hours": 8, "break_minutes": 30}, ...]}
+    '''
+    frappe.only_for(("HR Manager", "System Manager"))
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if from_date > to_date:
+        frappe.throw(_("From Date must be before To Date"))
+
+    employees = get_simulation_employees(employees, department, company)
+    if not employees:
+        frappe.throw(_("No active Employee found for the given filters"))
+
+    current_settings = get_simulation_settings()
+    alternative_settings = get_simulation_settings(parse_json(settings) or {})
+    alternative_policy = get_simulation_policy(parse_json(policy) or {})
+
+    pairing_settings = get_pairing_settings()
+    if pairing_settings.mode == PAIRING_MODE_LOG_TYPE:
+        checkins_by_day = get_paired_checkins_by_day(employees, from_date, to_date, pairing_settings)
+    else:
+        checkins_by_day = get_employee_checkins_for_range(employees, from_date, to_date)
+    weekly_working_hours = get_weekly_working_hours_for_range(employees, from_date, to_date)
+    holidays = get_holidays_for_range(employees, from_date, to_date)
+    leave_days = get_leave_days_for_range(employees, from_date, to_date)
+
+    summary = {}
+    affected_days = []
+    skipped_days = []
+
+    for employee in employees:
+        employee_summary = frappe._dict({
+            "employee": employee,
+            "days": 0,
+            "baseline": dict.fromkeys(TOTAL_FIELDS, 0.0),
+            "simulated": dict.fromkeys(TOTAL_FIELDS, 0.0),
+            "baseline_incomplete_days": 0,
+            "simulated_incomplete_days": 0,
+        })
+
+        for i in range(date_diff(to_date, from_date) + 1):
+            adate = add_days(from_date, i)
+            employee_default_work_hour = get_default_work_hour_from_range(weekly_working_hours, employee, adate)
+            if not employee_default_work_hour:
+                skipped_days.append({"employee": employee, "date": adate})
+                continue
+
+            employee_checkins = checkins_by_day.get((employee, adate), [])
+            is_date_in_holiday_list = adate in holidays.get(employee, ())
+            leave_kind = leave_days.get((employee, adate))
+
+            baseline = compute_simulated_workday(employee_checkins, employee_default_work_hour,
+                is_date_in_holiday_list, leave_kind, current_settings)
+            simulated = compute_simulated_workday(employee_checkins, apply_simulation_policy(employee_default_work_hour, alternative_policy),
+                is_date_in_holiday_list, leave_kind, alternative_settings)
+
+            employee_summary.days += 1
+            add_to_totals(employee_summary, "baseline", baseline)
+            add_to_totals(employee_summary, "simulated", simulated)
+
+            delta = {field: flt(simulated[field] - baseline[field], 6) for field in TOTAL_FIELDS}
+            impact = abs(delta["balance_hours"]) + abs(delta["actual_working_hours"])
+            if impact:
+                day = {"employee": employee, "date": adate, "impact": impact, "baseline": baseline, "simulated": simulated, "delta": delta}
+                heapq.heappush(affected_days, (impact, adate.toordinal(), employee, day))
+                if len(affected_days) > cint(top_n):
+                    heapq.heappop(affected_days)
+
+        employee_summary.delta = {
+            field: flt(employee_summary.simulated[field] - employee_summary.baseline[field], 6) for field in TOTAL_FIELDS
+        }
+        summary[employee] = employee_summary
+
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "employees": list(summary.values()),
+        "top_affected_days": [d[-1] for d in sorted(affected_days, reverse=True)],
+        "skipped_days": skipped_days,
+    }
+
+
+def compute_simulated_workday(employee_checkins, employee_default_work_hour, is_date_in_holiday_list, leave_kind, hr_addon_settings):
+    '''get_workday / get_workday_without_checkins followed by the leave rules of Workday.validate, in memory only.
+    employee_checkins is a list or a day of checkin_pairing.pair_checkins'''
+    is_target_hours_zero_on_holiday = cint(employee_default_work_hour.set_target_hours_to_zero_when_date_is_holiday) == 1
+    no_break_hours = cint(employee_default_work_hour.no_break_hours) == 1
+
+    is_paired = isinstance(employee_checkins, dict)
+    if is_paired:
+        intervals, employee_checkins = employee_checkins.intervals, employee_checkins.checkins
+        is_incomplete = intervals is None
+    else:
+        is_incomplete = len(employee_checkins) % 2 != 0
+
+    if employee_checkins and is_paired:
+        workday = get_workday_from_intervals(intervals, employee_checkins, employee_default_work_hour, no_break_hours,
+            is_target_hours_zero_on_holiday, is_date_in_holiday_list, hr_addon_settings=hr_addon_settings)
+    elif employee_checkins:
+        workday = get_workday(employee_checkins, employee_default_work_hour, no_break_hours,
+            is_target_hours_zero_on_holiday, is_date_in_holiday_list, hr_addon_settings=hr_addon_settings)
+    else:
+        workday = get_workday_without_checkins(employee_default_work_hour, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
+
+    workday = apply_leave_rules(workday, leave_kind)
+
+    return {
+        "target_hours": flt(workday.get("target_hours")),
+        "hours_worked": 0.0 if is_incomplete else flt(workday.get("hours_worked")),
+        "actual_working_hours": 0.0 if is_incomplete else flt(workday.get("actual_working_hours")),
+        "break_hours": 0.0 if is_incomplete else flt(workday.get("break_hours")),
+        "balance_hours": 0.0 if is_incomplete else flt(get_actual_diff_seconds(
+            workday.get("actual_working_hours"), flt(workday.get("target_hours")) * 60 * 60) / 3600),
+        "incomplete": is_incomplete,
+    }
+
+
+def get_paired_checkins_by_day(employees, from_date, to_date, pairing_settings):
+    '''{(employee, date): paired day} with one check-in query for all employees'''
+    checkins_by_day = get_employee_checkins_for_range(employees, add_days(from_date, -1), add_days(to_date, 1))
+    checkins_by_employee = {}
+    for key in sorted(checkins_by_day):
+        checkins_by_employee.setdefault(key[0], []).extend(checkins_by_day[key])
+
+    paired_by_day = {}
+    for employee, employee_checkins in checkins_by_employee.items():
+        for date, day in pair_checkins(employee_checkins, pairing_settings.day_boundary_hour, pairing_settings.max_shift_hours).items():
+            paired_by_day[(employee, date)] = day
+
+    return paired_by_day
+
+
+def add_to_totals(employee_summary, key, workday):
+    if workday["incomplete"]:
+        employee_summary["{0}_incomplete_days".format(key)] += 1
+    for field in TOTAL_FIELDS:
+        employee_summary[key][field] += workday[field]
+
+
+def get_simulation_employees(employees=None, department=None, company=None):
+    if employees:
+        employees = parse_json(employees)
+        if isinstance(employees, str):
+            employees = [employees]
+        return list(employees)
+
+    filters = {"status": "Active"}
+    if department:
+        filters["department"] = department
+    if company:
+        filters["company"] = company
+
+    return frappe.get_all("Employee", filters=filters, pluck="name")
+
+
+def get_simulation_settings(overrides=None):
+    '''HR Addon Settings values used by get_workday, with overrides applied'''
+    hr_addon_settings = frappe.get_cached_doc("HR Addon Settings")
+    settings = frappe._dict({field: hr_addon_settings.get(field) for field in SIMULATION_SETTINGS_FIELDS})
+    for field, value in (overrides or {}).items():
+        if field not in SIMULATION_SETTINGS_FIELDS:
+            frappe.throw(_("{0} can not be simulated").format(field))
+        settings[field] = value
+
+    return settings
+
+
+def get_simulation_policy(policy):
+    '''normalise a policy: {"fields": {...}, "days": {day: {"hours", "break_minutes"}}}'''
+    alternative_policy = frappe._dict({"fields": {}, "days": {}})
+
+    for field in SIMULATION_POLICY_FIELDS:
+        if field in policy:
+            alternative_policy.fields[field] = cint(policy[field])
+
+    if policy.get("weekly_working_hours"):
+        weekly_working_hours = frappe.get_doc("Weekly Working Hours", policy["weekly_working_hours"])
+        for d in weekly_working_hours.get_days().values():
+            alternative_policy.days[d.day] = {"hours": flt(d.hours), "break_minutes": cint(d.break_minutes)}
+
+    for d in policy.get("hours") or []:
+        alternative_policy.days[d["day"]] = {"hours": flt(d.get("hours")), "break_minutes": cint(d.get("break_minutes"))}
+
+    return alternative_policy
+
+
+def apply_simulation_policy(employee_default_work_hour, alternative_policy):
+    if not alternative_policy.fields and not alternative_policy.days:
+        return employee_default_work_hour
+
+    work_hour = frappe._dict(employee_default_work_hour)
+    work_hour.update(alternative_policy.fields)
+    if work_hour.day in alternative_policy.days:
+        work_hour.update(alternative_policy.days[work_hour.day])
+    elif alternative_policy.days:
+        # the alternative schedule has no hours for this day
+        work_hour.update({"hours": 0, "break_minutes": 0})
+
+    return work_hour
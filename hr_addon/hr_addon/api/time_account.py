@@ -0,0 +1,159 @@
+import frappe
+from frappe import _
+from frappe.utils import add_days, flt, get_datetime, get_first_day, get_first_day_of_week, get_last_day, getdate, now_datetime, today
+
+from hr_addon.hr_addon.api import workday_form
+from hr_addon.hr_addon.api.workday_totals import ACTUAL_DIFF_SECONDS, INCOMPLETE_CONDITION, get_totals_of_workdays
+
+TIME_ACCOUNT_KEY = "hr_addon:time_account:{0}:{1}:{2}"
+VERSION_KEY = "hr_addon:time_account_version:{0}"
+EMPLOYEE_OF_USER_KEY = "hr_addon:employee_of_user"
+
+# upper bound for a cached account, invalidation keeps it current before that
+TIME_ACCOUNT_CACHE_SECONDS = 15 * 60
+
+WORKDAY_FIELDS = ("log_date", "status", "anomaly_status", "total_target_seconds", "total_work_seconds",
+    "total_break_seconds", "actual_working_hours")
+
+
+@frappe.whitelist()
+def get_my_time_account():
+    '''hours of the employee of the logged-in user:
+    {"employee", "date", "today": {"target_hours", "hours_worked", "checked_in_since"},
+    "week": {"from_date", "to_date", "target_hours", "actual_hours"}, "month": {...}, "balance_hours"}.
+    balance_hours covers the days before today.
+
+    Everything but the running hours of an open check-in is cached per employee until a check-in, leave,
+    schedule, holiday or Workday of the employee changes.'''
+    employee = get_employee_of_user(frappe.session.user)
+    if not employee:
+        frappe.throw(_("No active Employee is linked to your user"), frappe.PermissionError)
+
+    date = getdate(today())
+    cache = frappe.cache()
+    key = TIME_ACCOUNT_KEY.format(employee, get_version(employee), date)
+    account = cache.get_value(key)
+    if account is None:
+        account = compute_time_account(employee, date)
+        cache.set_value(key, account, expires_in_sec=TIME_ACCOUNT_CACHE_SECONDS)
+
+    return add_running_hours(account)
+
+
+def get_employee_of_user(user):
+    def get_employee():
+        return frappe.db.get_value("Employee", {"user_id": user, "status": "Active"}, "name") or ""
+
+    return frappe.cache().hget(EMPLOYEE_OF_USER_KEY, user, generator=get_employee)
+
+
+def compute_time_account(employee, date):
+    '''the time account of a day, today's hours up to its last check-in'''
+    week_start, month_start = get_first_day_of_week(date), get_first_day(date)
+    workdays = frappe.db.sql("""
+        SELECT {fields} FROM `tabWorkday`
+        WHERE employee = %(employee)s AND log_date BETWEEN %(from_date)s AND %(to_date)s AND docstatus < 2
+    """.format(fields=", ".join(WORKDAY_FIELDS)), {
+        "employee": employee,
+        "from_date": min(week_start, month_start),
+        "to_date": date,
+    }, as_dict=1)
+    # today is computed from its check-ins, its Workday may not exist yet
+    workdays = [w for w in workdays if getdate(w.log_date) < date]
+
+    day = workday_form.compute_workday_form_data(employee, date, date).get(date)
+    target_seconds, employee_checkins = 0, []
+    if day:
+        target_seconds = flt(day["workday"].get("total_target_seconds"))
+        employee_checkins = day["workday"].get("employee_checkins") or []
+    worked_seconds, checked_in_since = get_worked_seconds(employee_checkins)
+
+    def get_period(from_date, to_date):
+        totals = get_totals_of_workdays([w for w in workdays if getdate(w.log_date) >= from_date])
+        return {
+            "from_date": str(from_date),
+            "to_date": str(to_date),
+            "target_seconds": totals["total_target_seconds"] + target_seconds,
+            "actual_seconds": totals["actual_working_seconds"] + worked_seconds,
+        }
+
+    return {
+        "employee": employee,
+        "date": str(date),
+        "today": {"target_seconds": target_seconds, "worked_seconds": worked_seconds, "checked_in_since": checked_in_since},
+        "week": get_period(week_start, add_days(week_start, 6)),
+        "month": get_period(month_start, get_last_day(date)),
+        "balance_seconds": get_balance_seconds(employee, date),
+    }
+
+
+def get_worked_seconds(employee_checkins):
+    '''(seconds of the closed check-in/checkout pairs, time of an open check-in), paired by position like get_workday'''
+    times = [get_datetime(c.get("time")) for c in employee_checkins]
+    worked_seconds = sum((times[i + 1] - times[i]).total_seconds() for i in range(0, len(times) - 1, 2))
+    checked_in_since = str(times[-1]) if len(times) % 2 else None
+    return worked_seconds, checked_in_since
+
+
+def get_balance_seconds(employee, date):
+    '''balance of all Workdays before date and of the archived months, with the sign rule of the Work Hour Report'''
+    balance = frappe.db.sql("""
+        SELECT SUM(CASE WHEN {incomplete} THEN 0 ELSE {actual_diff} END) FROM `tabWorkday`
+        WHERE employee = %(employee)s AND log_date < %(date)s AND docstatus < 2
+    """.format(incomplete=INCOMPLETE_CONDITION, actual_diff=ACTUAL_DIFF_SECONDS), {"employee": employee, "date": date})[0][0]
+    archived = frappe.db.sql("""
+        SELECT SUM(actual_diff_seconds) FROM `tabWorkday Archive` WHERE employee = %(employee)s
+    """, {"employee": employee})[0][0]
+    return flt(balance) + flt(archived)
+
+
+def add_running_hours(account):
+    '''hours of the cached account, an open check-in counts up to now'''
+    today_account = account["today"]
+    running_seconds = 0
+    if today_account["checked_in_since"]:
+        running_seconds = max((now_datetime() - get_datetime(today_account["checked_in_since"])).total_seconds(), 0)
+
+    def hours(seconds):
+        return flt(seconds / 3600, 2)
+
+    return {
+        "employee": account["employee"],
+        "date": account["date"],
+        "today": {
+            "target_hours": hours(today_account["target_seconds"]),
+            "hours_worked": hours(today_account["worked_seconds"] + running_seconds),
+            "checked_in_since": today_account["checked_in_since"],
+        },
+        "week": {
+            "from_date": account["week"]["from_date"],
+            "to_date": account["week"]["to_date"],
+            "target_hours": hours(account["week"]["target_seconds"]),
+            "actual_hours": hours(account["week"]["actual_seconds"] + running_seconds),
+        },
+        "month": {
+            "from_date": account["month"]["from_date"],
+            "to_date": account["month"]["to_date"],
+            "target_hours": hours(account["month"]["target_seconds"]),
+            "actual_hours": hours(account["month"]["actual_seconds"] + running_seconds),
+        },
+        "balance_hours": hours(account["balance_seconds"]),
+    }
+
+
+def get_version(employee):
+    '''check-ins, leave, schedules and holidays are versioned by the Workday form, Workdays here'''
+    return "{0}.{1}".format(workday_form.get_version(employee), frappe.cache().get_value(VERSION_KEY.format(employee)) or 0)
+
+
+def invalidate_time_account(employee):
+    '''new version after the commit, like invalidate_workday_form_data'''
+    key = VERSION_KEY.format(employee)
+    frappe.db.after_commit.add(lambda: frappe.cache().set_value(key, frappe.generate_hash(length=8)))
+
+
+def on_employee_change(doc, method=None):
+    doc_before_save = doc.get_doc_before_save()
+    for user in {doc.user_id, doc_before_save.user_id if doc_before_save else None}:
+        if user:
+            frappe.cache().hdel(EMPLOYEE_OF_USER_KEY, user)
@@ -1,9 +1,14 @@
 from __future__ import unicode_literals
+from collections import defaultdict
 import frappe
 from frappe import _
 from frappe.utils.data import date_diff, time_diff_in_hours
-from frappe.utils import get_datetime, getdate, today, comma_sep, flt
+from frappe.utils import add_days, get_datetime, getdate, today, comma_sep, flt
 from frappe.core.doctype.role.role import get_info_based_on_role
+from hr_addon.hr_addon.api.metrics import timed
+
+# Leave types which keep the target hours but book the day as time off, see Workday.date_is_in_comp_off
+COMP_OFF_LEAVE_TYPES = ("Freizeitausgleich (Nicht buchen!)", "Compensatory Off")
 
 
 def get_employee_checkin(employee,atime):
@@ -25,12 +30,18 @@ def get_employee_default_work_hour(employee,adate):
     #validate current or active FY year WHERE --
     # AND YEAR(valid_from) = CAST(%(year)s as INT) AND YEAR(valid_to) = CAST(%(year)s as INT)
     # AND YEAR(w.valid_from) = CAST(('2022-01-01') as INT) AND YEAR(w.valid_to) = CAST(('2022-12-30') as INT);
+    # the day of the Weekly Working Hours overrides the day of its Working Hours Template
     target_work_hours= frappe.db.sql(
         """ 
-    SELECT w.name,w.employee,w.valid_from,w.valid_to,d.day,d.hours,d.break_minutes  FROM `tabWeekly Working Hours` w  
-    LEFT JOIN `tabDaily Hours Detail` d ON w.name = d.parent 
-    WHERE w.employee='%s' AND d.day = DAYNAME('%s') and w.valid_from <= '%s' and w.valid_to >= '%s' and w.docstatus = 1
-    """%(employee,adate,adate,adate), as_dict=1
+    SELECT w.name,w.employee,w.valid_from,w.valid_to,
+        IF(d.name IS NULL, t.day, d.day) AS day,
+        IF(d.name IS NULL, t.hours, d.hours) AS hours,
+        IF(d.name IS NULL, t.break_minutes, d.break_minutes) AS break_minutes
+    FROM `tabWeekly Working Hours` w
+    LEFT JOIN `tabDaily Hours Detail` d ON d.parent = w.name AND d.parenttype = 'Weekly Working Hours' AND d.day = DAYNAME(%(date)s)
+    LEFT JOIN `tabDaily Hours Detail` t ON t.parent = w.working_hours_template AND t.parenttype = 'Working Hours Template' AND t.day = DAYNAME(%(date)s)
+    WHERE w.employee = %(employee)s AND COALESCE(d.day, t.day) IS NOT NULL and w.valid_from <= %(date)s and w.valid_to >= %(date)s and w.docstatus = 1
+    """, {"employee": employee, "date": getdate(adate)}, as_dict=1
     )
 
     if not target_work_hours:
@@ -43,96 +54,154 @@ def get_employee_default_work_hour(employee,adate):
     return target_work_hours[0]
 
 
+def get_schedule_flags(employee):
+    '''no_break_hours and set_target_hours_to_zero_when_date_is_holiday of the latest Weekly Working Hours
+    of the employee, a flag set in its Working Hours Template applies as well'''
+    schedule_flags = frappe.db.sql("""
+        SELECT GREATEST(w.no_break_hours, IFNULL(t.no_break_hours, 0)) AS no_break_hours,
+            GREATEST(w.set_target_hours_to_zero_when_date_is_holiday, IFNULL(t.set_target_hours_to_zero_when_date_is_holiday, 0))
+                AS set_target_hours_to_zero_when_date_is_holiday
+        FROM `tabWeekly Working Hours` w
+        LEFT JOIN `tabWorking Hours Template` t ON t.name = w.working_hours_template
+        WHERE w.employee = %(employee)s
+        ORDER BY w.modified DESC
+        LIMIT 1
+    """, {"employee": employee}, as_dict=1)
+    return schedule_flags[0] if schedule_flags else frappe._dict()
+
+
 @frappe.whitelist()
 def get_actual_employee_log(aemployee, adate):
     '''total actual log'''
-    employee_checkins = get_employee_checkin(aemployee,adate)
+    from hr_addon.hr_addon.api.checkin_pairing import get_paired_checkins_for_date
+
+    paired_checkins = get_paired_checkins_for_date(aemployee, adate)
+    employee_checkins = paired_checkins.checkins if paired_checkins is not None else get_employee_checkin(aemployee,adate)
     employee_default_work_hour = get_employee_default_work_hour(aemployee,adate)
     is_date_in_holiday_list = date_is_in_holiday_list(aemployee,adate)
-    fields=["name", "no_break_hours", "set_target_hours_to_zero_when_date_is_holiday"]
-    weekly_working_hours = frappe.db.get_list(doctype="Weekly Working Hours", filters={"employee": aemployee}, fields=fields)    
-    is_target_hours_zero_on_holiday = len(weekly_working_hours) > 0 and weekly_working_hours[0]["set_target_hours_to_zero_when_date_is_holiday"] == 1
+    schedule_flags = get_schedule_flags(aemployee)
+    is_target_hours_zero_on_holiday = schedule_flags.get("set_target_hours_to_zero_when_date_is_holiday") == 1
       
     # check empty or none
     if employee_checkins:
-        no_break_hours = True if len(weekly_working_hours) > 0 and weekly_working_hours[0]["no_break_hours"] == 1 else False
-        new_workday = get_workday(employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
+        no_break_hours = schedule_flags.get("no_break_hours") == 1
+        if paired_checkins is not None:
+            new_workday = get_workday_from_intervals(paired_checkins.intervals, employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
+        else:
+            new_workday = get_workday(employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
         return new_workday
     else :
         view_employee_attendance = get_employee_attendance(aemployee, adate)
-        
-        break_minutes = employee_default_work_hour.break_minutes
-        expected_break_hours = flt(break_minutes / 60)
-        
-        if is_target_hours_zero_on_holiday and is_date_in_holiday_list:
-            new_workday = {
-                "target_hours": 0,
-                "total_target_seconds": 0,
-                "break_minutes": employee_default_work_hour.break_minutes,
-                "actual_working_hours": 0,
-                "hours_worked": 0,
-                "nbreak": 0,
-                "attendance": view_employee_attendance[0].name if len(view_employee_attendance) > 0 else "",
-                "break_hours": 0,
-                "total_work_seconds": 0,
-                "total_break_seconds": 0,
-                "employee_checkins": [],
-                "first_checkin": "",
-                "last_checkout": "",
-                "expected_break_hours": 0,
-            }
-        else:
-            new_workday = {
-                "target_hours": employee_default_work_hour.hours,
-                "total_target_seconds": employee_default_work_hour.hours * 60 * 60,
-                "break_minutes": employee_default_work_hour.break_minutes,
-                "actual_working_hours": -employee_default_work_hour.hours,
-                "manual_workday": 1,
-                "hours_worked": 0,
-                "nbreak": 0,
-                "attendance": view_employee_attendance[0].name if len(view_employee_attendance) > 0 else "",
-                "break_hours": 0,
-                "employee_checkins": [],
-                "expected_break_hours": expected_break_hours,
-            }
+        attendance = view_employee_attendance[0].name if len(view_employee_attendance) > 0 else ""
+        new_workday = get_workday_without_checkins(employee_default_work_hour, is_target_hours_zero_on_holiday, is_date_in_holiday_list, attendance)
 
     return new_workday
 
-    
 
+def get_workday_without_checkins(employee_default_work_hour, is_target_hours_zero_on_holiday, is_date_in_holiday_list, attendance=""):
+    '''workday values for a date without any Employee Checkin'''
+    break_minutes = employee_default_work_hour.break_minutes
+    expected_break_hours = flt(break_minutes / 60)
+
+    if is_target_hours_zero_on_holiday and is_date_in_holiday_list:
+        return {
+            "target_hours": 0,
+            "total_target_seconds": 0,
+            "break_minutes": employee_default_work_hour.break_minutes,
+            "actual_working_hours": 0,
+            "hours_worked": 0,
+            "nbreak": 0,
+            "attendance": attendance,
+            "break_hours": 0,
+            "total_work_seconds": 0,
+            "total_break_seconds": 0,
+            "employee_checkins": [],
+            "first_checkin": "",
+            "last_checkout": "",
+            "expected_break_hours": 0,
+        }
+
+    return {
+        "target_hours": employee_default_work_hour.hours,
+        "total_target_seconds": employee_default_work_hour.hours * 60 * 60,
+        "break_minutes": employee_default_work_hour.break_minutes,
+        "actual_working_hours": -employee_default_work_hour.hours,
+        "manual_workday": 1,
+        "hours_worked": 0,
+        "nbreak": 0,
+        "attendance": attendance,
+        "break_hours": 0,
+        "employee_checkins": [],
+        "expected_break_hours": expected_break_hours,
+    }
 
-def get_workday(employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday,is_date_in_holiday_list=False):
-    hr_addon_settings = frappe.get_doc("HR Addon Settings")
-    is_break_from_checkins_with_swapped_hours = hr_addon_settings.workday_break_calculation_mechanism == "Break Hours from Employee Checkins" and hr_addon_settings.swap_hours_worked_and_actual_working_hours
-    new_workday = {}
 
-    hours_worked = 0.0
-    total_duration = 0
-   
-    # not pair of IN/OUT either missing
-    if len(employee_checkins)% 2 != 0:
-        hours_worked = -36.0
-        employee_checkin_message = ""
-        for d in employee_checkins:
-            employee_checkin_message += "<li>CheckIn Type:{0} for {1}</li>".format(d.log_type, frappe.get_desk_link("Employee Checkin", d.name))
 
-        #frappe.msgprint("CheckIns must be in pair for the given date:<ul>{}</ul>".format(employee_checkin_message))
+def get_workday(employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday,is_date_in_holiday_list=False, hr_addon_settings=None):
+    # hr_addon_settings can be passed in to evaluate an alternative policy, see api/simulation.py
+    intervals = None
 
+    # pair of IN/OUT by position, None if either is missing
     if (len(employee_checkins) % 2 == 0):
         # seperate 'IN' from 'OUT'
         clockin_list = [get_datetime(kin.time) for x,kin in enumerate(employee_checkins) if x % 2 == 0]
         clockout_list = [get_datetime(kout.time) for x,kout in enumerate(employee_checkins) if x % 2 != 0]
+        intervals = list(zip(clockin_list, clockout_list))
 
-        # get total worked hours
-        for i in range(len(clockin_list)):
-            wh = time_diff_in_hours(clockout_list[i],clockin_list[i])
-            hours_worked += float(str(wh))
+    return get_workday_from_intervals(intervals, employee_checkins, employee_default_work_hour, no_break_hours,
+        is_target_hours_zero_on_holiday, is_date_in_holiday_list, hr_addon_settings)
 
-        # Calculate difference between first check-in and last checkout
-        if clockin_list and clockout_list:
-            first_checkin = clockin_list[0]
-            last_checkout = clockout_list[-1]  # Last element of clockout_list
-            total_duration = time_diff_in_hours(last_checkout, first_checkin) 
+
+def get_interval_totals(intervals):
+    '''(hours worked, first check-in to last checkout, breaks between intervals) in hours,
+    for (check-in, checkout) intervals sorted by time. See api/workday_sql.py for the same sums in SQL'''
+    hours_worked = 0.0
+    total_duration = 0
+    break_from_checkins = 0.0
+
+    clockin_list = [i[0] for i in intervals]
+    clockout_list = [i[1] for i in intervals]
+
+    # get total worked hours
+    for i in range(len(clockin_list)):
+        wh = time_diff_in_hours(clockout_list[i],clockin_list[i])
+        hours_worked += float(str(wh))
+
+    # Calculate difference between first check-in and last checkout
+    if clockin_list and clockout_list:
+        first_checkin = clockin_list[0]
+        last_checkout = clockout_list[-1]  # Last element of clockout_list
+        total_duration = time_diff_in_hours(last_checkout, first_checkin) 
+
+    for i in range(len(clockout_list) - 1):
+        wh = time_diff_in_hours(clockin_list[i + 1], clockout_list[i])
+        break_from_checkins += float(wh)
+
+    return hours_worked, total_duration, break_from_checkins
+
+
+def get_workday_from_intervals(intervals, employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list=False, hr_addon_settings=None):
+    '''workday values from (check-in, checkout) intervals sorted by time, intervals is None if the check-ins could not be paired'''
+    interval_totals = get_interval_totals(intervals) if intervals is not None else None
+    return get_workday_from_totals(interval_totals, employee_checkins, employee_default_work_hour, no_break_hours,
+        is_target_hours_zero_on_holiday, is_date_in_holiday_list, hr_addon_settings)
+
+
+def get_workday_from_totals(interval_totals, employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list=False, hr_addon_settings=None):
+    '''workday values from the result of get_interval_totals, None if the check-ins could not be paired'''
+    hr_addon_settings = hr_addon_settings or frappe.get_doc("HR Addon Settings")
+    is_break_from_checkins_with_swapped_hours = hr_addon_settings.workday_break_calculation_mechanism == "Break Hours from Employee Checkins" and hr_addon_settings.swap_hours_worked_and_actual_working_hours
+    new_workday = {}
+
+    hours_worked = 0.0
+    total_duration = 0
+   
+    # not pair of IN/OUT either missing
+    if interval_totals is None:
+        hours_worked = -36.0
+
+    if interval_totals is not None:
+        hours_worked, total_duration, break_from_checkins = interval_totals
 
         if is_break_from_checkins_with_swapped_hours:
             total_duration, hours_worked = hours_worked, total_duration
@@ -141,12 +210,7 @@ def get_workday(employee_checkins, employee_default_work_hour, no_break_hours, i
     default_break_hours = flt(default_break_minutes / 60)
     target_hours = employee_default_work_hour.hours
 
-    if len(employee_checkins) % 2 == 0:
-        break_from_checkins = 0.0
-        for i in range(len(clockout_list) - 1):
-            wh = time_diff_in_hours(clockin_list[i + 1], clockout_list[i])
-            break_from_checkins += float(wh)
-
+    if interval_totals is not None:
         if hr_addon_settings.workday_break_calculation_mechanism == "Break Hours from Employee Checkins":
             break_hours = break_from_checkins
 
@@ -156,6 +220,8 @@ def get_workday(employee_checkins, employee_default_work_hour, no_break_hours, i
         elif hr_addon_settings.workday_break_calculation_mechanism == "Break Hours from Weekly Working Hours if Shorter breaks":
             if break_from_checkins <= default_break_hours:
                 break_hours = default_break_hours
+            else:
+                break_hours = break_from_checkins
         else:
             break_hours = 0.0
 
@@ -221,59 +287,44 @@ def get_workday(employee_checkins, employee_default_work_hour, no_break_hours, i
 
 
 @frappe.whitelist()
-def get_actual_employee_log_for_bulk_process(aemployee, adate):
-    employee_checkins = get_employee_checkin(aemployee, adate)
-    employee_default_work_hour = get_employee_default_work_hour(aemployee, adate)
-    is_date_in_holiday_list = date_is_in_holiday_list(aemployee, adate)
+def get_actual_employee_log_for_bulk_process(aemployee, adate, target_hours=None, employee_checkins=None, paired_checkins=None, checkin_totals=None, attendance=None):
+    '''paired_checkins: the day of checkin_pairing.get_paired_checkins_for_range, replaces employee_checkins
+    checkin_totals: the day of workday_sql.get_checkin_totals_for_range, replaces employee_checkins
+    attendance: name of the submitted Attendance of the day ("" for none), prefetched for a range'''
+    if paired_checkins is not None:
+        employee_checkins = paired_checkins.checkins
+    elif checkin_totals is not None:
+        employee_checkins = checkin_totals.checkins
+    elif employee_checkins is None:
+        employee_checkins = get_employee_checkin(aemployee, adate)
+    if target_hours:
+        # row of the Target Hours Calendar, replaces the Weekly Working Hours and holiday queries
+        employee_default_work_hour = frappe._dict({
+            "name": target_hours.weekly_working_hours,
+            "hours": flt(target_hours.scheduled_seconds) / 3600,
+            "break_minutes": flt(target_hours.expected_break_seconds) / 60,
+        })
+        is_date_in_holiday_list = bool(target_hours.is_holiday)
+    else:
+        employee_default_work_hour = get_employee_default_work_hour(aemployee, adate)
+        is_date_in_holiday_list = date_is_in_holiday_list(aemployee, adate)
 
-    # Initialize 'fields' before it's used
-    fields = ["name", "no_break_hours", "set_target_hours_to_zero_when_date_is_holiday"]
-    
-    # Fetch weekly working hours using the 'fields' variable
-    weekly_working_hours = frappe.db.get_list(doctype="Weekly Working Hours", filters={"employee": aemployee}, fields=fields)
-    is_target_hours_zero_on_holiday = len(weekly_working_hours) > 0 and weekly_working_hours[0]["set_target_hours_to_zero_when_date_is_holiday"] == 1
+    schedule_flags = get_schedule_flags(aemployee)
+    is_target_hours_zero_on_holiday = schedule_flags.get("set_target_hours_to_zero_when_date_is_holiday") == 1
 
     if employee_checkins:
-        # Determine if 'no_break_hours' should be set to True or False
-        no_break_hours = True if len(weekly_working_hours) > 0 and weekly_working_hours[0]["no_break_hours"] == 1 else False
-        new_workday = get_workday(employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
-    else:
-        view_employee_attendance = get_employee_attendance(aemployee, adate)
-        
-        break_minutes = employee_default_work_hour.break_minutes
-        expected_break_hours = flt(break_minutes / 60)
-        
-        if is_target_hours_zero_on_holiday and is_date_in_holiday_list:
-            new_workday = {
-                "target_hours": 0,
-                "total_target_seconds": 0,
-                "break_minutes": employee_default_work_hour.break_minutes,
-                "actual_working_hours": 0,
-                "hours_worked": 0,
-                "nbreak": 0,
-                "attendance": view_employee_attendance[0].name if len(view_employee_attendance) > 0 else "",
-                "break_hours": 0,
-                "total_work_seconds": 0,
-                "total_break_seconds": 0,
-                "employee_checkins": [],
-                "first_checkin": "",
-                "last_checkout": "",
-                "expected_break_hours": 0,
-            }
+        no_break_hours = schedule_flags.get("no_break_hours") == 1
+        if paired_checkins is not None:
+            new_workday = get_workday_from_intervals(paired_checkins.intervals, employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
+        elif checkin_totals is not None:
+            new_workday = get_workday_from_totals(checkin_totals.totals, employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
         else:
-            new_workday = {
-                "target_hours": employee_default_work_hour.hours,
-                "total_target_seconds": employee_default_work_hour.hours * 60 * 60,
-                "break_minutes": employee_default_work_hour.break_minutes,
-                "actual_working_hours": -employee_default_work_hour.hours,
-                "manual_workday": 1,
-                "hours_worked": 0,
-                "nbreak": 0,
-                "attendance": view_employee_attendance[0].name if len(view_employee_attendance) > 0 else "",
-                "break_hours": 0,
-                "employee_checkins": [],
-                "expected_break_hours": expected_break_hours,
-            }
+            new_workday = get_workday(employee_checkins, employee_default_work_hour, no_break_hours, is_target_hours_zero_on_holiday, is_date_in_holiday_list)
+    else:
+        if attendance is None:
+            view_employee_attendance = get_employee_attendance(aemployee, adate)
+            attendance = view_employee_attendance[0].name if len(view_employee_attendance) > 0 else ""
+        new_workday = get_workday_without_checkins(employee_default_work_hour, is_target_hours_zero_on_holiday, is_date_in_holiday_list, attendance)
 
     return new_workday
 
@@ -311,9 +362,252 @@ def date_is_in_holiday_list(employee, date):
 
 
 
+# ----------------------------------------------------------------------
+# RANGE LOOKUPS, ONE QUERY PER INPUT FOR A SET OF EMPLOYEES AND DATES
+# ----------------------------------------------------------------------
+def get_employee_checkins_for_range(employees, from_date, to_date):
+    '''Employee Checkins of all employees between from_date and to_date, grouped by (employee, date)'''
+    checkins_by_day = defaultdict(list)
+    if not employees:
+        return checkins_by_day
+
+    employee_checkins = frappe.db.sql(
+        """
+        SELECT name, employee, log_type, time, skip_auto_attendance, attendance FROM `tabEmployee Checkin`
+        WHERE employee IN %(employees)s AND time >= %(from_date)s AND time < %(to_date)s
+        ORDER BY employee, time ASC, name ASC
+        """, {
+            "employees": tuple(employees),
+            "from_date": getdate(from_date),
+            "to_date": add_days(getdate(to_date), 1),
+        }, as_dict=1
+    )
+    for checkin in employee_checkins:
+        checkins_by_day[(checkin.employee, getdate(checkin.time))].append(checkin)
+
+    return checkins_by_day
+
+
+def get_weekly_working_hours_for_range(employees, from_date, to_date):
+    '''submitted Weekly Working Hours overlapping the range, as {employee: [weekly working hour]} with the days keyed by day name.
+    The days of a Working Hours Template are read once, and identical schedules share one days dict'''
+    weekly_working_hours = {}
+    if not employees:
+        return {}
+
+    rows = frappe.db.sql(
+        """
+        SELECT w.name, w.employee, w.valid_from, w.valid_to, w.working_hours_template,
+            GREATEST(w.no_break_hours, IFNULL(t.no_break_hours, 0)) AS no_break_hours,
+            GREATEST(w.set_target_hours_to_zero_when_date_is_holiday, IFNULL(t.set_target_hours_to_zero_when_date_is_holiday, 0))
+                AS set_target_hours_to_zero_when_date_is_holiday
+        FROM `tabWeekly Working Hours` w
+        LEFT JOIN `tabWorking Hours Template` t ON t.name = w.working_hours_template
+        WHERE w.employee IN %(employees)s AND w.valid_from <= %(to_date)s AND w.valid_to >= %(from_date)s AND w.docstatus = 1
+        """, {
+            "employees": tuple(employees),
+            "from_date": getdate(from_date),
+            "to_date": getdate(to_date),
+        }, as_dict=1
+    )
+    if not rows:
+        return {}
+
+    # overrides of the Weekly Working Hours and days of the templates, with one query
+    days_by_parent = defaultdict(dict)
+    for day in frappe.db.sql(
+        """
+        SELECT parent, day, hours, break_minutes FROM `tabDaily Hours Detail`
+        WHERE (parenttype = 'Weekly Working Hours' AND parent IN %(names)s)
+            OR (parenttype = 'Working Hours Template' AND parent IN %(templates)s)
+        """, {
+            "names": tuple(row.name for row in rows),
+            "templates": tuple({row.working_hours_template for row in rows if row.working_hours_template}) or ("",),
+        }, as_dict=1
+    ):
+        days_by_parent[day.parent][day.day] = (flt(day.hours), day.break_minutes)
+
+    schedules = {}
+    for row in rows:
+        days = dict(days_by_parent.get(row.working_hours_template, {})) if row.working_hours_template else {}
+        days.update(days_by_parent.get(row.name, {}))
+        weekly_working_hours[row.name] = frappe._dict({
+            "name": row.name,
+            "employee": row.employee,
+            "valid_from": getdate(row.valid_from),
+            "valid_to": getdate(row.valid_to),
+            "no_break_hours": row.no_break_hours,
+            "set_target_hours_to_zero_when_date_is_holiday": row.set_target_hours_to_zero_when_date_is_holiday,
+            "days": intern_schedule(schedules, days),
+            "work_hours": {},
+        })
+
+    by_employee = defaultdict(list)
+    for weekly_working_hour in weekly_working_hours.values():
+        by_employee[weekly_working_hour.employee].append(weekly_working_hour)
+
+    return by_employee
+
+
+def intern_schedule(schedules, days):
+    '''one shared {day: {"hours", "break_minutes"}} per distinct schedule'''
+    key = tuple(sorted(days.items()))
+    if key not in schedules:
+        schedules[key] = {
+            day: frappe._dict({"day": day, "hours": hours, "break_minutes": break_minutes})
+            for day, (hours, break_minutes) in days.items()
+        }
+    return schedules[key]
+
+
+def get_default_work_hour_from_range(weekly_working_hours, employee, adate):
+    '''same row as get_employee_default_work_hour, taken from get_weekly_working_hours_for_range.
+    Returns None if there is no or more than one Weekly Working Hours for the date.
+    The row is shared by all dates with the same weekday of a Weekly Working Hours, it must not be changed'''
+    adate = getdate(adate)
+    day_name = adate.strftime("%A")
+    matches = [
+        w for w in weekly_working_hours.get(employee, [])
+        if w.valid_from <= adate <= w.valid_to and day_name in w.days
+    ]
+    if len(matches) != 1:
+        return None
+
+    weekly_working_hour = matches[0]
+    if day_name not in weekly_working_hour.work_hours:
+        day = weekly_working_hour.days[day_name]
+        weekly_working_hour.work_hours[day_name] = frappe._dict({
+            "name": weekly_working_hour.name,
+            "employee": employee,
+            "valid_from": weekly_working_hour.valid_from,
+            "valid_to": weekly_working_hour.valid_to,
+            "day": day_name,
+            "hours": day.hours,
+            "break_minutes": day.break_minutes,
+            "no_break_hours": weekly_working_hour.no_break_hours,
+            "set_target_hours_to_zero_when_date_is_holiday": weekly_working_hour.set_target_hours_to_zero_when_date_is_holiday,
+        })
+
+    return weekly_working_hour.work_hours[day_name]
+
+
+def get_holidays_for_range(employees, from_date, to_date):
+    '''{employee: set of holiday dates} from the Holiday List linked in the Employee'''
+    holidays = defaultdict(set)
+    if not employees:
+        return holidays
+
+    rows = frappe.db.sql(
+        """
+        SELECT e.name AS employee, h.holiday_date FROM `tabEmployee` e
+        INNER JOIN `tabHoliday` h ON h.parent = e.holiday_list
+        WHERE e.name IN %(employees)s AND h.holiday_date BETWEEN %(from_date)s AND %(to_date)s
+        """, {
+            "employees": tuple(employees),
+            "from_date": getdate(from_date),
+            "to_date": getdate(to_date),
+        }, as_dict=1
+    )
+    for row in rows:
+        holidays[row.employee].add(getdate(row.holiday_date))
+
+    return holidays
+
+
+def get_leave_days_for_range(employees, from_date, to_date):
+    '''{(employee, date): "On Leave" or "Comp Off"} with the same rules as Workday.validate'''
+    leave_days = {}
+    if not employees:
+        return leave_days
+
+    leave_applications = frappe.db.sql(
+        """
+        SELECT employee, from_date, to_date, leave_type, docstatus FROM `tabLeave Application`
+        WHERE employee IN %(employees)s AND from_date <= %(to_date)s AND to_date >= %(from_date)s
+        AND (docstatus = 1 OR leave_type = %(freizeitausgleich)s)
+        """, {
+            "employees": tuple(employees),
+            "from_date": getdate(from_date),
+            "to_date": getdate(to_date),
+            "freizeitausgleich": COMP_OFF_LEAVE_TYPES[0],
+        }, as_dict=1
+    )
+    for leave_application in leave_applications:
+        kind = "Comp Off" if leave_application.leave_type in COMP_OFF_LEAVE_TYPES else "On Leave"
+        start = max(getdate(leave_application.from_date), getdate(from_date))
+        end = min(getdate(leave_application.to_date), getdate(to_date))
+        for i in range(date_diff(end, start) + 1):
+            key = (leave_application.employee, add_days(start, i))
+            # "On Leave" is applied after the comp off rule in Workday.validate and wins
+            if leave_days.get(key) != "On Leave":
+                leave_days[key] = kind
+
+    return leave_days
+
+
+def apply_leave_rules(workday, leave_kind):
+    '''in-memory equivalent of Workday.date_is_in_comp_off and Workday.set_status_for_leave_application'''
+    if leave_kind == "Comp Off":
+        workday.update({
+            "hours_worked": 0.0,
+            "actual_working_hours": -workday.get("target_hours", 0),
+            "break_hours": 0.0,
+            "total_break_seconds": 0.0,
+            "total_work_seconds": flt(-workday.get("target_hours", 0) * 60 * 60),
+        })
+    elif leave_kind == "On Leave":
+        workday.update({
+            "target_hours": 0,
+            "expected_break_hours": 0,
+            "actual_working_hours": 0,
+            "total_target_seconds": 0,
+            "total_break_seconds": 0,
+            "total_work_seconds": 0,
+            "status": "On Leave",
+        })
+
+    return workday
+
+
+def get_actual_diff_seconds(actual_working_hours, total_target_seconds):
+    '''balance of a day with the sign rule of the Work Hour Report (actual_diff_log)'''
+    if flt(actual_working_hours) < 0:
+        return flt(actual_working_hours) * 60 * 60
+    return flt(actual_working_hours) * 60 * 60 - flt(total_target_seconds)
+
+
+
+def get_bulk_insert_names(doctype, count):
+    '''names for count new documents of doctype, a naming series block is reserved with one update'''
+    from frappe.model.naming import parse_naming_series
+
+    meta = frappe.get_meta(doctype)
+    naming_series = meta.autoname or ""
+    if naming_series.startswith("naming_series:"):
+        naming_series = (meta.get_field("naming_series").options or "").split("\n")[0]
+    elif naming_series.startswith("format:") or "." not in naming_series:
+        return [frappe.generate_hash(length=10) for i in range(count)]
+
+    if "#" not in naming_series:
+        naming_series += ".#####"
+    prefix, hashes = naming_series.rsplit(".", 1)
+    prefix = parse_naming_series(prefix)
+
+    current = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name`=%s FOR UPDATE", prefix)
+    if current:
+        start = current[0][0] or 0
+        frappe.db.sql("UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name`=%s", (count, prefix))
+    else:
+        start = 0
+        frappe.db.sql("INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)", (prefix, count))
+
+    return ["{0}{1}".format(prefix, str(start + i + 1).zfill(len(hashes))) for i in range(count)]
+
+
 # ----------------------------------------------------------------------
 # WORK ANNIVERSARY REMINDERS SEND TO EMPLOYEES LIST IN HR-ADDON-SETTINGS
 # ----------------------------------------------------------------------
+@timed("work_anniversary_notification")
 def send_work_anniversary_notification():
     """Send Employee Work Anniversary Reminders if 'Send Work Anniversary Reminders' is checked"""
     if not int(frappe.db.get_single_value("HR Addon Settings", "enable_work_anniversaries_notification")):
@@ -0,0 +1,203 @@
+import base64
+import json
+import frappe
+from frappe import _
+from frappe.core.doctype.user_permission.user_permission import get_user_permissions
+from frappe.model.db_query import DatabaseQuery
+from frappe.utils import cint, cstr, get_datetime
+
+from hr_addon.hr_addon.api.checkin_storage import get_checkin_refs
+from hr_addon.hr_addon.api.sequence_feed import read_sequence_feed
+
+DEFAULT_EXPORT_FIELDS = ("employee", "log_date", "company", "status", "attendance", "target_hours", "hours_worked",
+    "actual_working_hours", "expected_break_hours", "break_hours", "total_target_seconds", "total_work_seconds",
+    "total_break_seconds", "first_checkin", "last_checkout", "manual_workday", "anomaly_status")
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+@frappe.whitelist()
+def export_workdays(since=None, cursor=None, fields=None, page_size=DEFAULT_PAGE_SIZE, include_checkins=0):
+    '''One page of Workdays ordered by (modified, name), for payroll and other integrations.
+
+    since: only Workdays modified after this datetime, for the first page of an incremental pull
+    cursor: next_cursor of the previous page
+    fields: list of Workday fields, name and modified are always returned first
+    include_checkins: adds a "checkins" column with [[employee checkin, time], ...]
+
+    Rows are limited by the user permissions of the session user like frappe.get_list.
+
+    Returns {"fields": [...], "rows": [[...], ...], "next_cursor": ..., "has_more": 0|1}.
+    Keep the last next_cursor to continue the next sync where this one stopped.
+    '''
+    frappe.has_permission("Workday", "export", throw=True)
+
+    fields = get_export_fields(fields)
+    page_size = min(cint(page_size) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    conditions, values = ["docstatus < 2"], {"limit": page_size + 1}
+    match_conditions = get_match_conditions()
+    if match_conditions:
+        conditions.append("({0})".format(match_conditions))
+    if cursor:
+        values["modified"], values["name"] = decode_cursor(cursor)
+        conditions.append("(modified > %(modified)s OR (modified = %(modified)s AND name > %(name)s))")
+    elif since:
+        values["modified"] = get_datetime(since)
+        conditions.append("modified > %(modified)s")
+
+    rows = frappe.db.sql("""
+        SELECT name, modified, {fields} FROM `tabWorkday`
+        WHERE {conditions}
+        ORDER BY modified ASC, name ASC
+        LIMIT %(limit)s
+    """.format(
+        fields=", ".join("`{0}`".format(f) for f in fields),
+        conditions=" AND ".join(conditions),
+    ), values)
+
+    has_more = len(rows) > page_size
+    rows = [list(row) for row in rows[:page_size]]
+
+    export_fields = ["name", "modified"] + fields
+    if cint(include_checkins):
+        checkin_refs = get_checkin_refs([row[0] for row in rows])
+        for row in rows:
+            row.append([[name, cstr(time)] for name, time in checkin_refs.get(row[0], [])])
+        export_fields.append("checkins")
+
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if rows else cursor
+    if not rows and since and not cursor:
+        next_cursor = encode_cursor(get_datetime(since), "")
+
+    return {
+        "fields": export_fields,
+        "rows": rows,
+        "next_cursor": next_cursor,
+        "has_more": cint(has_more),
+    }
+
+
+def get_export_fields(fields=None):
+    '''requested fields checked against the Workday meta and the permission levels of the user'''
+    meta = frappe.get_meta("Workday")
+    permlevels = meta.get_permlevel_access("read")
+    valid_fields = {df.fieldname for df in meta.fields if df.fieldtype not in frappe.model.no_value_fields
+        and df.fieldtype not in frappe.model.table_fields and df.permlevel in permlevels}
+
+    if not fields:
+        return [f for f in DEFAULT_EXPORT_FIELDS if f in valid_fields]
+
+    if isinstance(fields, str):
+        fields = frappe.parse_json(fields) if fields.startswith("[") else [f.strip() for f in fields.split(",")]
+
+    invalid = [f for f in fields if f not in valid_fields and f not in frappe.model.default_fields]
+    if invalid:
+        frappe.throw(_("Invalid fields: {0}").format(", ".join(invalid)))
+
+    return [f for f in fields if f not in ("name", "modified")]
+
+
+def get_match_conditions():
+    '''user permissions and permission query conditions of Workday as a condition on `tabWorkday`, like frappe.get_list.
+    % is doubled, the condition goes into a query with parameters'''
+    return DatabaseQuery("Workday").build_match_conditions().replace("%", "%%")
+
+
+def filter_readable_changes(changes):
+    '''changes of Workdays the session user can read. A Workday that no longer exists is checked
+    against the user permissions of its employee and company'''
+    match_conditions = get_match_conditions()
+    if not match_conditions or not changes:
+        return changes
+
+    names = tuple({c.workday for c in changes})
+    existing = set(frappe.db.sql_list("SELECT name FROM `tabWorkday` WHERE name IN %(names)s", {"names": names}))
+    readable = set(frappe.db.sql_list("""
+        SELECT name FROM `tabWorkday` WHERE name IN %(names)s AND ({0})
+    """.format(match_conditions), {"names": names}))
+    allowed = get_allowed_by_user_permissions()
+
+    def can_read(change):
+        if change.workday in existing:
+            return change.workday in readable
+        return all(change.get(field) in docs for field, docs in allowed.items())
+
+    return [c for c in changes if can_read(c)]
+
+
+def get_allowed_by_user_permissions():
+    '''{"employee" or "company": allowed names} of the user permissions that apply to Workday'''
+    user_permissions = get_user_permissions(frappe.session.user)
+    allowed = {}
+    for field, doctype in (("employee", "Employee"), ("company", "Company")):
+        docs = {p.get("doc") for p in user_permissions.get(doctype, [])
+            if not p.get("applicable_for") or p.get("applicable_for") == "Workday"}
+        if docs:
+            allowed[field] = docs
+
+    return allowed
+
+
+def encode_cursor(modified, name):
+    return base64.urlsafe_b64encode(json.dumps([cstr(modified), name]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        modified, name = json.loads(base64.urlsafe_b64decode(cstr(cursor).encode()))
+    except Exception:
+        frappe.throw(_("Invalid cursor"))
+
+    return get_datetime(modified), name
+
+
+@frappe.whitelist()
+def get_workday_changes(after=0, limit=DEFAULT_PAGE_SIZE, include_values=0, fields=None):
+    '''Workday inserts, updates and deletes after the cursor after, in sequence order.
+
+    include_values: adds the current values of fields (see export_workdays) to changes of Workdays that still exist
+
+    Changes are limited like export_workdays, those of deleted Workdays by the Employee and Company user permissions.
+
+    Returns {"changes": [{"sequence", "workday", "operation", "employee", "log_date", "company", "values"?}, ...],
+    "cursor": ..., "last_sequence": ..., "has_more": 0|1, "compacted": 0|1}.
+    Pass cursor as after of the next call. It keeps the sequences of uncommitted transactions open, their changes
+    are returned when they commit, after changes with a higher sequence. compacted is 1 when changes after the
+    given cursor were already removed by the retention of HR Addon Settings, the consumer has to resync with
+    export_workdays.
+    '''
+    frappe.has_permission("Workday", "export", throw=True)
+
+    limit = min(cint(limit) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    feed = read_sequence_feed("Workday Change Log", ["workday", "operation", "employee", "log_date", "company"],
+        after, limit)
+    changes = []
+    for row in feed.rows:
+        row["sequence"] = row.pop("name")
+        changes.append(row)
+    changes = filter_readable_changes(changes)
+
+    if cint(include_values):
+        fields = get_export_fields(fields)
+        names = [c.workday for c in changes if c.operation != "Delete"]
+        values = {}
+        if names:
+            match_conditions = get_match_conditions()
+            values = {row.name: row for row in frappe.db.sql("""
+                SELECT name, {fields} FROM `tabWorkday` WHERE name IN %(names)s {match_conditions}
+            """.format(
+                fields=", ".join("`{0}`".format(f) for f in fields),
+                match_conditions="AND ({0})".format(match_conditions) if match_conditions else "",
+            ), {"names": tuple(set(names))}, as_dict=1)}
+        for change in changes:
+            change["values"] = values.get(change.workday)
+
+    return {
+        "changes": changes,
+        "cursor": feed.cursor,
+        "last_sequence": feed.last_sequence,
+        "has_more": feed.has_more,
+        "compacted": feed.compacted,
+    }
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import frappe
+from frappe.utils import cstr, getdate
+
+from hr_addon.hr_addon.api.checkin_pairing import get_pairing_settings
+from hr_addon.hr_addon.api.simulation import SIMULATION_SETTINGS_FIELDS
+from hr_addon.hr_addon.api.utils import get_leave_days_for_range
+
+# bump when the workday computation changes, every stored fingerprint becomes stale
+FINGERPRINT_VERSION = 1
+
+
+def get_settings_fingerprint():
+    '''HR Addon Settings values the computation of a day depends on'''
+    hr_addon_settings = frappe.get_cached_doc("HR Addon Settings")
+    settings = {field: cstr(hr_addon_settings.get(field)) for field in SIMULATION_SETTINGS_FIELDS}
+    settings.update(get_pairing_settings())
+    return settings
+
+
+def get_fingerprint_inputs(employee, from_date, to_date):
+    '''inputs of a range that are not prefetched by the workday pipeline, one query each.
+    The attendance is also passed to get_actual_employee_log_for_bulk_process'''
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    # the break and holiday flags are read from any Weekly Working Hours of the employee
+    weekly_working_hours_version = frappe.db.sql("""
+        SELECT GROUP_CONCAT(w.name, '@', w.modified, IFNULL(CONCAT('@', t.modified), '') ORDER BY w.name)
+        FROM `tabWeekly Working Hours` w
+        LEFT JOIN `tabWorking Hours Template` t ON t.name = w.working_hours_template
+        WHERE w.employee = %s AND w.docstatus = 1
+    """, employee)[0][0]
+    attendance = dict(frappe.db.sql("""
+        SELECT attendance_date, name FROM `tabAttendance`
+        WHERE employee = %s AND attendance_date BETWEEN %s AND %s AND docstatus = 1
+    """, (employee, from_date, to_date)))
+
+    return frappe._dict({
+        "settings": get_settings_fingerprint(),
+        "weekly_working_hours": cstr(weekly_working_hours_version),
+        "leave_days": get_leave_days_for_range([employee], from_date, to_date),
+        "attendance": {getdate(d): name for d, name in attendance.items()},
+    })
+
+
+def get_input_fingerprint(inputs, employee, date, employee_checkins, target_hours=None):
+    '''hash of everything the Workday of (employee, date) is computed from'''
+    date = getdate(date)
+    day = [
+        FINGERPRINT_VERSION,
+        inputs.settings,
+        inputs.weekly_working_hours,
+        [[c.name, cstr(c.time), c.log_type or ""] for c in employee_checkins or []],
+        [cstr(target_hours.get(f)) for f in ("weekly_working_hours", "scheduled_seconds", "expected_break_seconds",
+            "is_holiday", "day_type")] if target_hours else None,
+        inputs.leave_days.get((employee, date)),
+        "" if employee_checkins else inputs.attendance.get(date, ""),
+    ]
+    return hashlib.sha1(json.dumps(day, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
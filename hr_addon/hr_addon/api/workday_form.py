@@ -0,0 +1,127 @@
+import frappe
+from frappe.utils import add_days, cint, getdate
+
+from hr_addon.hr_addon.api.checkin_pairing import get_paired_checkins_for_range
+from hr_addon.hr_addon.api.utils import (
+    date_is_in_holiday_list,
+    get_actual_employee_log,
+    get_default_work_hour_from_range,
+    get_employee_checkins_for_range,
+    get_holidays_for_range,
+    get_weekly_working_hours_for_range,
+    get_workday,
+    get_workday_from_intervals,
+    get_workday_without_checkins,
+)
+
+MEMO_KEY = "hr_addon:workday_form:{0}:{1}:{2}:{3}"
+VERSION_KEY = "hr_addon:workday_form_version:{0}"
+ALL_EMPLOYEES = "*"
+
+MEMO_EXPIRY_SECONDS = 5 * 60
+MAX_DAYS_AROUND = 7
+
+
+@frappe.whitelist()
+def get_workday_form_data(employee, date, days_around=0):
+    '''Everything the Workday form needs for an employee and date in one call:
+    {date: {"is_holiday": 0|1, "workday": values of get_actual_employee_log}}
+
+    With days_around the adjacent dates are returned as well, so that the form can switch dates without a call.
+    Results are memoized per user until a check-in, leave, schedule or holiday of the employee changes.'''
+    frappe.has_permission("Employee", "read", doc=employee, throw=True)
+
+    date = getdate(date)
+    days_around = min(cint(days_around), MAX_DAYS_AROUND)
+    dates = [add_days(date, i) for i in range(-days_around, days_around + 1)]
+
+    cache = frappe.cache()
+    version = get_version(employee)
+    memo_keys = {d: MEMO_KEY.format(frappe.session.user, employee, version, d) for d in dates}
+
+    form_data = {}
+    for d in dates:
+        day = cache.get_value(memo_keys[d])
+        if day is not None:
+            form_data[d] = day
+
+    missing = [d for d in dates if d not in form_data]
+    if missing:
+        for d, day in compute_workday_form_data(employee, min(missing), max(missing)).items():
+            if d in memo_keys and d not in form_data:
+                form_data[d] = day
+                cache.set_value(memo_keys[d], day, expires_in_sec=MEMO_EXPIRY_SECONDS)
+
+    if date not in form_data:
+        # no or overlapping Weekly Working Hours, let the single date lookup raise its message
+        form_data[date] = {
+            "is_holiday": cint(date_is_in_holiday_list(employee, date)),
+            "workday": get_actual_employee_log(employee, date),
+        }
+
+    return {str(d): day for d, day in form_data.items()}
+
+
+def compute_workday_form_data(employee, from_date, to_date):
+    '''form data of a range with one query per source, days without a unique Weekly Working Hours are left out'''
+    weekly_working_hours = get_weekly_working_hours_for_range([employee], from_date, to_date)
+    holidays = get_holidays_for_range([employee], from_date, to_date).get(employee, set())
+    paired_checkins = get_paired_checkins_for_range(employee, from_date, to_date)
+    checkins_by_day = get_employee_checkins_for_range([employee], from_date, to_date) if paired_checkins is None else {}
+    attendance = dict(frappe.db.sql("""
+        SELECT attendance_date, name FROM `tabAttendance`
+        WHERE employee = %(employee)s AND attendance_date BETWEEN %(from_date)s AND %(to_date)s AND docstatus = 1
+    """, {"employee": employee, "from_date": from_date, "to_date": to_date}))
+    hr_addon_settings = frappe.get_cached_doc("HR Addon Settings")
+
+    form_data = {}
+    for i in range((getdate(to_date) - getdate(from_date)).days + 1):
+        adate = add_days(from_date, i)
+        employee_default_work_hour = get_default_work_hour_from_range(weekly_working_hours, employee, adate)
+        if not employee_default_work_hour:
+            continue
+
+        is_date_in_holiday_list = adate in holidays
+        is_target_hours_zero_on_holiday = cint(employee_default_work_hour.set_target_hours_to_zero_when_date_is_holiday) == 1
+        no_break_hours = cint(employee_default_work_hour.no_break_hours) == 1
+
+        if paired_checkins is not None:
+            day = paired_checkins[adate]
+            employee_checkins = day.checkins
+        else:
+            employee_checkins = checkins_by_day.get((employee, adate), [])
+
+        if employee_checkins and paired_checkins is not None:
+            workday = get_workday_from_intervals(day.intervals, employee_checkins, employee_default_work_hour, no_break_hours,
+                is_target_hours_zero_on_holiday, is_date_in_holiday_list, hr_addon_settings)
+        elif employee_checkins:
+            workday = get_workday(employee_checkins, employee_default_work_hour, no_break_hours,
+                is_target_hours_zero_on_holiday, is_date_in_holiday_list, hr_addon_settings)
+        else:
+            workday = get_workday_without_checkins(employee_default_work_hour, is_target_hours_zero_on_holiday,
+                is_date_in_holiday_list, attendance.get(adate, ""))
+
+        form_data[adate] = {"is_holiday": cint(is_date_in_holiday_list), "workday": workday}
+
+    return form_data
+
+
+def get_version(employee):
+    cache = frappe.cache()
+    return "{0}.{1}".format(cache.get_value(VERSION_KEY.format(ALL_EMPLOYEES)) or 0, cache.get_value(VERSION_KEY.format(employee)) or 0)
+
+
+def invalidate_workday_form_data(employee=None):
+    '''a new version makes all memoized form data of the employee (or of everyone) unreachable, it expires on its own.
+    The version changes after the commit, a read in between would memoize the old data under the new version'''
+    key = VERSION_KEY.format(employee or ALL_EMPLOYEES)
+    frappe.db.after_commit.add(lambda: frappe.cache().set_value(key, frappe.generate_hash(length=8)))
+
+
+def on_employee_data_change(doc, method=None):
+    if doc.get("employee"):
+        invalidate_workday_form_data(doc.employee)
+
+
+def on_holiday_list_change(doc, method=None):
+    invalidate_workday_form_data()
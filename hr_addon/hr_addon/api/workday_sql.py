@@ -0,0 +1,142 @@
+import json
+import frappe
+from frappe.utils import add_days, cint, flt, get_datetime, getdate, parse_json
+from frappe.utils.data import date_diff
+
+from hr_addon.hr_addon.api.checkin_pairing import PAIRING_MODE_LOG_TYPE, get_pairing_settings
+from hr_addon.hr_addon.api.utils import (
+    get_default_work_hour_from_range,
+    get_employee_checkins_for_range,
+    get_holidays_for_range,
+    get_weekly_working_hours_for_range,
+    get_workday,
+    get_workday_from_totals,
+)
+
+WORKDAY_ENGINE_PYTHON = "Python"
+WORKDAY_ENGINE_SQL = "SQL"
+
+# fields compared by compare_workday_engines
+COMPARED_FIELDS = ("target_hours", "total_target_seconds", "hours_worked", "expected_break_hours", "actual_working_hours",
+    "total_work_seconds", "break_hours", "total_break_seconds", "attendance")
+TOLERANCE = 1e-6
+
+# punches of an (employee, date) numbered by time: even rows close an interval, odd rows after the first close a break.
+# The sums are rounded per interval like time_diff_in_hours in get_interval_totals.
+CHECKIN_TOTALS_QUERY = """
+    SELECT
+        employee,
+        log_date,
+        COUNT(*) AS punches,
+        SUM(IF(MOD(rn, 2) = 0, ROUND(TIMESTAMPDIFF(MICROSECOND, previous_time, time) / 3600000000, 6), 0)) AS hours_worked,
+        ROUND(TIMESTAMPDIFF(MICROSECOND, MIN(time), MAX(time)) / 3600000000, 6) AS total_duration,
+        SUM(IF(MOD(rn, 2) = 1 AND rn > 1, ROUND(TIMESTAMPDIFF(MICROSECOND, previous_time, time) / 3600000000, 6), 0)) AS break_hours,
+        JSON_ARRAYAGG(JSON_ARRAY(name, time, log_type, skip_auto_attendance, attendance) ORDER BY rn) AS checkins
+    FROM (
+        SELECT
+            employee, DATE(time) AS log_date, name, time, log_type, skip_auto_attendance, attendance,
+            ROW_NUMBER() OVER w AS rn,
+            LAG(time) OVER w AS previous_time
+        FROM `tabEmployee Checkin`
+        WHERE employee IN %(employees)s AND time >= %(from_date)s AND time < %(to_date)s
+        WINDOW w AS (PARTITION BY employee, DATE(time) ORDER BY time, name)
+    ) punches
+    GROUP BY employee, log_date
+"""
+
+
+def get_workday_engine():
+    '''the SQL engine pairs by position within a calendar day, with Log Type pairing the Python engine is used'''
+    engine = frappe.db.get_single_value("HR Addon Settings", "workday_engine") or WORKDAY_ENGINE_PYTHON
+    if engine == WORKDAY_ENGINE_SQL and get_pairing_settings().mode != PAIRING_MODE_LOG_TYPE:
+        return WORKDAY_ENGINE_SQL
+    return WORKDAY_ENGINE_PYTHON
+
+
+def get_checkin_totals_for_range(employees, from_date, to_date):
+    '''{(employee, date): {"checkins": [...], "totals": (hours worked, duration, breaks) or None for odd punches}}
+    computed by the database, one row per day instead of one per check-in'''
+    checkin_totals = {}
+    if not employees:
+        return checkin_totals
+
+    rows = frappe.db.sql(CHECKIN_TOTALS_QUERY, {
+        "employees": tuple(employees),
+        "from_date": getdate(from_date),
+        "to_date": add_days(getdate(to_date), 1),
+    }, as_dict=1)
+
+    for row in rows:
+        checkins = [
+            frappe._dict({
+                "name": name,
+                "time": get_datetime(time),
+                "log_type": log_type,
+                "skip_auto_attendance": skip_auto_attendance,
+                "attendance": attendance,
+            }) for name, time, log_type, skip_auto_attendance, attendance in json.loads(row.checkins)
+        ]
+        totals = None
+        if row.punches % 2 == 0:
+            totals = (flt(row.hours_worked), flt(row.total_duration), flt(row.break_hours))
+        checkin_totals[(row.employee, getdate(row.log_date))] = frappe._dict({"checkins": checkins, "totals": totals})
+
+    return checkin_totals
+
+
+def get_checkin_totals_of_day(checkin_totals, employee, date):
+    return checkin_totals.get((employee, getdate(date))) or frappe._dict({"checkins": [], "totals": None})
+
+
+@frappe.whitelist()
+def compare_workday_engines(from_date, to_date, employees=None, max_mismatches=100):
+    '''compute the days with check-ins with the Python and the SQL engine and return the differences'''
+    frappe.only_for("System Manager")
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    employees = parse_json(employees) if employees else frappe.get_all("Employee", filters={"status": "Active"}, pluck="name")
+    if isinstance(employees, str):
+        employees = [employees]
+
+    checkins_by_day = get_employee_checkins_for_range(employees, from_date, to_date)
+    checkin_totals = get_checkin_totals_for_range(employees, from_date, to_date)
+    weekly_working_hours = get_weekly_working_hours_for_range(employees, from_date, to_date)
+    holidays = get_holidays_for_range(employees, from_date, to_date)
+    hr_addon_settings = frappe.get_cached_doc("HR Addon Settings")
+
+    compared, mismatches = 0, []
+    for employee in employees:
+        for i in range(date_diff(to_date, from_date) + 1):
+            adate = add_days(from_date, i)
+            employee_checkins = checkins_by_day.get((employee, adate), [])
+            day = get_checkin_totals_of_day(checkin_totals, employee, adate)
+            employee_default_work_hour = get_default_work_hour_from_range(weekly_working_hours, employee, adate)
+            if (not employee_checkins and not day.checkins) or not employee_default_work_hour:
+                continue
+
+            args = (employee_default_work_hour, cint(employee_default_work_hour.no_break_hours) == 1,
+                cint(employee_default_work_hour.set_target_hours_to_zero_when_date_is_holiday) == 1,
+                adate in holidays.get(employee, ()))
+            python_workday = get_workday(employee_checkins, *args, hr_addon_settings=hr_addon_settings)
+            sql_workday = get_workday_from_totals(day.totals, day.checkins, *args, hr_addon_settings=hr_addon_settings)
+
+            compared += 1
+            differences = get_differences(python_workday, sql_workday)
+            if [c.name for c in employee_checkins] != [c.name for c in day.checkins]:
+                differences["checkins"] = ([c.name for c in employee_checkins], [c.name for c in day.checkins])
+            if differences and len(mismatches) < cint(max_mismatches):
+                mismatches.append({"employee": employee, "date": adate, "differences": differences})
+
+    return {"compared": compared, "mismatches": mismatches}
+
+
+def get_differences(python_workday, sql_workday):
+    differences = {}
+    for field in COMPARED_FIELDS:
+        python_value, sql_value = python_workday.get(field), sql_workday.get(field)
+        if isinstance(python_value, (int, float)) or isinstance(sql_value, (int, float)):
+            if abs(flt(python_value) - flt(sql_value)) > TOLERANCE:
+                differences[field] = (python_value, sql_value)
+        elif (python_value or "") != (sql_value or ""):
+            differences[field] = (python_value, sql_value)
+    return differences
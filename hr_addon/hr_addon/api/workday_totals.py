@@ -0,0 +1,168 @@
+import frappe
+from frappe import _
+from frappe.utils import flt, get_last_day, getdate
+
+from hr_addon.hr_addon.doctype.workday_anomaly.workday_anomaly import INCOMPLETE_ANOMALIES
+
+# days whose check-ins could not be paired, see get_workday_from_intervals
+INCOMPLETE_CONDITION = "anomaly_status IN ({0})".format(", ".join("'{0}'".format(a) for a in INCOMPLETE_ANOMALIES))
+
+# balance of a day, same sign rule as actual_diff_log of the Work Hour Report
+ACTUAL_DIFF_SECONDS = """(CASE
+    WHEN actual_working_hours < 0 THEN actual_working_hours * 60 * 60
+    ELSE (actual_working_hours * 60 * 60 - total_target_seconds)
+END)"""
+
+# aggregate columns over `tabWorkday`. Incomplete days are counted but their hours are left out of the sums.
+# Unlike the -36h sentinel of the Work Hour Report they add nothing to actual_diff_seconds, their target stays in
+# total_target_seconds and is also returned as incomplete_target_seconds:
+# actual_diff_seconds = actual_working_seconds - (total_target_seconds - incomplete_target_seconds)
+WORKDAY_TOTALS_COLUMNS = """
+    COUNT(*) AS workdays,
+    SUM(status IN ('Present', 'Work From Home')) AS days_present,
+    SUM(status = 'Half Day') AS days_half_day,
+    SUM(status = 'Absent') AS days_absent,
+    SUM(status = 'On Leave') AS days_on_leave,
+    SUM(status = 'On Leave' AND total_target_seconds = 0) AS leave_zeroed_days,
+    SUM({incomplete}) AS incomplete_days,
+    SUM(total_target_seconds) AS total_target_seconds,
+    SUM(CASE WHEN {incomplete} THEN total_target_seconds ELSE 0 END) AS incomplete_target_seconds,
+    SUM(CASE WHEN {incomplete} OR total_work_seconds < 0 THEN 0 ELSE total_work_seconds END) AS total_work_seconds,
+    SUM(CASE WHEN {incomplete} OR total_break_seconds < 0 THEN 0 ELSE total_break_seconds END) AS total_break_seconds,
+    SUM(CASE WHEN {incomplete} THEN 0 ELSE actual_working_hours * 60 * 60 END) AS actual_working_seconds,
+    SUM(CASE WHEN {incomplete} THEN 0 ELSE {actual_diff} END) AS actual_diff_seconds,
+    SUM(CASE WHEN {incomplete} THEN 0 ELSE GREATEST({actual_diff}, 0) END) AS overtime_seconds
+"""
+
+TOTAL_FIELDS = ("workdays", "days_present", "days_half_day", "days_absent", "days_on_leave", "leave_zeroed_days",
+    "incomplete_days", "total_target_seconds", "incomplete_target_seconds", "total_work_seconds", "total_break_seconds",
+    "actual_working_seconds", "actual_diff_seconds", "overtime_seconds")
+
+
+def get_workday_totals_columns():
+    return WORKDAY_TOTALS_COLUMNS.format(incomplete=INCOMPLETE_CONDITION, actual_diff=ACTUAL_DIFF_SECONDS)
+
+
+def get_workday_totals(from_date, to_date, employees=None, company=None, group_by_month=False):
+    '''totals of `tabWorkday` per employee (and month) with one grouped query'''
+    conditions = ["docstatus < 2", "log_date BETWEEN %(from_date)s AND %(to_date)s"]
+    values = {"from_date": getdate(from_date), "to_date": getdate(to_date)}
+    if employees:
+        conditions.append("employee IN %(employees)s")
+        values["employees"] = tuple(employees)
+    if company:
+        conditions.append("company = %(company)s")
+        values["company"] = company
+
+    group_by = "employee, month" if group_by_month else "employee"
+    return frappe.db.sql("""
+        SELECT employee, MAX(company) AS company,
+            {month} AS month,
+            {columns}
+        FROM `tabWorkday`
+        WHERE {conditions}
+        GROUP BY {group_by}
+    """.format(
+        month="DATE_FORMAT(log_date, '%%Y-%%m-01')" if group_by_month else "NULL",
+        columns=get_workday_totals_columns(),
+        conditions=" AND ".join(conditions),
+        group_by=group_by,
+    ), values, as_dict=1)
+
+
+@frappe.whitelist()
+def get_payroll_period_totals(from_date=None, to_date=None, employees=None, company=None, payroll_entry=None):
+    '''Totals per employee of a payroll period, live Workdays and archived months together:
+    {employee: {"company", "workdays", "days_present", ..., "overtime_seconds"}}
+
+    payroll_entry: takes the period, company and employees of a Payroll Entry
+    employees: list of Employee IDs, all employees of the period if not set
+    '''
+    frappe.only_for(("HR Manager", "HR User", "System Manager"))
+
+    if payroll_entry:
+        payroll_entry = frappe.get_doc("Payroll Entry", payroll_entry)
+        payroll_entry.check_permission("read")
+        from_date, to_date, company = payroll_entry.start_date, payroll_entry.end_date, payroll_entry.company
+        employees = [row.employee for row in payroll_entry.get("employees")]
+        if not employees:
+            return {}
+    elif not (from_date and to_date):
+        frappe.throw(_("From Date and To Date or a Payroll Entry are required"))
+
+    employees = frappe.parse_json(employees) if isinstance(employees, str) and employees.startswith("[") else employees
+    if isinstance(employees, str):
+        employees = [e.strip() for e in employees.split(",") if e.strip()]
+
+    totals = {}
+    for row in get_workday_totals(from_date, to_date, employees=employees, company=company):
+        add_totals(totals, row.employee, row.company, row)
+    for row in get_archived_totals(from_date, to_date, employees=employees, company=company):
+        add_totals(totals, row.employee, row.company, row)
+
+    return totals
+
+
+def add_totals(totals, employee, company, row):
+    employee_totals = totals.setdefault(employee, frappe._dict({"company": company, **{field: 0 for field in TOTAL_FIELDS}}))
+    for field in TOTAL_FIELDS:
+        employee_totals[field] += flt(row.get(field))
+
+
+def get_archived_totals(from_date, to_date, employees=None, company=None):
+    '''totals of Workday Archive: stored totals of the months inside the period, partial months from the detail'''
+    from hr_addon.hr_addon.doctype.workday_archive.workday_archive import decompress_detail
+
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    filters = {"month": ["between", [from_date.replace(day=1), to_date]]}
+    if employees:
+        filters["employee"] = ["in", employees]
+    if company:
+        filters["company"] = company
+
+    fields = ["name", "employee", "company", "month"] + list(TOTAL_FIELDS)
+    archives = frappe.get_all("Workday Archive", filters=filters, fields=fields)
+    partial = [a.name for a in archives if getdate(a.month) < from_date or get_last_day(a.month) > to_date]
+    details = {}
+    if partial:
+        details = dict(frappe.get_all("Workday Archive", filters={"name": ["in", partial]},
+            fields=["name", "detail"], as_list=True))
+
+    archived_totals = []
+    for archive in archives:
+        if archive.name in details:
+            workdays = [w for w in decompress_detail(details[archive.name]) if from_date <= getdate(w["log_date"]) <= to_date]
+            archive.update(get_totals_of_workdays(workdays))
+        archived_totals.append(archive)
+
+    return archived_totals
+
+
+def get_totals_of_workdays(workdays):
+    '''the columns of WORKDAY_TOTALS_COLUMNS for a list of Workday values'''
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    for workday in workdays:
+        workday = frappe._dict(workday)
+        incomplete = workday.anomaly_status in INCOMPLETE_ANOMALIES
+        total_target_seconds = flt(workday.total_target_seconds)
+        actual_working_seconds = flt(workday.actual_working_hours) * 60 * 60
+        actual_diff = actual_working_seconds if actual_working_seconds < 0 else actual_working_seconds - total_target_seconds
+
+        totals["workdays"] += 1
+        totals["days_present"] += workday.status in ("Present", "Work From Home")
+        totals["days_half_day"] += workday.status == "Half Day"
+        totals["days_absent"] += workday.status == "Absent"
+        totals["days_on_leave"] += workday.status == "On Leave"
+        totals["leave_zeroed_days"] += workday.status == "On Leave" and total_target_seconds == 0
+        totals["incomplete_days"] += incomplete
+        totals["total_target_seconds"] += total_target_seconds
+        if incomplete:
+            totals["incomplete_target_seconds"] += total_target_seconds
+            continue
+        totals["total_work_seconds"] += max(flt(workday.total_work_seconds), 0)
+        totals["total_break_seconds"] += max(flt(workday.total_break_seconds), 0)
+        totals["actual_working_seconds"] += actual_working_seconds
+        totals["actual_diff_seconds"] += actual_diff
+        totals["overtime_seconds"] += max(actual_diff, 0)
+
+    return totals
@@ -0,0 +1,26 @@
+frappe.provide("frappe.dashboards.chart_sources");
+
+frappe.dashboards.chart_sources["Department Attendance Heatmap"] = {
+	method: "hr_addon.hr_addon.dashboard_chart_source.department_attendance_heatmap.department_attendance_heatmap.get",
+	filters: [
+		{
+			fieldname: "company",
+			label: __("Company"),
+			fieldtype: "Link",
+			options: "Company",
+		},
+		{
+			fieldname: "department",
+			label: __("Department"),
+			fieldtype: "Link",
+			options: "Department",
+		},
+		{
+			fieldname: "value",
+			label: __("Value"),
+			fieldtype: "Select",
+			options: ["Actual Hours", "Target Hours", "Incomplete Days", "On Leave"],
+			default: "Actual Hours",
+		},
+	],
+};
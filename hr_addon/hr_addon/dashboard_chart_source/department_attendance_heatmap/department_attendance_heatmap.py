@@ -0,0 +1,12 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+
+from hr_addon.hr_addon.api.attendance_dashboard import get_heatmap
+
+
+@frappe.whitelist()
+def get(chart_name=None, chart=None, no_cache=None, filters=None, from_date=None, to_date=None,
+		timespan=None, time_interval=None, heatmap_year=None):
+	return get_heatmap(filters, heatmap_year)
@@ -0,0 +1,104 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, getdate, now_datetime, today
+from frappe.utils.data import date_diff
+
+from hr_addon.hr_addon.api.job_queue import BACKFILL, submit_job
+from hr_addon.hr_addon.api.metrics import timed
+from hr_addon.hr_addon.api.workday_totals import TOTAL_FIELDS, get_workday_totals_columns
+
+SUMMARY_FIELDS = ["name", "company", "department", "date", "employees"] + list(TOTAL_FIELDS) + [
+	"creation", "modified", "owner", "modified_by", "docstatus"]
+
+# dates whose rows have to be rebuilt, see refresh_department_attendance_summary
+DIRTY_DATES_KEY = "hr_addon:department_attendance_summary_dirty"
+
+# days of an employee's Workdays marked dirty when the employee changes department
+DEPARTMENT_CHANGE_DAYS = 92
+
+
+class DepartmentAttendanceSummary(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Department Attendance Summary", ["date", "company", "department"])
+
+
+def rebuild_department_attendance_summary(dates):
+	'''recompute all rows of the dates with one grouped query, by the current department of each employee'''
+	dates = sorted({getdate(d) for d in dates})
+	if not dates:
+		return
+
+	rows = frappe.db.sql("""
+		SELECT company, department, log_date, COUNT(DISTINCT employee) AS employees, {columns}
+		FROM (
+			SELECT w.*, e.department FROM `tabWorkday` w
+			LEFT JOIN `tabEmployee` e ON e.name = w.employee
+			WHERE w.log_date IN %(dates)s AND w.docstatus < 2
+		) workday
+		GROUP BY company, department, log_date
+	""".format(columns=get_workday_totals_columns()), {"dates": tuple(dates)}, as_dict=1)
+
+	now, user = now_datetime(), frappe.session.user
+	values = [
+		(frappe.generate_hash(length=12), row.company, row.department, row.log_date, row.employees)
+		+ tuple(row.get(field) or 0 for field in TOTAL_FIELDS)
+		+ (now, now, user, user, 0)
+		for row in rows
+	]
+
+	frappe.db.sql("DELETE FROM `tabDepartment Attendance Summary` WHERE date IN %(dates)s", {"dates": tuple(dates)})
+	frappe.db.bulk_insert("Department Attendance Summary", SUMMARY_FIELDS, values)
+
+
+@frappe.whitelist()
+def rebuild_department_attendance_summary_for_range(from_date, to_date):
+	frappe.only_for("System Manager")
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	submit_job(
+		"hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary.rebuild_department_attendance_summary",
+		{"dates": [add_days(from_date, i) for i in range(date_diff(to_date, from_date) + 1)]},
+		job_class=BACKFILL,
+	)
+
+
+def mark_dates_dirty(dates):
+	if dates:
+		frappe.cache().sadd(DIRTY_DATES_KEY, *[str(getdate(d)) for d in dates])
+
+
+@timed("refresh_department_attendance_summary")
+def refresh_department_attendance_summary():
+	'''scheduled: rebuild the rows of the dates whose Workdays changed since the last run'''
+	cache = frappe.cache()
+	dates = [frappe.safe_decode(d) for d in cache.smembers(DIRTY_DATES_KEY)]
+	if not dates:
+		return
+
+	# removed before the rebuild, a Workday saved meanwhile marks its date again
+	cache.srem(DIRTY_DATES_KEY, *dates)
+	try:
+		rebuild_department_attendance_summary(dates)
+		frappe.db.commit()
+	except Exception:
+		frappe.db.rollback()
+		mark_dates_dirty(dates)
+		raise
+
+
+# ----------------------------------------------------------------------
+# doc_events
+# ----------------------------------------------------------------------
+def on_employee_change(doc, method=None):
+	if not doc.has_value_changed("department"):
+		return
+
+	mark_dates_dirty(frappe.get_all("Workday", filters={
+		"employee": doc.name,
+		"log_date": [">=", add_days(today(), -DEPARTMENT_CHANGE_DAYS)],
+	}, pluck="log_date"))
@@ -5,6 +5,13 @@ import frappe, os
 from frappe.model.document import Document
 
 from hr_addon.hr_addon.doctype.workday.workday import get_unmarked_range, bulk_process_workdays_background
+from hr_addon.hr_addon.api.checkin_storage import enqueue_migration_to_compact_storage
+from hr_addon.hr_addon.api.metrics import timed
+from hr_addon.hr_addon.api.workday_form import invalidate_workday_form_data
+
+# settings the memoized Workday form data is computed with
+WORKDAY_FORM_SETTINGS = ("workday_break_calculation_mechanism", "swap_hours_worked_and_actual_working_hours",
+	"workday_engine", "checkin_pairing_mode", "day_boundary_hour", "max_shift_hours")
 
 class HRAddonSettings(Document):
 	def before_save(self):
@@ -19,6 +26,12 @@ class HRAddonSettings(Document):
 		if os.path.exists("{}/public/files/Urlaubskalender.ics".format(frappe.utils.get_site_path())):
 			os.remove("{}/public/files/Urlaubskalender.ics".format(frappe.utils.get_site_path()))
 
+	def on_update(self):
+		if self.compact_checkin_storage and self.has_value_changed("compact_checkin_storage"):
+			enqueue_migration_to_compact_storage()
+		if any(self.has_value_changed(f) for f in WORKDAY_FORM_SETTINGS):
+			invalidate_workday_form_data()
+
 
 @frappe.whitelist()
 def download_ics_file():
@@ -39,6 +52,7 @@ def download_ics_file():
 
 
 @frappe.whitelist()
+@timed("generate_workdays_scheduled_job")
 def generate_workdays_scheduled_job():
     try:
         hr_addon_settings = frappe.get_doc("HR Addon Settings")
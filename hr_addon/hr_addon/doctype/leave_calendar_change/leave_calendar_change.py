@@ -0,0 +1,37 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, now_datetime, today
+
+from hr_addon.hr_addon.api.export_calendar import get_leave_uid
+from hr_addon.hr_addon.api.metrics import timed
+
+# the name is an auto increment and serves as the sync token of the leave calendar
+LEAVE_CALENDAR_CHANGE_FIELDS = ["leave_application", "uid", "employee", "status",
+	"creation", "modified", "owner", "modified_by", "docstatus"]
+
+# consumers with an older sync token get the full calendar
+RETENTION_DAYS = 90
+
+
+class LeaveCalendarChange(Document):
+	pass
+
+
+def log_leave_calendar_change(doc, method=None):
+	'''doc_event of Leave Application, written in the transaction of the change'''
+	now, user = now_datetime(), frappe.session.user
+	frappe.db.bulk_insert("Leave Calendar Change", LEAVE_CALENDAR_CHANGE_FIELDS, [
+		(doc.name, get_leave_uid(doc.name), doc.employee, doc.status, now, now, user, user, 0)
+	])
+
+
+@timed("compact_leave_calendar_changes")
+def compact_leave_calendar_changes():
+	'''scheduled: the log only has to cover the sync tokens of active consumers. The last row is kept,
+	get_leave_calendar_changes detects expired tokens by the oldest row'''
+	last = frappe.db.sql("SELECT MAX(name) FROM `tabLeave Calendar Change`")[0][0]
+	frappe.db.sql("DELETE FROM `tabLeave Calendar Change` WHERE creation < %(cutoff)s AND name < %(last)s",
+		{"cutoff": add_days(today(), -RETENTION_DAYS), "last": last or 0})
@@ -0,0 +1,183 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, cstr, flt, getdate, now_datetime
+from frappe.utils.data import date_diff
+
+from hr_addon.hr_addon.api.utils import (
+	get_default_work_hour_from_range,
+	get_holidays_for_range,
+	get_leave_days_for_range,
+	get_weekly_working_hours_for_range,
+)
+
+CALENDAR_FIELDS = ["name", "employee", "date", "day_type", "is_holiday", "weekly_working_hours",
+	"scheduled_seconds", "target_seconds", "expected_break_seconds",
+	"creation", "modified", "owner", "modified_by", "docstatus"]
+
+# day without Weekly Working Hours, stored so that the day counts as built
+NO_SCHEDULE = "No Schedule"
+
+REBUILD_LOCK_KEY = "hr_addon:target_hours_calendar_rebuild:{0}"
+REBUILD_LOCK_SECONDS = 5 * 60
+
+
+class TargetHoursCalendar(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Target Hours Calendar", ["employee", "date"])
+
+
+def get_target_hours_calendar(employee, from_date, to_date):
+	'''{date: calendar row} for one employee with a single indexed range read, missing days are built first.
+	Days without Weekly Working Hours are left out, the caller falls back to the schedule queries for them'''
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	rows = read_target_hours_calendar(employee, from_date, to_date)
+	if len(rows) < date_diff(to_date, from_date) + 1 and build_missing_days(employee, from_date, to_date):
+		rows = read_target_hours_calendar(employee, from_date, to_date)
+
+	return {date: row for date, row in rows.items() if row.day_type != NO_SCHEDULE}
+
+
+def build_missing_days(employee, from_date, to_date):
+	'''rebuild the range under a lock per employee, a concurrent caller does not wait and uses the fallback'''
+	cache = frappe.cache()
+	lock_key = cache.make_key(REBUILD_LOCK_KEY.format(employee))
+	if not cache.set(lock_key, 1, ex=REBUILD_LOCK_SECONDS, nx=True):
+		return False
+
+	try:
+		rebuild_target_hours_calendar([employee], from_date, to_date)
+	finally:
+		cache.delete(lock_key)
+	return True
+
+
+def read_target_hours_calendar(employee, from_date, to_date):
+	rows = frappe.db.sql("""
+		SELECT date, day_type, is_holiday, weekly_working_hours, scheduled_seconds, target_seconds, expected_break_seconds
+		FROM `tabTarget Hours Calendar`
+		WHERE employee = %s AND date BETWEEN %s AND %s
+	""", (employee, from_date, to_date), as_dict=1)
+
+	return {getdate(row.date): row for row in rows}
+
+
+def rebuild_target_hours_calendar(employees, from_date, to_date):
+	'''recompute the calendar rows of the employees for the range, days without Weekly Working Hours get a No Schedule row'''
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	if not employees or from_date > to_date:
+		return
+
+	weekly_working_hours = get_weekly_working_hours_for_range(employees, from_date, to_date)
+	holidays = get_holidays_for_range(employees, from_date, to_date)
+	leave_days = get_leave_days_for_range(employees, from_date, to_date)
+
+	now, user = now_datetime(), frappe.session.user
+	values = []
+	for employee in employees:
+		for i in range(date_diff(to_date, from_date) + 1):
+			adate = add_days(from_date, i)
+			work_hour = get_default_work_hour_from_range(weekly_working_hours, employee, adate)
+			if not work_hour:
+				values.append((frappe.generate_hash(length=12), employee, adate, NO_SCHEDULE, 0, None,
+					0, 0, 0, now, now, user, user, 0))
+				continue
+
+			row = get_calendar_day(work_hour, adate in holidays.get(employee, ()), leave_days.get((employee, adate)))
+			values.append((frappe.generate_hash(length=12), employee, adate, row.day_type, row.is_holiday, work_hour.name,
+				row.scheduled_seconds, row.target_seconds, row.expected_break_seconds, now, now, user, user, 0))
+
+	frappe.db.sql("""
+		DELETE FROM `tabTarget Hours Calendar`
+		WHERE employee IN %(employees)s AND date BETWEEN %(from_date)s AND %(to_date)s
+	""", {"employees": tuple(employees), "from_date": from_date, "to_date": to_date})
+	frappe.db.bulk_insert("Target Hours Calendar", CALENDAR_FIELDS, values)
+
+
+def get_calendar_day(work_hour, is_holiday, leave_kind=None):
+	'''target of a day with the holiday rule of get_workday and the leave rules of Workday.validate.
+	expected_break_seconds stays the scheduled break, get_workday needs it on every day type'''
+	scheduled_seconds = flt(work_hour.hours) * 60 * 60
+	row = frappe._dict({
+		"day_type": "Workday",
+		"is_holiday": cint(is_holiday),
+		"scheduled_seconds": scheduled_seconds,
+		"target_seconds": scheduled_seconds,
+		"expected_break_seconds": cint(work_hour.break_minutes) * 60,
+	})
+
+	if is_holiday:
+		row.day_type = "Holiday"
+		if cint(work_hour.set_target_hours_to_zero_when_date_is_holiday):
+			row.target_seconds = 0
+
+	if leave_kind == "On Leave":
+		row.update({"day_type": "Leave", "target_seconds": 0})
+	elif leave_kind == "Comp Off":
+		row.day_type = "Comp Off"
+
+	return row
+
+
+def enqueue_rebuild(employees, from_date, to_date):
+	if not employees or not from_date or not to_date:
+		return
+
+	frappe.enqueue(
+		"hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar.rebuild_target_hours_calendar",
+		queue="long",
+		enqueue_after_commit=True,
+		employees=list(employees),
+		from_date=getdate(from_date),
+		to_date=getdate(to_date),
+	)
+
+
+def get_calendar_range(employee):
+	'''dates already materialized for an employee'''
+	return frappe.db.sql("""
+		SELECT MIN(date), MAX(date) FROM `tabTarget Hours Calendar` WHERE employee = %s
+	""", employee)[0]
+
+
+# ----------------------------------------------------------------------
+# doc_events, every input of the calendar rebuilds only the affected rows
+# ----------------------------------------------------------------------
+def on_weekly_working_hours_change(doc, method=None):
+	enqueue_rebuild([doc.employee], doc.valid_from, doc.valid_to)
+
+
+def on_working_hours_template_change(doc, method=None):
+	'''the Weekly Working Hours of the template, one rebuild per validity period'''
+	periods = {}
+	for w in frappe.get_all("Weekly Working Hours", filters={"working_hours_template": doc.name, "docstatus": 1},
+			fields=["employee", "valid_from", "valid_to"]):
+		periods.setdefault((w.valid_from, w.valid_to), []).append(w.employee)
+
+	for (from_date, to_date), employees in periods.items():
+		enqueue_rebuild(employees, from_date, to_date)
+
+
+def on_leave_application_change(doc, method=None):
+	'''the dates before and after the change, draft Freizeitausgleich counts too. Also on_trash'''
+	ranges = {(d.employee, cstr(d.from_date), cstr(d.to_date)) for d in (doc, doc.get_doc_before_save()) if d}
+	for employee, from_date, to_date in ranges:
+		enqueue_rebuild([employee], from_date, to_date)
+
+
+def on_holiday_list_change(doc, method=None):
+	employees = frappe.get_all("Employee", filters={"holiday_list": doc.name}, pluck="name")
+	enqueue_rebuild(employees, doc.from_date, doc.to_date)
+
+
+def on_employee_change(doc, method=None):
+	if not doc.has_value_changed("holiday_list"):
+		return
+
+	from_date, to_date = get_calendar_range(doc.name)
+	enqueue_rebuild([doc.name], from_date, to_date)
@@ -0,0 +1,8 @@
+# Copyright (c) 2026, Jide Olayinka and Contributors
+# See license.txt
+
+# import frappe
+import unittest
+
+class TestTargetHoursCalendar(unittest.TestCase):
+	pass
@@ -58,4 +58,35 @@ frappe.ui.form.on('Daily Hours Detail',{
 	hours_remove: function(frm,cdt,cdn){
 		frm.get_total_hours(frm);
 	}
-});
\ No newline at end of file
+});
+frappe.ui.form.on('Weekly Working Hours', {
+	refresh: function(frm) {
+		if (frm.doc.docstatus !== 1) {
+			return;
+		}
+		// a switch applies from its date on, the days before keep their schedule
+		frm.add_custom_button(__("Switch Template"), function() {
+			frappe.prompt([
+				{fieldname: "working_hours_template", fieldtype: "Link", options: "Working Hours Template", label: __("Working Hours Template"), reqd: 1},
+				{fieldname: "from_date", fieldtype: "Date", label: __("From Date"), default: frappe.datetime.get_today(), reqd: 1},
+			], function(values) {
+				frappe.call({
+					method: "hr_addon.hr_addon.doctype.weekly_working_hours.weekly_working_hours.switch_working_hours_template",
+					args: {
+						weekly_working_hours: frm.doc.name,
+						working_hours_template: values.working_hours_template,
+						from_date: values.from_date,
+					},
+					freeze: true,
+					callback: function(r) {
+						if (r.message && r.message !== frm.doc.name) {
+							frappe.set_route("Form", "Weekly Working Hours", r.message);
+						} else {
+							frm.reload_doc();
+						}
+					}
+				});
+			}, __("Switch Working Hours Template"), __("Switch"));
+		});
+	}
+});
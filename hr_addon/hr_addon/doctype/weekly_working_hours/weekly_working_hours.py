@@ -3,9 +3,11 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import getdate
+from frappe.utils import add_days, getdate
 from frappe.model.naming import make_autoname
 from frappe import _
+from hr_addon.hr_addon.api.workday_form import on_employee_data_change
+from hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar import on_weekly_working_hours_change
 
 class WeeklyWorkingHours(Document):
 	def autoname(self):
@@ -18,6 +20,25 @@ class WeeklyWorkingHours(Document):
 	def validate(self):
 		self.validate_if_employee_is_active()
 		self.validate_overlapping_records_in_specific_interval()
+		self.validate_hours()
+
+	def on_submit(self):
+		on_weekly_working_hours_change(self)
+
+	def on_cancel(self):
+		on_weekly_working_hours_change(self)
+
+	def validate_hours(self):
+		if not self.hours and not self.working_hours_template:
+			frappe.throw(_("Please set the Hours or a Working Hours Template"))
+
+	def get_days(self):
+		'''{day: Daily Hours Detail}, the days of the template with the days of this document on top'''
+		days = {}
+		if self.working_hours_template:
+			days.update({d.day: d for d in frappe.get_cached_doc("Working Hours Template", self.working_hours_template).hours})
+		days.update({d.day: d for d in self.hours})
+		return days
 
 	def validate_if_employee_is_active(self):
 		if self.employee and frappe.get_value('Employee', self.employee, 'status') != "Active":
@@ -55,3 +76,45 @@ class WeeklyWorkingHours(Document):
 		if overlapping_records:
 			overlapping_records = "<br> ".join([frappe.get_desk_link("Weekly Working Hours", d.name) for d in overlapping_records])
 			frappe.throw("Following Weekly Working Hours record already exists for {0} for the specified date range:<br> {1}".format(frappe.get_desk_link("Employee", self.employee), overlapping_records))
+
+
+@frappe.whitelist()
+def switch_working_hours_template(weekly_working_hours, working_hours_template, from_date):
+	'''Use another Working Hours Template from from_date on, the days before keep their schedule.
+	Returns the name of the Weekly Working Hours that covers from_date.'''
+	doc = frappe.get_doc("Weekly Working Hours", weekly_working_hours)
+	doc.check_permission("submit")
+	if doc.docstatus != 1:
+		frappe.throw(_("Only submitted Weekly Working Hours can be switched"))
+
+	return split_weekly_working_hours(doc, getdate(from_date), working_hours_template).name
+
+
+def split_weekly_working_hours(doc, from_date, working_hours_template, history_template=None):
+	'''doc ends the day before from_date and a copy with working_hours_template covers from_date to its end.
+	history_template, if set, replaces the template of the part before from_date'''
+	valid_from, valid_to = getdate(doc.valid_from), getdate(doc.valid_to)
+	if from_date <= valid_from:
+		# nothing of doc lies before from_date
+		doc.db_set("working_hours_template", working_hours_template)
+		on_weekly_working_hours_change(doc)
+		on_employee_data_change(doc)
+		return doc
+
+	if history_template:
+		doc.db_set("working_hours_template", history_template)
+	if from_date > valid_to:
+		return doc
+
+	doc.db_set("valid_to", add_days(from_date, -1))
+	new_doc = frappe.copy_doc(doc)
+	new_doc.update({
+		"valid_from": from_date,
+		"valid_to": valid_to,
+		"working_hours_template": working_hours_template,
+		"amended_from": None,
+	})
+	new_doc.flags.ignore_permissions = True
+	new_doc.insert()
+	new_doc.submit()
+	return new_doc
@@ -5,6 +5,12 @@ frappe.ui.form.on("Workday", {
   refresh: function (frm) {
     set_color_red(frm);
   },
+  validate: function (frm) {
+    // the table of a compact Workday is loaded from checkin_refs, removed rows have to clear them
+    if (!(frm.doc.employee_checkins || []).length) {
+      frm.doc.checkin_refs = "";
+    }
+  },
   setup: function (frm) {
     frm.set_query("attendance", function () {
       return {
@@ -38,20 +44,13 @@ frappe.ui.form.on("Workday", {
   },
   log_date: function (frm) {
     if (frm.doc.employee && frm.doc.log_date) {
-      frappe.call({
-        method: "hr_addon.hr_addon.api.utils.date_is_in_holiday_list",
-        args: {
-          employee: frm.doc.employee,
-          date: frm.doc.log_date,
-        },
-        callback: function (r) {
-          if (r.message == true) {
-            frappe.msgprint("Given Date is Holiday");
-            unset_fields(frm);
-          } else {
-            get_hours(frm);
-          }
-        },
+      get_form_data(frm).then((day) => {
+        if (day && day.is_holiday) {
+          frappe.msgprint("Given Date is Holiday");
+          unset_fields(frm);
+        } else {
+          set_hours(frm, day && day.workday);
+        }
       });
     }
   },
@@ -70,50 +69,71 @@ frappe.ui.form.on("Workday", {
   },
 });
 
+// days before and after the selected date fetched with it, so that flipping through dates needs no call
+const PREFETCH_DAYS_AROUND = 3;
+
+var get_form_data = function (frm) {
+  let employee = frm.doc.employee;
+  let date = frm.doc.log_date;
+  frm.workday_form_data = frm.workday_form_data || {};
+  let key = employee + "|" + date;
+  if (frm.workday_form_data[key]) {
+    return Promise.resolve(frm.workday_form_data[key]);
+  }
+
+  return frappe
+    .call({
+      method: "hr_addon.hr_addon.api.workday_form.get_workday_form_data",
+      args: { employee: employee, date: date, days_around: PREFETCH_DAYS_AROUND },
+    })
+    .then((r) => {
+      // prefetched days are kept for the lifetime of the form only, the server memo is invalidated on changes
+      frm.workday_form_data = {};
+      $.each(r.message || {}, function (day_date, day) {
+        frm.workday_form_data[employee + "|" + day_date] = day;
+      });
+      return frm.workday_form_data[key];
+    });
+};
+
 var get_hours = function (frm) {
-  let aemployee = frm.doc.employee;
-  let adate = frm.doc.log_date;
-  if (aemployee && adate) {
-    frappe
-      .call({
-        method: "hr_addon.hr_addon.api.utils.get_actual_employee_log",
-        args: { aemployee: aemployee, adate: adate },
-      })
-      .done((r) => {
-        if (r.message && Object.keys(r.message).length > 0) {
-          frm.doc.employee_checkins = [];
-          let alog = r.message;
+  if (frm.doc.employee && frm.doc.log_date) {
+    get_form_data(frm).then((day) => set_hours(frm, day && day.workday));
+  }
+};
 
-          frm.set_value("hours_worked", alog.hours_worked);
-          frm.set_value("break_hours", alog.break_hours);
-          frm.set_value("total_work_seconds", alog.total_work_seconds);
-          frm.set_value("total_break_seconds", alog.total_break_seconds);
-          frm.set_value("target_hours", alog.target_hours);
-          frm.set_value("expected_break_hours", alog.expected_break_hours);
-          frm.set_value("total_target_seconds", alog.total_target_seconds);
-          frm.set_value("manual_workday",alog.manual_workday);
-          frm.set_value("actual_working_hours", alog.actual_working_hours);
-          let employee_checkins = alog.employee_checkins;
-          if (employee_checkins.length > 0) {
-            frm.set_value("first_checkin", employee_checkins[0].time);
-            frm.set_value(
-              "last_checkout",
-              employee_checkins[employee_checkins.length - 1].time
-            );
-            $.each(employee_checkins, function (i, e) {
-              let nw_checkins = frm.add_child("employee_checkins");
-              nw_checkins.employee_checkin = e.name;
-              nw_checkins.log_type = e.log_type;
-              nw_checkins.log_time = e.time;
-              nw_checkins.skip_auto_attendance = e.skip_auto_attendance;
-              refresh_field("employee_checkins");
-              set_color_red(frm);
-            });
-          }
-        } else {
-          unset_fields(frm);
-        }
+var set_hours = function (frm, alog) {
+  if (alog && Object.keys(alog).length > 0) {
+    frm.doc.employee_checkins = [];
+
+    frm.set_value("hours_worked", alog.hours_worked);
+    frm.set_value("break_hours", alog.break_hours);
+    frm.set_value("total_work_seconds", alog.total_work_seconds);
+    frm.set_value("total_break_seconds", alog.total_break_seconds);
+    frm.set_value("target_hours", alog.target_hours);
+    frm.set_value("expected_break_hours", alog.expected_break_hours);
+    frm.set_value("total_target_seconds", alog.total_target_seconds);
+    frm.set_value("manual_workday",alog.manual_workday);
+    frm.set_value("actual_working_hours", alog.actual_working_hours);
+    let employee_checkins = alog.employee_checkins;
+    if (employee_checkins.length > 0) {
+      frm.set_value("first_checkin", employee_checkins[0].time);
+      frm.set_value(
+        "last_checkout",
+        employee_checkins[employee_checkins.length - 1].time
+      );
+      $.each(employee_checkins, function (i, e) {
+        let nw_checkins = frm.add_child("employee_checkins");
+        nw_checkins.employee_checkin = e.name;
+        nw_checkins.log_type = e.log_type;
+        nw_checkins.log_time = e.time;
+        nw_checkins.skip_auto_attendance = e.skip_auto_attendance;
+        refresh_field("employee_checkins");
+        set_color_red(frm);
       });
+    }
+  } else {
+    unset_fields(frm);
   }
 };
 
@@ -8,15 +8,57 @@ from frappe.utils import cint, get_datetime, getdate ,add_days,formatdate,flt
 from frappe.utils.data import date_diff
 import traceback
 from hr_addon.hr_addon.api.utils import get_actual_employee_log_for_bulk_process
+from hr_addon.hr_addon.api.checkin_pairing import get_paired_checkins_for_range
+from hr_addon.hr_addon.api.job_queue import INTERACTIVE, SCHEDULED, split_dates_by_job_class, submit_job
+from hr_addon.hr_addon.api.metrics import count_queries, inc, observe, timer
+from hr_addon.hr_addon.api.report_cache import evict_cached_results
+from hr_addon.hr_addon.api.replica import mark_recent_write, read_from_replica, replica
+from hr_addon.hr_addon.api.workday_fingerprint import get_fingerprint_inputs, get_input_fingerprint
+from hr_addon.hr_addon.api.time_account import invalidate_time_account
+from hr_addon.hr_addon.api.workday_sql import WORKDAY_ENGINE_SQL, get_checkin_totals_for_range, get_checkin_totals_of_day, get_workday_engine
+from hr_addon.hr_addon.api.checkin_storage import is_compact_storage, load_checkin_rows, pack_checkin_rows, set_workday_checkins
+from hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary import mark_dates_dirty
+from hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar import get_target_hours_calendar
+from hr_addon.hr_addon.doctype.workday_anomaly.workday_anomaly import delete_workday_anomalies, set_anomaly_status, sync_workday_anomaly
+from hr_addon.hr_addon.doctype.workday_change_log.workday_change_log import log_workday_change
+from hr_addon.hr_addon.doctype.workday_period_closing.workday_period_closing import is_period_closed, validate_period_is_open
 
 
 class Workday(Document):
+    def onload(self):
+        load_checkin_rows(self)
+
     def validate(self):
+        validate_period_is_open(self.company, self.log_date)
+        if is_compact_storage():
+            pack_checkin_rows(self)
+        elif self.employee_checkins:
+            self.checkin_refs = ""
         self.date_is_in_comp_off()
         self.validate_duplicate_workday()
         self.set_status_for_leave_application()
+        set_anomaly_status(self)
+        # only the workday pipeline knows the inputs, edits elsewhere make the next recomputation run
+        self.input_fingerprint = self.flags.input_fingerprint or ""
         # self.set_manual_workday()
 
+    def on_update(self):
+        sync_workday_anomaly(self)
+        mark_recent_write(self.employee)
+        evict_cached_results("Work Hour Report", self.employee, [self.log_date])
+        mark_dates_dirty([self.log_date])
+        log_workday_change(self, "Insert" if self.flags.in_insert else "Update")
+        invalidate_time_account(self.employee)
+
+    def on_trash(self):
+        validate_period_is_open(self.company, self.log_date)
+        delete_workday_anomalies([self.name])
+        mark_recent_write(self.employee)
+        evict_cached_results("Work Hour Report", self.employee, [self.log_date])
+        mark_dates_dirty([self.log_date])
+        log_workday_change(self, "Delete")
+        invalidate_time_account(self.employee)
+
     def set_status_for_leave_application(self):
         leave_application = frappe.db.exists(
         "Leave Application", {
@@ -82,16 +124,37 @@ class Workday(Document):
     #         self.expected_break_hours = 0.0
 
 
-def bulk_process_workdays_background(data,flag):
-    '''bulk workday processing'''
-    frappe.logger("Creating Workday").error("bulk_process_workdays_background")
+def on_doctype_update():
+    # keyset pagination of api/workday_export.py
+    frappe.db.add_index("Workday", ["modified", "name"])
+
+
+def bulk_process_workdays_background(data,flag,job_class=SCHEDULED):
+    '''bulk workday processing, recent days are queued ahead of the sweep and historical days behind it'''
+    data = frappe._dict(data)
+
     frappe.msgprint(_("Bulk operation is enqueued in background."), alert=True)
-    frappe.enqueue(
-        'hr_addon.hr_addon.doctype.workday.workday.bulk_process_workdays',
-        queue='long',
-        data=data,
-        flag=flag
-    )
+    company = frappe.get_value('Employee', data.employee, 'company') if data.employee else None
+    for day_class, unmarked_days in split_dates_by_job_class(data.unmarked_days or [], job_class).items():
+        submit_job(
+            'hr_addon.hr_addon.doctype.workday.workday.bulk_process_workdays',
+            {"data": dict(data, unmarked_days=unmarked_days), "flag": flag},
+            job_class=day_class,
+            company=company,
+        )
+
+
+@frappe.whitelist()
+def enqueue_workday_creation(data):
+    '''create the Workdays of the list view dialog through the job queue'''
+    data = frappe._dict(frappe.parse_json(data))
+    if data.employee and frappe.get_value('Employee', data.employee, 'status') != "Active":
+        frappe.throw(_("{0} is not active").format(frappe.get_desk_link('Employee', data.employee)))
+    if not data.unmarked_days:
+        frappe.throw(_("Please select a date"))
+
+    bulk_process_workdays_background(data, "Create workday", job_class=INTERACTIVE)
+    return 1
 
 
 @frappe.whitelist()
@@ -104,78 +167,11 @@ def bulk_process_workdays(data,flag):
     if data.employee and frappe.get_value('Employee', data.employee, 'status') != "Active":
         frappe.throw(_("{0} is not active").format(frappe.get_desk_link('Employee', data.employee)))
 
-    company = frappe.get_value('Employee', data.employee, 'company')
     if not data.unmarked_days:
         frappe.throw(_("Please select a date"))
         return
 
-    missing_dates = []
-    
-    for date in data.unmarked_days:
-        try:
-            single = get_actual_employee_log_for_bulk_process(data.employee, get_datetime(date))
-            
-            
-            # Check if the workday already exists
-            existing_workday = frappe.get_value('Workday', {
-                'employee': data.employee,
-                'log_date': get_datetime(date)
-            })
-            
-            if existing_workday:
-                continue  # Skip creating if it already exists
-
-            doc_dict = {
-                    "doctype": 'Workday',
-                    "employee": data.employee,
-                    "log_date": get_datetime(date),
-                    "company": company,
-                    "attendance": single.get("attendance"),
-                    "hours_worked": single.get("hours_worked"),
-                    "break_hours": single.get("break_hours"),
-                    "target_hours": single.get("target_hours"),
-                    "total_work_seconds": single.get("total_work_seconds"),
-                    "expected_break_hours": single.get("expected_break_hours"),
-                    "total_break_seconds": single.get("total_break_seconds"),
-                    "total_target_seconds": single.get("total_target_seconds"),
-                    "actual_working_hours": single.get("actual_working_hours"),
-                    "manual_workday": single.get("manual_workday")
-                }
-
-            workday = frappe.get_doc(doc_dict)
-
-            if (workday.status == 'Half Day'):
-                workday.target_hours = workday.target_hours / 2
-            elif (workday.status == 'On Leave'):
-                workday.target_hours = 0
-
-            employee_checkins = single.get("employee_checkins")
-            if employee_checkins:
-                workday.first_checkin = employee_checkins[0].time
-                workday.last_checkout = employee_checkins[-1].time
-
-                for employee_checkin in employee_checkins:
-                    workday.append("employee_checkins", {
-                        "employee_checkin": employee_checkin.get("name"),   
-                        "log_type": employee_checkin.get("log_type"),   
-                        "log_time": employee_checkin.get("time"),   
-                        "skip_auto_attendance": employee_checkin.get("skip_auto_attendance"),   
-                    })
-            
-            if len(employee_checkins) % 2 != 0:
-                formatted_date = frappe.utils.formatdate(workday.log_date)
-                #frappe.msgprint("CheckIns must be in pairs for the given date: " + formatted_date)
-            if flag == "Create workday":
-                frappe.logger("Creating Workday").error(flag)
-                workday.insert()
-                frappe.logger("Creating Workday").error(workday)
-
-            missing_dates.append(get_datetime(date))
-
-        except Exception:
-            message = _("Something went wrong in Workday Creation: {0}".format(traceback.format_exc()))
-            frappe.msgprint(message)
-            frappe.log_error("bulk_process_workdays() error", message)
+    missing_dates, failed_dates = process_workdays(data.employee, data.unmarked_days, flag)
     formatted_missing_dates = []
     for missing_date in missing_dates:
         formatted_m_date = formatdate(missing_date,'dd.MM.yyyy')
@@ -184,9 +180,182 @@ def bulk_process_workdays(data,flag):
     return {
         "message": 1,
         "missing_dates": formatted_missing_dates,
+        "failed_dates": [formatdate(d, 'dd.MM.yyyy') for d in failed_dates],
         "flag":flag
     }
 
+
+def process_workdays(employee, unmarked_days, flag):
+    '''create the Workdays of the given days, returns (processed dates, failed dates).
+    A failed day is logged and does not stop the others'''
+    company = frappe.get_value('Employee', employee, 'company')
+    # dates may come as '2024-1-5', they are compared as dates, not as strings
+    dates = sorted({getdate(d) for d in unmarked_days})
+    missing_dates, failed_dates = [], []
+    with timer("hr_addon_stage_seconds", stage="prefetch"):
+        target_hours_calendar = get_target_hours_calendar(employee, dates[0], dates[-1])
+        checkin_totals = None
+        with replica(employee):
+            paired_checkins = get_paired_checkins_for_range(employee, dates[0], dates[-1])
+            if paired_checkins is None and get_workday_engine() == WORKDAY_ENGINE_SQL:
+                checkin_totals = get_checkin_totals_for_range([employee], dates[0], dates[-1])
+        fingerprint_inputs = get_fingerprint_inputs(employee, dates[0], dates[-1])
+
+    for date in dates:
+        if is_period_closed(company, date):
+            continue
+        try:
+            with count_queries() as counter:
+                with timer("hr_addon_stage_seconds", stage="compute"):
+                    single = get_actual_employee_log_for_bulk_process(employee, get_datetime(date),
+                        target_hours=target_hours_calendar.get(date),
+                        paired_checkins=paired_checkins[date] if paired_checkins is not None else None,
+                        checkin_totals=get_checkin_totals_of_day(checkin_totals, employee, date) if checkin_totals is not None else None,
+                        attendance=fingerprint_inputs.attendance.get(date, ""))
+                
+                
+                # Check if the workday already exists
+                existing_workday = frappe.get_value('Workday', {
+                    'employee': employee,
+                    'log_date': get_datetime(date)
+                })
+                
+                if existing_workday:
+                    continue  # Skip creating if it already exists
+
+                workday = frappe.get_doc({
+                        "doctype": 'Workday',
+                        "employee": employee,
+                        "log_date": get_datetime(date),
+                        "company": company,
+                    })
+                set_workday_values(workday, single)
+                employee_checkins = single.get("employee_checkins")
+                workday.flags.input_fingerprint = get_input_fingerprint(fingerprint_inputs, employee, date,
+                    employee_checkins, target_hours_calendar.get(date))
+                
+                if len(employee_checkins) % 2 != 0:
+                    formatted_date = frappe.utils.formatdate(workday.log_date)
+                    #frappe.msgprint("CheckIns must be in pairs for the given date: " + formatted_date)
+                if flag == "Create workday":
+                    with timer("hr_addon_stage_seconds", stage="insert"):
+                        workday.insert()
+
+            missing_dates.append(get_datetime(date))
+            inc("hr_addon_workdays_processed_total", job="bulk_process_workdays", flag=flag)
+            observe("hr_addon_queries_per_workday", counter.count, job="bulk_process_workdays")
+
+        except Exception as e:
+            inc("hr_addon_failures_total", stage="bulk_process_workdays", type=type(e).__name__)
+            message = _("Something went wrong in Workday Creation: {0}".format(traceback.format_exc()))
+            frappe.msgprint(message)
+            frappe.log_error("bulk_process_workdays() error", message)
+            failed_dates.append(date)
+    return missing_dates, failed_dates
+
+def set_workday_values(workday, single):
+    '''copy the result of get_actual_employee_log_for_bulk_process into a new or existing Workday'''
+    workday.update({
+        "attendance": single.get("attendance"),
+        "hours_worked": single.get("hours_worked"),
+        "break_hours": single.get("break_hours"),
+        "target_hours": single.get("target_hours"),
+        "total_work_seconds": single.get("total_work_seconds"),
+        "expected_break_hours": single.get("expected_break_hours"),
+        "total_break_seconds": single.get("total_break_seconds"),
+        "total_target_seconds": single.get("total_target_seconds"),
+        "actual_working_hours": single.get("actual_working_hours"),
+        "manual_workday": single.get("manual_workday")
+    })
+
+    if (workday.status == 'Half Day'):
+        workday.target_hours = workday.target_hours / 2
+    elif (workday.status == 'On Leave'):
+        workday.target_hours = 0
+
+    workday.first_checkin = ""
+    workday.last_checkout = ""
+    employee_checkins = single.get("employee_checkins")
+    if employee_checkins:
+        workday.first_checkin = employee_checkins[0].time
+        workday.last_checkout = employee_checkins[-1].time
+    set_workday_checkins(workday, employee_checkins or [])
+
+    return workday
+
+
+def recompute_workdays(employee, dates):
+    '''create or update the Workdays of an employee for the given dates, check-ins are read with one range query.
+    Days whose input fingerprint matches the stored one are skipped'''
+    from hr_addon.hr_addon.api.utils import get_employee_checkins_for_range
+
+    dates = sorted({getdate(d) for d in dates})
+    if not dates:
+        return
+
+    company = frappe.get_value('Employee', employee, 'company')
+    checkins_by_day, checkin_totals = {}, None
+    with timer("hr_addon_stage_seconds", stage="prefetch"):
+        with replica(employee):
+            paired_checkins = get_paired_checkins_for_range(employee, dates[0], dates[-1])
+            if paired_checkins is None and get_workday_engine() == WORKDAY_ENGINE_SQL:
+                checkin_totals = get_checkin_totals_for_range([employee], dates[0], dates[-1])
+            elif paired_checkins is None:
+                checkins_by_day = get_employee_checkins_for_range([employee], dates[0], dates[-1])
+        target_hours_calendar = get_target_hours_calendar(employee, dates[0], dates[-1])
+        existing_workdays = {row.log_date: row for row in frappe.get_all("Workday", filters={
+            "employee": employee,
+            "log_date": ["in", dates],
+        }, fields=["log_date", "name", "input_fingerprint"])}
+        fingerprint_inputs = get_fingerprint_inputs(employee, dates[0], dates[-1])
+
+    for date in dates:
+        if is_period_closed(company, date):
+            continue
+
+        if paired_checkins is not None:
+            employee_checkins = paired_checkins[date].checkins
+        elif checkin_totals is not None:
+            employee_checkins = get_checkin_totals_of_day(checkin_totals, employee, date).checkins
+        else:
+            employee_checkins = checkins_by_day.get((employee, date), [])
+        input_fingerprint = get_input_fingerprint(fingerprint_inputs, employee, date, employee_checkins, target_hours_calendar.get(date))
+        existing_workday = existing_workdays.get(date)
+        if existing_workday and existing_workday.input_fingerprint == input_fingerprint:
+            inc("hr_addon_workdays_unchanged_total", job="recompute_workdays")
+            continue
+
+        try:
+            with count_queries() as counter:
+                with timer("hr_addon_stage_seconds", stage="compute"):
+                    single = get_actual_employee_log_for_bulk_process(employee, date,
+                        target_hours=target_hours_calendar.get(date),
+                        employee_checkins=employee_checkins,
+                        paired_checkins=paired_checkins[date] if paired_checkins is not None else None,
+                        checkin_totals=get_checkin_totals_of_day(checkin_totals, employee, date) if checkin_totals is not None else None,
+                        attendance=fingerprint_inputs.attendance.get(date, ""))
+
+                if existing_workday:
+                    workday = frappe.get_doc("Workday", existing_workday.name)
+                else:
+                    workday = frappe.get_doc({
+                        "doctype": "Workday",
+                        "employee": employee,
+                        "log_date": date,
+                        "company": company,
+                    })
+                set_workday_values(workday, single)
+                workday.flags.input_fingerprint = input_fingerprint
+                with timer("hr_addon_stage_seconds", stage="insert"):
+                    workday.save()
+
+            inc("hr_addon_workdays_processed_total", job="recompute_workdays")
+            observe("hr_addon_queries_per_workday", counter.count, job="recompute_workdays")
+        except Exception as e:
+            inc("hr_addon_failures_total", stage="recompute_workdays", type=type(e).__name__)
+            frappe.log_error("recompute_workdays() error", traceback.format_exc())
+
+
 def get_month_map():
     return frappe._dict({
         "January": 1,
@@ -256,6 +425,7 @@ def get_unmarked_days(employee, month, exclude_holidays=0):
 
 
 @frappe.whitelist()
+@read_from_replica(lambda employee, *args, **kwargs: employee)
 def get_unmarked_range(employee, from_day, to_day):
     '''get_umarked_days(employee,month,excludee_holidays=0, year)'''
     import calendar
@@ -320,6 +490,7 @@ def get_app_branch(app):
     
 
 @frappe.whitelist()
+@read_from_replica(lambda employee, *args, **kwargs: employee)
 def get_created_workdays(employee, date_from, date_to):
     workday_list = frappe.get_list(
         "Workday",
@@ -202,17 +202,15 @@ frappe.listview_settings["Workday"] = {
                           // If user clicks "Yes"
                           flag = ""
                           frappe.call({
-                            method: "hr_addon.hr_addon.doctype.workday.workday.bulk_process_workdays",
+                            // created in the background by the job queue
+                            method: "hr_addon.hr_addon.doctype.workday.workday.enqueue_workday_creation",
                             args: {
-                                data: data,
-                                flag : "Create workday"
-                               
+                                data: data
                             },
                             callback: function (r) {
                                 if (r.message === 1) {
-                                  console.log(r.message.flag)
                                     frappe.show_alert({
-                                        message: __("Workdays Processed"),
+                                        message: __("Workdays are being processed in the background"),
                                         indicator: "blue",
                                     });
                                     cur_dialog.hide();
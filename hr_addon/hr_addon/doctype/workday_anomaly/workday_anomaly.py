@@ -0,0 +1,156 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, get_datetime, getdate, now_datetime
+
+from hr_addon.hr_addon.api.checkin_storage import get_checkin_refs, unpack_checkins
+from hr_addon.hr_addon.api.utils import get_holidays_for_range
+
+ODD_PUNCHES = "Odd Punches"
+MISSING_CHECKOUT = "Missing Checkout"
+OVERLAPPING_PUNCHES = "Overlapping Punches"
+CHECKIN_ON_LEAVE = "Checkin On Leave"
+CHECKIN_ON_HOLIDAY = "Checkin On Holiday"
+
+# anomalies of days whose hours could not be computed (hours_worked = -36)
+INCOMPLETE_ANOMALIES = (ODD_PUNCHES, MISSING_CHECKOUT)
+
+ANOMALY_FIELDS = ["name", "employee", "employee_name", "log_date", "company", "anomaly_status", "workday",
+	"creation", "modified", "owner", "modified_by", "docstatus"]
+
+
+class WorkdayAnomaly(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Workday Anomaly", ["anomaly_status", "log_date"])
+	frappe.db.add_index("Workday Anomaly", ["employee", "log_date"])
+
+
+def get_anomaly_status(punches, is_incomplete=False, is_on_leave=False, is_holiday=None):
+	'''anomaly of a day from its punches [(time, log_type)] sorted by time, "" if there is none.
+	is_holiday may be a callable, it is only evaluated for days with punches'''
+	if not punches:
+		return ""
+
+	if is_incomplete or len(punches) % 2:
+		last_log_type = punches[-1][1] or ("IN" if len(punches) % 2 else "OUT")
+		return MISSING_CHECKOUT if last_log_type == "IN" else ODD_PUNCHES
+
+	expected_log_type, last_time = "IN", None
+	for time, log_type in punches:
+		if (log_type and log_type != expected_log_type) or get_datetime(time) == last_time:
+			return OVERLAPPING_PUNCHES
+		expected_log_type = "OUT" if expected_log_type == "IN" else "IN"
+		last_time = get_datetime(time)
+
+	if is_on_leave:
+		return CHECKIN_ON_LEAVE
+	if callable(is_holiday):
+		is_holiday = is_holiday()
+	if is_holiday:
+		return CHECKIN_ON_HOLIDAY
+
+	return ""
+
+
+def get_log_types(checkin_names):
+	if not checkin_names:
+		return {}
+	return dict(frappe.db.sql("""
+		SELECT name, log_type FROM `tabEmployee Checkin` WHERE name IN %(names)s
+	""", {"names": tuple(checkin_names)}))
+
+
+def set_anomaly_status(workday):
+	'''set anomaly_status of a Workday from its check-in rows or packed check-in references'''
+	if workday.employee_checkins:
+		punches = [(d.log_time, d.log_type) for d in workday.employee_checkins]
+	else:
+		refs = unpack_checkins(workday.checkin_refs)
+		log_types = get_log_types([r[0] for r in refs])
+		punches = [(time, log_types.get(name)) for name, time in refs]
+
+	punches.sort(key=lambda p: get_datetime(p[0]))
+	workday.anomaly_status = get_anomaly_status(
+		punches,
+		is_incomplete=flt(workday.hours_worked) == -36,
+		is_on_leave=workday.status == "On Leave",
+		# silent lookup, an Employee without Holiday List is no reason for a message on every save
+		is_holiday=lambda: getdate(workday.log_date) in get_holidays_for_range(
+			[workday.employee], workday.log_date, workday.log_date)[workday.employee],
+	)
+
+
+def sync_workday_anomaly(workday):
+	'''keep the Workday Anomaly queue in line with the anomaly_status of a saved Workday'''
+	if not workday.anomaly_status:
+		frappe.db.delete("Workday Anomaly", {"workday": workday.name})
+		return
+
+	if frappe.db.exists("Workday Anomaly", workday.name):
+		frappe.db.set_value("Workday Anomaly", workday.name, {
+			"anomaly_status": workday.anomaly_status,
+			"log_date": workday.log_date,
+			"company": workday.company,
+		})
+	else:
+		frappe.get_doc({
+			"doctype": "Workday Anomaly",
+			"workday": workday.name,
+			"employee": workday.employee,
+			"log_date": workday.log_date,
+			"company": workday.company,
+			"anomaly_status": workday.anomaly_status,
+		}).insert(ignore_permissions=True)
+
+
+def delete_workday_anomalies(workday_names):
+	if workday_names:
+		frappe.db.sql("DELETE FROM `tabWorkday Anomaly` WHERE workday IN %(names)s", {"names": tuple(workday_names)})
+
+
+def update_anomaly_status(workday_names):
+	'''recompute anomaly_status and the queue rows of many Workdays with a fixed number of queries'''
+	if not workday_names:
+		return
+
+	workdays = frappe.db.sql("""
+		SELECT w.name, w.employee, e.employee_name, w.log_date, w.company, w.status, w.hours_worked
+		FROM `tabWorkday` w LEFT JOIN `tabEmployee` e ON e.name = w.employee
+		WHERE w.name IN %(names)s
+	""", {"names": tuple(workday_names)}, as_dict=1)
+	if not workdays:
+		return
+
+	checkin_refs = get_checkin_refs([w.name for w in workdays])
+	log_types = get_log_types([name for refs in checkin_refs.values() for name, time in refs])
+	holidays = get_holidays_for_range(list({w.employee for w in workdays}),
+		min(w.log_date for w in workdays), max(w.log_date for w in workdays))
+
+	for workday in workdays:
+		punches = sorted(((time, log_types.get(name)) for name, time in checkin_refs.get(workday.name, [])),
+			key=lambda p: get_datetime(p[0]))
+		workday.anomaly_status = get_anomaly_status(
+			punches,
+			is_incomplete=flt(workday.hours_worked) == -36,
+			is_on_leave=workday.status == "On Leave",
+			is_holiday=getdate(workday.log_date) in holidays.get(workday.employee, ()),
+		)
+
+	values = []
+	for workday in workdays:
+		values.extend([workday.name, workday.anomaly_status])
+	frappe.db.sql("""
+		UPDATE `tabWorkday` SET anomaly_status = CASE name {0} END WHERE name IN %s
+	""".format(" ".join(["WHEN %s THEN %s"] * len(workdays))), tuple(values) + (tuple(w.name for w in workdays),))
+
+	delete_workday_anomalies([w.name for w in workdays])
+	now, user = now_datetime(), frappe.session.user
+	frappe.db.bulk_insert("Workday Anomaly", ANOMALY_FIELDS, [
+		(w.name, w.employee, w.employee_name, w.log_date, w.company, w.anomaly_status, w.name, now, now, user, user, 0)
+		for w in workdays if w.anomaly_status
+	])
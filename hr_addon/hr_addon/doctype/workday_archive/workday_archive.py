@@ -0,0 +1,115 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import base64
+import json
+import zlib
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_months, cint, getdate, today
+
+from hr_addon.hr_addon.api.checkin_storage import get_checkin_refs
+from hr_addon.hr_addon.api.metrics import timed
+from hr_addon.hr_addon.api.report_cache import clear_cached_results
+from hr_addon.hr_addon.api.workday_totals import TOTAL_FIELDS, get_workday_totals
+from hr_addon.hr_addon.doctype.workday_anomaly.workday_anomaly import delete_workday_anomalies
+from hr_addon.hr_addon.doctype.workday_change_log.workday_change_log import log_workday_changes
+
+# Workday columns kept in the cold copy
+ARCHIVED_WORKDAY_FIELDS = ["name", "employee", "log_date", "company", "attendance", "status", "manual_workday",
+	"target_hours", "hours_worked", "actual_working_hours", "expected_break_hours", "break_hours", "number_of_breaks",
+	"first_checkin", "last_checkout", "total_work_seconds", "total_break_seconds", "total_target_seconds", "anomaly_status"]
+
+
+class WorkdayArchive(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Workday Archive", ["employee", "month"])
+
+
+def compress_detail(rows):
+	return base64.b64encode(zlib.compress(json.dumps(rows, default=str, separators=(",", ":")).encode())).decode()
+
+
+def decompress_detail(detail):
+	return json.loads(zlib.decompress(base64.b64decode(detail))) if detail else []
+
+
+@timed("archive_closed_periods")
+def archive_closed_periods():
+	'''scheduled: move the Workdays of closed periods older than the retention horizon into Workday Archive'''
+	retention_months = cint(frappe.db.get_single_value("HR Addon Settings", "workday_archive_after_months"))
+	if not retention_months:
+		return
+
+	horizon = add_months(getdate(today()), -retention_months)
+	closings = frappe.get_all("Workday Period Closing", filters={
+		"docstatus": 1,
+		"archived": 0,
+		"to_date": ["<", horizon],
+	}, fields=["name", "company", "from_date", "to_date"], order_by="from_date asc")
+
+	for closing in closings:
+		try:
+			archive_period(closing)
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error("archive_closed_periods() error", frappe.get_traceback())
+
+
+def archive_period(closing):
+	'''one Workday Archive per employee and month with the totals and a compressed copy of the detail'''
+	workdays = frappe.get_all("Workday", filters={
+		"company": closing.company,
+		"log_date": ["between", [closing.from_date, closing.to_date]],
+	}, fields=ARCHIVED_WORKDAY_FIELDS, order_by="employee asc, log_date asc")
+	checkin_refs = get_checkin_refs([w.name for w in workdays])
+
+	detail = {}
+	for workday in workdays:
+		workday.checkins = checkin_refs.get(workday.name, [])
+		detail.setdefault((workday.employee, getdate(workday.log_date).replace(day=1)), []).append(workday)
+
+	for totals in get_workday_totals(closing.from_date, closing.to_date, company=closing.company, group_by_month=True):
+		month = getdate(totals.month)
+		archive = frappe.get_doc({
+			"doctype": "Workday Archive",
+			"employee": totals.employee,
+			"company": closing.company,
+			"month": month,
+			"period_closing": closing.name,
+			"detail": compress_detail(detail.get((totals.employee, month), [])),
+		})
+		archive.update({field: totals.get(field) for field in TOTAL_FIELDS})
+		archive.insert(ignore_permissions=True)
+
+	names = tuple(w.name for w in workdays)
+	if names:
+		frappe.db.sql("DELETE FROM `tabEmployee Checkins` WHERE parenttype = 'Workday' AND parent IN %(names)s", {"names": names})
+		frappe.db.sql("DELETE FROM `tabWorkday` WHERE name IN %(names)s", {"names": names})
+		delete_workday_anomalies(names)
+		log_workday_changes(workdays, "Delete", "archive")
+
+	frappe.db.set_value("Workday Period Closing", closing.name, "archived", 1)
+	# archived rows are no longer links to a Workday
+	clear_cached_results("Work Hour Report")
+
+
+def get_archived_workdays(from_date=None, to_date=None, employee=None):
+	'''archived Workday rows of a range, decompressed from the months overlapping it. Without the dates all of them'''
+	filters = {}
+	if from_date and to_date:
+		filters["month"] = ["between", [getdate(from_date).replace(day=1), getdate(to_date)]]
+	if employee:
+		filters["employee"] = employee
+
+	workdays = []
+	for archive in frappe.get_all("Workday Archive", filters=filters, fields=["detail"]):
+		for workday in decompress_detail(archive.detail):
+			if not filters.get("month") or getdate(from_date) <= getdate(workday["log_date"]) <= getdate(to_date):
+				workdays.append(frappe._dict(workday))
+
+	return workdays
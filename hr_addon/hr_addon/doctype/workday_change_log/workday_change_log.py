@@ -0,0 +1,60 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, now_datetime, today
+
+from hr_addon.hr_addon.api.metrics import timed
+
+# the name is an auto increment and serves as the sequence of the feed
+CHANGE_LOG_FIELDS = ["workday", "employee", "log_date", "company", "operation", "source",
+	"creation", "modified", "owner", "modified_by", "docstatus"]
+
+DEFAULT_RETENTION_DAYS = 30
+COMPACTION_BATCH_SIZE = 10000
+
+
+class WorkdayChangeLog(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Workday Change Log", ["creation"])
+
+
+def log_workday_changes(workdays, operation, source):
+	'''append one row per Workday in the current transaction, workdays need name, employee, log_date and company'''
+	if not workdays:
+		return
+
+	now, user = now_datetime(), frappe.session.user
+	frappe.db.bulk_insert("Workday Change Log", CHANGE_LOG_FIELDS, [
+		(w.get("name"), w.get("employee"), w.get("log_date"), w.get("company"), operation, source, now, now, user, user, 0)
+		for w in workdays
+	])
+
+
+def log_workday_change(doc, operation):
+	log_workday_changes([doc], operation, "doc")
+
+
+@timed("compact_workday_change_log")
+def compact_workday_change_log():
+	'''scheduled: delete the rows older than the retention of HR Addon Settings, in batches'''
+	retention_days = cint(frappe.db.get_single_value("HR Addon Settings", "workday_change_log_retention_days")) or DEFAULT_RETENTION_DAYS
+	cutoff = add_days(today(), -retention_days)
+
+	# sequences grow with the creation time, everything up to the newest expired row goes.
+	# The last row is kept, get_workday_changes detects compacted sequences by the oldest row
+	last = frappe.db.sql("SELECT MAX(name) FROM `tabWorkday Change Log`")[0][0]
+	oldest, newest = frappe.db.sql("""
+		SELECT MIN(name), MAX(name) FROM `tabWorkday Change Log` WHERE creation < %(cutoff)s AND name < %(last)s
+	""", {"cutoff": cutoff, "last": last or 0})[0]
+	if not newest:
+		return
+
+	for start in range(cint(oldest), cint(newest) + 1, COMPACTION_BATCH_SIZE):
+		frappe.db.sql("DELETE FROM `tabWorkday Change Log` WHERE name BETWEEN %s AND %s",
+			(start, min(start + COMPACTION_BATCH_SIZE - 1, cint(newest))))
+		frappe.db.commit()
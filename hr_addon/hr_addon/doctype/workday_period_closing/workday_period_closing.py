@@ -0,0 +1,56 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import getdate
+
+CLOSED_PERIODS_CACHE_KEY = "hr_addon:closed_workday_periods"
+
+
+class WorkdayPeriodClosing(Document):
+	def validate(self):
+		if getdate(self.from_date) > getdate(self.to_date):
+			frappe.throw(_("From Date must be before To Date"))
+		self.validate_overlapping_closing()
+
+	def validate_overlapping_closing(self):
+		overlapping = frappe.db.sql("""
+			SELECT name FROM `tabWorkday Period Closing`
+			WHERE company = %(company)s AND docstatus = 1 AND name != %(name)s
+			AND from_date <= %(to_date)s AND to_date >= %(from_date)s
+		""", {"company": self.company, "name": self.name or "", "from_date": self.from_date, "to_date": self.to_date})
+		if overlapping:
+			frappe.throw(_("The period overlaps with {0}").format(frappe.get_desk_link("Workday Period Closing", overlapping[0][0])))
+
+	def on_submit(self):
+		frappe.cache().hdel(CLOSED_PERIODS_CACHE_KEY, self.company)
+
+	def on_cancel(self):
+		if self.archived:
+			frappe.throw(_("The Workdays of this period are archived, the period can not be reopened"))
+		frappe.cache().hdel(CLOSED_PERIODS_CACHE_KEY, self.company)
+
+
+def get_closed_periods(company):
+	'''[(from_date, to_date)] of the submitted closings of a company, cached until a closing changes'''
+	def generator():
+		return frappe.db.sql("""
+			SELECT from_date, to_date FROM `tabWorkday Period Closing` WHERE company = %s AND docstatus = 1
+		""", company)
+
+	return frappe.cache().hget(CLOSED_PERIODS_CACHE_KEY, company, generator)
+
+
+def is_period_closed(company, date):
+	if not company or not date:
+		return False
+	date = getdate(date)
+	return any(getdate(from_date) <= date <= getdate(to_date) for from_date, to_date in get_closed_periods(company))
+
+
+def validate_period_is_open(company, date):
+	if is_period_closed(company, date):
+		frappe.throw(_("The Workday period of {0} is closed for {1}").format(frappe.utils.formatdate(date), company),
+			title=_("Period Closed"))
@@ -0,0 +1,62 @@
+# Copyright (c) 2026, Jide Olayinka and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.model.naming import append_number_if_name_exists
+from frappe.utils import add_days, cint, flt, getdate, today
+
+from hr_addon.hr_addon.api.workday_form import invalidate_workday_form_data
+from hr_addon.hr_addon.doctype.target_hours_calendar.target_hours_calendar import on_working_hours_template_change
+from hr_addon.hr_addon.doctype.weekly_working_hours.weekly_working_hours import split_weekly_working_hours
+
+
+class WorkingHoursTemplate(Document):
+	def validate(self):
+		days = [d.day for d in self.hours]
+		if len(days) != len(set(days)):
+			frappe.throw(_("Each day can only be set once"))
+		self.total_work_hours = sum(flt(d.hours) for d in self.hours)
+
+	def on_update(self):
+		doc_before_save = self.get_doc_before_save()
+		if doc_before_save and get_schedule(doc_before_save) != get_schedule(self):
+			self.keep_schedule_history(doc_before_save)
+		# a template change is a schedule change of every Weekly Working Hours linked to it
+		on_working_hours_template_change(self)
+		invalidate_workday_form_data()
+
+	def keep_schedule_history(self, doc_before_save):
+		'''a change applies from today on: the days before keep the old schedule through a copy of the old template,
+		Weekly Working Hours running through today are split'''
+		change_date = getdate(today())
+		linked = frappe.get_all("Weekly Working Hours", filters={
+			"working_hours_template": self.name,
+			"docstatus": 1,
+			"valid_from": ["<", change_date],
+		}, fields=["name", "employee", "valid_to"])
+		if not linked:
+			return
+
+		history = frappe.copy_doc(doc_before_save)
+		history.template_name = append_number_if_name_exists("Working Hours Template",
+			_("{0} until {1}").format(self.template_name, add_days(change_date, -1)), fieldname="template_name")
+		history.insert(ignore_permissions=True)
+
+		for w in linked:
+			weekly_working_hours = frappe.get_doc("Weekly Working Hours", w.name)
+			if getdate(w.valid_to) >= change_date and frappe.db.get_value("Employee", w.employee, "status") != "Active":
+				# an inactive employee gets no new Weekly Working Hours, the old schedule stays
+				weekly_working_hours.db_set("working_hours_template", history.name)
+				continue
+			split_weekly_working_hours(weekly_working_hours, change_date, self.name, history_template=history.name)
+
+
+def get_schedule(doc):
+	'''what the target hours are computed from'''
+	return (
+		sorted((d.day, flt(d.hours), cint(d.break_minutes)) for d in doc.hours),
+		cint(doc.no_break_hours),
+		cint(doc.set_target_hours_to_zero_when_date_is_holiday),
+	)
@@ -28,6 +28,13 @@ frappe.query_reports["Work Hour Report"] = {
 			"reqd": 1,
 			"width": "35px"
 		},
+		{
+			"fieldname":"anomaly_status",
+			"label": __("Anomaly"),
+			"fieldtype": "Select",
+			"options": "\nOdd Punches\nMissing Checkout\nOverlapping Punches\nCheckin On Leave\nCheckin On Holiday",
+			"width": "35px"
+		},
 	],
 	"formatter": function (value, row, column, data, default_formatter) {
 		
@@ -89,6 +96,10 @@ frappe.query_reports["Work Hour Report"] = {
 			
 		}
 
+		if (column.fieldname == "anomaly_status" && value) {
+			value = "<span style='color:red'>" + value + "</span>";
+		}
+
 		if (column.fieldname == "total_target_seconds" ) {
 			value = hitt(value);
 		}
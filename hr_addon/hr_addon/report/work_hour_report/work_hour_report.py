@@ -3,22 +3,41 @@
 
 import frappe
 from frappe import _
+from frappe.utils import flt, get_datetime, getdate
+
+from hr_addon.hr_addon.api.replica import read_from_replica
+from hr_addon.hr_addon.api.report_cache import get_cached_result
+from hr_addon.hr_addon.doctype.workday_archive.workday_archive import get_archived_workdays
+
+
+REPORT_NAME = "Work Hour Report"
 
 
 def execute(filters=None):
-	columns, data = [], []
-	condition_date,condition_employee = "",""
-	if filters.date_from_filter and filters.date_to_filter :
-		if filters.date_from_filter == None:
-			filters.date_from_filter = frappe.datetime.get_today()
-		if filters.date_to_filter == None:
-			filters.date_to_filter = frappe.datetime.get_today()
-		condition_date = "AND log_date BETWEEN '"+ filters.date_from_filter + \
-        "' AND '" + filters.date_to_filter + "'"
+	filters = frappe._dict(filters or {})
+	normalized_filters = {
+		"date_from_filter": str(getdate(filters.date_from_filter)) if filters.date_from_filter else None,
+		"date_to_filter": str(getdate(filters.date_to_filter)) if filters.date_to_filter else None,
+		"employee_id": filters.get("employee_id") or None,
+		"anomaly_status": filters.get("anomaly_status") or None,
+	}
+	return get_cached_result(REPORT_NAME, normalized_filters, normalized_filters["employee_id"],
+		normalized_filters["date_from_filter"], normalized_filters["date_to_filter"], lambda: get_work_hours(filters))
+
 
+@read_from_replica(lambda filters: filters.get("employee_id"))
+def get_work_hours(filters):
+	columns, data = [], []
+	conditions, values = "", {}
+	if filters.date_from_filter and filters.date_to_filter:
+		conditions += " AND log_date BETWEEN %(date_from)s AND %(date_to)s"
+		values.update({"date_from": getdate(filters.date_from_filter), "date_to": getdate(filters.date_to_filter)})
 	if filters.get("employee_id"):
-		empid = filters.get("employee_id")
-		condition_employee += f" AND employee = '{empid}'"
+		conditions += " AND employee = %(employee)s"
+		values["employee"] = filters.get("employee_id")
+	if filters.get("anomaly_status"):
+		conditions += " AND anomaly_status = %(anomaly_status)s"
+		values["anomaly_status"] = filters.get("anomaly_status")
 	# #{'fieldname':'employee','label':'Employee','width':160},
 	# {'fieldname':'target_hours','label':'Target Hours','width':80},
 	columns = [		
@@ -35,6 +54,7 @@ def execute(filters=None):
 		{'fieldname':'first_in','label':'First Checkin','width':100},
 		{'fieldname':'last_out','label':'Last Checkout','width':100},
 		{'fieldname':'attendance','label':'Attendance','width': 160},
+		{'fieldname':'anomaly_status','label':_('Anomaly'),'width': 140},
 		
 	]
 	work_data = frappe.db.sql(
@@ -46,6 +66,7 @@ def execute(filters=None):
         employee,
         attendance,
         status,
+        anomaly_status,
         CASE 
             WHEN total_work_seconds < 0 and total_work_seconds != -129600
             THEN 0
@@ -69,14 +90,48 @@ def execute(filters=None):
         TIME(first_checkin) AS first_in,
         TIME(last_checkout) AS last_out 
     FROM `tabWorkday` 
-    WHERE docstatus < 2 %s %s 
+    WHERE docstatus < 2 {conditions}
     ORDER BY log_date ASC
-    """ % (condition_date, condition_employee),
+    """.format(conditions=conditions),
+    values,
     as_dict=1,
 )
 
 	
-	data = work_data
+	# archived months are part of the report with and without a date range
+	data = sorted(work_data + get_archived_rows(filters), key=lambda d: str(d.log_date))
 
 	return columns, data
+
+
+def get_archived_rows(filters):
+	'''rows of archived Workdays, same columns as the query on `tabWorkday`'''
+	rows = []
+	for workday in get_archived_workdays(filters.date_from_filter, filters.date_to_filter, filters.get("employee_id")):
+		if filters.get("anomaly_status") and workday.get("anomaly_status") != filters.get("anomaly_status"):
+			continue
+		total_work_seconds = flt(workday.total_work_seconds)
+		actual_working_seconds = flt(workday.actual_working_hours) * 60 * 60
+		total_target_seconds = flt(workday.total_target_seconds)
+		rows.append(frappe._dict({
+			"name": None,
+			"hours_worked": workday.hours_worked,
+			"log_date": workday.log_date,
+			"employee": workday.employee,
+			"attendance": workday.attendance,
+			"status": workday.status,
+			"anomaly_status": workday.get("anomaly_status"),
+			"total_work_seconds": 0 if total_work_seconds < 0 and total_work_seconds != -129600 else total_work_seconds,
+			"total_break_seconds": workday.total_break_seconds,
+			"actual_working_seconds": actual_working_seconds,
+			"expected_break_hours": flt(workday.expected_break_hours) * 60 * 60,
+			"target_hours": workday.target_hours,
+			"total_target_seconds": total_target_seconds,
+			"diff_log": max(total_work_seconds, 0) - total_target_seconds,
+			"actual_diff_log": actual_working_seconds if actual_working_seconds < 0 else actual_working_seconds - total_target_seconds,
+			"first_in": get_datetime(workday.first_checkin).time() if workday.first_checkin else None,
+			"last_out": get_datetime(workday.last_checkout).time() if workday.last_checkout else None,
+		}))
+
+	return rows
 #(actual_working_hours * 60 * 60 - total_target_seconds) AS actual_diff_log,64to68
\ No newline at end of file
@@ -0,0 +1,18 @@
+import frappe
+from frappe.utils import add_days, today
+
+from hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary import (
+    DEPARTMENT_CHANGE_DAYS,
+    rebuild_department_attendance_summary,
+)
+
+BATCH_DAYS = 7
+
+
+def execute():
+    frappe.reload_doc("hr_addon", "doctype", "department_attendance_summary")
+
+    dates = [add_days(today(), -i) for i in range(DEPARTMENT_CHANGE_DAYS + 1)]
+    for i in range(0, len(dates), BATCH_DAYS):
+        rebuild_department_attendance_summary(dates[i:i + BATCH_DAYS])
+        frappe.db.commit()
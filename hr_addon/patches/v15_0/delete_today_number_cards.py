@@ -0,0 +1,10 @@
+import frappe
+
+# renamed to "... Yesterday", the Workdays of today do not exist yet
+CARDS = ("Target Hours Today", "Actual Hours Today", "Incomplete Days Today", "On Leave Today")
+
+
+def execute():
+    for card in CARDS:
+        # the standard dashboard still links them until it is synced
+        frappe.delete_doc_if_exists("Number Card", card, force=True)
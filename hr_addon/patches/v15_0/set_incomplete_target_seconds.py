@@ -0,0 +1,30 @@
+import frappe
+
+from hr_addon.hr_addon.api.workday_totals import get_totals_of_workdays
+from hr_addon.hr_addon.doctype.department_attendance_summary.department_attendance_summary import (
+    rebuild_department_attendance_summary,
+)
+from hr_addon.hr_addon.doctype.workday_archive.workday_archive import decompress_detail
+
+BATCH_SIZE = 500
+BATCH_DAYS = 7
+
+
+def execute():
+    frappe.reload_doc("hr_addon", "doctype", "workday_archive")
+    frappe.reload_doc("hr_addon", "doctype", "department_attendance_summary")
+
+    names = frappe.get_all("Workday Archive", filters={"incomplete_days": [">", 0]}, pluck="name", order_by="name asc")
+    for i in range(0, len(names), BATCH_SIZE):
+        for name, detail in frappe.get_all("Workday Archive", filters={"name": ["in", names[i:i + BATCH_SIZE]]},
+                fields=["name", "detail"], as_list=True):
+            totals = get_totals_of_workdays(decompress_detail(detail))
+            frappe.db.set_value("Workday Archive", name, "incomplete_target_seconds",
+                totals["incomplete_target_seconds"], update_modified=False)
+        frappe.db.commit()
+
+    dates = frappe.get_all("Department Attendance Summary", filters={"incomplete_days": [">", 0]},
+        pluck="date", distinct=True, order_by="date asc")
+    for i in range(0, len(dates), BATCH_DAYS):
+        rebuild_department_attendance_summary(dates[i:i + BATCH_DAYS])
+        frappe.db.commit()
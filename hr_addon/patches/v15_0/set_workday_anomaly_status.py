@@ -0,0 +1,18 @@
+import frappe
+
+from hr_addon.hr_addon.api.report_cache import clear_cached_results
+from hr_addon.hr_addon.doctype.workday_anomaly.workday_anomaly import update_anomaly_status
+
+BATCH_SIZE = 1000
+
+
+def execute():
+    frappe.reload_doc("hr_addon", "doctype", "workday")
+    frappe.reload_doc("hr_addon", "doctype", "workday_anomaly")
+
+    names = frappe.get_all("Workday", pluck="name", order_by="name asc")
+    for i in range(0, len(names), BATCH_SIZE):
+        update_anomaly_status(names[i:i + BATCH_SIZE])
+        frappe.db.commit()
+
+    clear_cached_results("Work Hour Report")